@@ -20,13 +20,8 @@
 from __future__ import print_function
 
 import datetime
-import uuid
-from dateutil.relativedelta import relativedelta
-from dateutil.parser import parse as parse_date
 from decimal import Decimal, InvalidOperation
 
-from weboob.browser.browsers import APIBrowser
-from weboob.browser.profiles import Weboob
 from weboob.exceptions import BrowserHTTPError
 from weboob.capabilities.base import empty
 from weboob.capabilities.bank import CapBank, Account, Transaction
@@ -47,6 +42,8 @@ class OfxFormatter(IFormatter):
     coming = Decimal(0)
 
     def start_format(self, **kwargs):
+        import uuid
+
         account = kwargs['account']
         self.balance = account.balance
         self.coming = account.coming
@@ -344,6 +341,9 @@ class Boobank(ReplApplication):
             return 2
 
         if end_date is not None:
+            from dateutil.relativedelta import relativedelta
+            from dateutil.parser import parse as parse_date
+
             try:
                 end_date = parse_date(end_date)
             except ValueError:
@@ -493,6 +493,9 @@ class Boobank(ReplApplication):
         """
         username, password = self.parse_command_args(line, 2, 2)
 
+        from weboob.browser.browsers import APIBrowser
+        from weboob.browser.profiles import Weboob
+
         client = APIBrowser(baseurl='https://budgea.biapi.pro/2.0/')
         client.set_profile(Weboob(self.VERSION))
         try:
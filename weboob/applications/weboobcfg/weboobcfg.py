@@ -85,6 +85,7 @@ class WeboobCfg(ReplApplication):
     COMMANDS_FORMATTERS = {'modules':     'table',
                            'list':        'table',
                            'info':        'info_formatter',
+                           'health':      'table',
                            }
     DISABLE_REPL = True
 
@@ -164,7 +165,7 @@ class WeboobCfg(ReplApplication):
         caps = line.split()
         for instance_name, name, params in sorted(self.weboob.backends_config.iter_backends()):
             try:
-                module = self.weboob.modules_loader.get_or_load_module(name)
+                module = self.weboob.modules_loader.get_manifest(name)
             except ModuleLoadError as e:
                 self.logger.warning('Unable to load module %r: %s' % (name, e))
                 continue
@@ -180,6 +181,34 @@ class WeboobCfg(ReplApplication):
                                ])
             self.format(row)
 
+    def do_health(self, line):
+        """
+        health [reset NAME]
+
+        Show if websites of backends are failing, and so if backends are
+        skipped. With "reset", forget failures of a backend.
+        """
+        args = line.split()
+        if args and args[0] == 'reset':
+            if len(args) != 2:
+                print('Usage: health reset NAME', file=self.stderr)
+                return 2
+            if not self.weboob.backends_config.backend_exists(args[1]):
+                print('Backend instance "%s" does not exist' % args[1], file=self.stderr)
+                return 1
+            self.weboob.health.reset(args[1])
+            return 0
+
+        for instance_name, name, params in sorted(self.weboob.backends_config.iter_backends()):
+            state = self.weboob.health.get_state(instance_name)
+            row = OrderedDict([('Name', instance_name),
+                               ('State', state['state']),
+                               ('Failures', state['failures']),
+                               ('Retry in', '%ds' % state['retry_in'] if 'retry_in' in state else ''),
+                               ('Last error', state['last_error'] or ''),
+                               ])
+            self.format(row)
+
     def do_remove(self, instance_name):
         """
         remove NAME
@@ -257,7 +286,7 @@ class WeboobCfg(ReplApplication):
             return 1
 
         try:
-            module = self.weboob.modules_loader.get_or_load_module(line)
+            module = self.weboob.modules_loader.get_manifest(line)
         except ModuleLoadError:
             module = None
 
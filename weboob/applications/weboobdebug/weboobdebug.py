@@ -19,9 +19,11 @@
 
 from __future__ import print_function
 
+import os
 from optparse import OptionGroup
 
 from weboob.tools.application.base import Application
+from weboob.tools.metrics import registry as metrics_registry
 
 
 class WeboobDebug(Application):
@@ -45,19 +47,28 @@ class WeboobDebug(Application):
         BACKEND
 
         Debug BACKEND.
+
+        stats [prometheus|reset]
+
+        Display metrics recorded by applications run with the
+        WEBOOB_METRICS_FILE environment variable set.
         """
         try:
             backend_name = argv[1]
         except IndexError:
             print('Usage: %s BACKEND' % argv[0], file=self.stderr)
             return 1
+
+        if backend_name == 'stats':
+            return self.stats(argv[2:])
         try:
             backend = self.weboob.load_backends(names=[backend_name])[backend_name]
         except KeyError:
             print(u'Unable to load backend "%s"' % backend_name, file=self.stderr)
             return 1
 
-        locs = dict(backend=backend, browser=backend.browser, application=self, weboob=self.weboob)
+        locs = dict(backend=backend, browser=backend.browser, application=self, weboob=self.weboob,
+                    metrics=metrics_registry, health=self.weboob.health.get_state(backend_name))
         banner = 'Weboob debug shell\nBackend "%s" loaded.\nAvailable variables:\n' % backend_name \
                  + '\n'.join(['  %s: %s' % (k, v) for k, v in locs.iteritems()])
 
@@ -74,6 +85,42 @@ class WeboobDebug(Application):
             else:
                 break
 
+    def stats(self, args):
+        path = os.environ.get('WEBOOB_METRICS_FILE')
+        if not path:
+            print('Please set the WEBOOB_METRICS_FILE environment variable to record metrics.', file=self.stderr)
+            return 1
+
+        if args and args[0] == 'reset':
+            if os.path.exists(path):
+                os.remove(path)
+            return 0
+
+        # Metrics of this process must not be mixed with the recorded ones.
+        metrics_registry.reset()
+        metrics_registry.load(path)
+        try:
+            if args and args[0] == 'prometheus':
+                print(metrics_registry.to_prometheus().encode(self.encoding), end='')
+            else:
+                self.print_stats()
+        finally:
+            # Do not record them again when exiting.
+            metrics_registry.reset()
+        return 0
+
+    def print_stats(self):
+        for name, values in metrics_registry.snapshot().iteritems():
+            if not values:
+                continue
+            print(name)
+            for labels, value in values:
+                labels = u', '.join(u'%s=%s' % item for item in sorted(labels.iteritems()) if item[1])
+                if isinstance(value, dict):
+                    mean = value['sum'] / value['count'] if value['count'] else 0
+                    value = u'count=%d mean=%.3fs total=%.3fs' % (value['count'], mean, value['sum'])
+                print((u'  %s: %s' % (labels, value)).encode(self.encoding))
+
     def ipython(self, locs, banner):
         try:
             from IPython import embed
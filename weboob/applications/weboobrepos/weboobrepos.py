@@ -28,6 +28,7 @@ import subprocess
 from copy import copy
 from contextlib import closing
 
+from weboob.core.modules import ModuleManifest
 from weboob.core.repositories import Repository
 
 from weboob.tools.application.repl import ReplApplication
@@ -99,7 +100,8 @@ class WeboobRepos(ReplApplication):
             print('Use the "create" command before.', file=self.stderr)
             return 1
 
-        r.build_index(source_path, index_file)
+        r.build_index(source_path, index_file, deltas=True,
+                      manifests_dir=self.weboob.repositories.get_manifests_dir(source_path))
 
         if r.signed:
             sigfiles = [r.KEYRING, Repository.INDEX]
@@ -224,6 +226,9 @@ class WeboobRepos(ReplApplication):
         # Skip *.pyc files in tarballs.
         if filename.endswith('.pyc'):
             return True
+        # Nor manifests left in sources by previous versions.
+        if os.path.basename(filename) == ModuleManifest.FILENAME:
+            return True
         # Don't include *.png files in tarball
         if filename.endswith('.png'):
             return True
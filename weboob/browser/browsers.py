@@ -31,6 +31,7 @@ except ImportError:
 import os
 import sys
 from copy import deepcopy
+from time import time
 import inspect
 
 try:
@@ -40,6 +41,10 @@ try:
 except ImportError:
     raise ImportError('Please install python-requests >= 2.0')
 
+from weboob.exceptions import CallTimeout
+from weboob.tools.callcontext import remaining_time, should_stop
+from weboob.tools import metrics
+from weboob.tools.tracing import get_tracer
 from weboob.tools.log import getLogger
 from weboob.tools.ordereddict import OrderedDict
 from weboob.tools.json import json
@@ -49,7 +54,7 @@ from .exceptions import HTTPNotFound, ClientError, ServerError
 from .sessions import FuturesSession
 from .profiles import Firefox
 from .pages import NextPage
-from .url import URL
+from .url import URL, URLDispatcher
 
 
 class Browser(object):
@@ -88,6 +93,24 @@ class Browser(object):
     Maximum of threads for asynchronous requests.
     """
 
+    SHARED_POOLS = False
+    """
+    Use connection pools shared by every browser of the process, for
+    example to reuse connections when several backends use the same website.
+    See :class:`weboob.browser.pools.SharedPoolManager`.
+    """
+
+    HTTP_CACHE = False
+    """
+    Cache responses of GET requests, see :class:`weboob.browser.cache.HTTPCache`.
+    """
+
+    CACHE_TTL = None
+    """
+    Number of seconds during which responses of GET requests are kept in
+    the HTTP cache, whatever their headers say.
+    """
+
     @classmethod
     def asset(cls, localfile):
         """
@@ -97,13 +120,20 @@ class Browser(object):
             return localfile
         return os.path.join(os.path.dirname(inspect.getfile(cls)), localfile)
 
-    def __init__(self, logger=None, proxy=None, responses_dirname=None):
+    def __init__(self, logger=None, proxy=None, responses_dirname=None, cache=None, cassette=None):
         self.logger = getLogger('browser', logger)
         self.PROXIES = proxy
+        # Record or replay responses, see weboob.tools.cassette.
+        self.cassette = cassette
         self._setup_session(self.PROFILE)
         self.url = None
         self.response = None
 
+        if cache is None and self.HTTP_CACHE:
+            from .cache import HTTPCache
+            cache = HTTPCache()
+        self.cache = cache
+
         self.responses_dirname = responses_dirname
         self.responses_count = 1
 
@@ -181,8 +211,18 @@ class Browser(object):
                 pass
 
         # defines a max_retries. It's mandatory in case a server is not
-        # handling keep alive correctly, like the proxy burp
-        a = requests.adapters.HTTPAdapter(max_retries=self.MAX_RETRIES)
+        # handling keep alive correctly, like the proxy burp.
+        # Pools are large enough to let every worker keep its connection.
+        adapter_kwargs = dict(max_retries=self.MAX_RETRIES,
+                              pool_maxsize=max(self.MAX_WORKERS, requests.adapters.DEFAULT_POOLSIZE))
+        if self.cassette is not None:
+            from .cassette import CassetteAdapter
+            a = CassetteAdapter(self.cassette, **adapter_kwargs)
+        elif self.SHARED_POOLS:
+            from .pools import SharedPoolAdapter
+            a = SharedPoolAdapter(**adapter_kwargs)
+        else:
+            a = requests.adapters.HTTPAdapter(**adapter_kwargs)
         session.mount('http://', a)
         session.mount('https://', a)
 
@@ -290,29 +330,123 @@ class Browser(object):
         if timeout is None:
             timeout = self.TIMEOUT
 
+        # Do not wait longer than the deadline of the current backends call.
+        remaining = remaining_time()
+        capped = False
+        if remaining is not None:
+            if remaining <= 0:
+                raise CallTimeout(u'Deadline reached before requesting %s' % preq.url)
+            if timeout is None or isinstance(timeout, (int, float)) and timeout > remaining:
+                timeout = remaining
+                capped = True
+
+        # Labels of metrics have to be read in this thread, as the callback
+        # of an asynchronous request is called in an other one.
+        metrics_labels = metrics.get_labels() if metrics.registry.enabled else None
+        tracer = get_tracer()
+        start = time()
+
+        cached = cache_entry = None
+        # Responses served by the cache would not be recorded in the
+        # cassette, or replayed in a different order.
+        if self.cache is not None and self.cassette is None and not stream:
+            cache_ttl = self.get_cache_ttl(preq.url)
+            cached, cache_entry = self.cache.lookup(preq, cache_ttl)
+
         # We define an inner_callback here in order to execute the same code
         # regardless of async param.
         def inner_callback(future, response):
             if allow_redirects:
                 response = self.handle_refresh(response)
 
-            self.raise_for_status(response)
-            return callback(response)
+            received = time()
+            try:
+                self.raise_for_status(response)
+                if tracer is None:
+                    return callback(response)
+                with tracer.span(u'handle', 'http'):
+                    return callback(response)
+            finally:
+                if metrics_labels is not None:
+                    self._record_metrics(response, time() - start, not stream, metrics_labels)
+                if tracer is not None:
+                    self._record_spans(tracer, response, start, received, time())
+
+        if cached is not None:
+            if async:
+                if not self.session.executor:
+                    raise ImportError('Please install python-concurrent.futures')
+                return self.session.executor.submit(inner_callback, self, cached)
+            inner_callback(self, cached)
+            return cached
+
+        def cache_callback(future, response):
+            # The response is replaced by the cached one if it has not been
+            # modified.
+            if cache_entry is not None:
+                response = self.cache.handle(preq, response, cache_entry, cache_ttl)
+            return inner_callback(future, response)
 
         # call python-requests
-        response = self.session.send(preq,
-                                     allow_redirects=allow_redirects,
-                                     stream=stream,
-                                     timeout=timeout,
-                                     verify=verify,
-                                     cert=cert,
-                                     proxies=proxies,
-                                     background_callback=async and inner_callback)
+        try:
+            response = self.session.send(preq,
+                                         allow_redirects=allow_redirects,
+                                         stream=stream,
+                                         timeout=timeout,
+                                         verify=verify,
+                                         cert=cert,
+                                         proxies=proxies,
+                                         background_callback=async and cache_callback)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            # The website is not necessarily slow, the timeout has been
+            # shortened to the deadline of the call (read timeouts which
+            # have been retried are reported as connection errors).
+            if capped and remaining_time() <= 0:
+                raise CallTimeout(u'Deadline reached while requesting %s' % preq.url)
+            raise
         if not async:
+            if cache_entry is not None:
+                response = self.cache.handle(preq, response, cache_entry, cache_ttl)
             inner_callback(self, response)
 
         return response
 
+    def get_cache_ttl(self, url):
+        """
+        Get the number of seconds during which the response to a GET request
+        on an url is kept in the HTTP cache, whatever its headers say.
+
+        :rtype: :class:`float` or None to follow headers of the response
+        """
+        return self.CACHE_TTL
+
+    def _record_metrics(self, response, duration, loaded, labels):
+        page = getattr(response, 'page', None)
+        if page is not None:
+            page = page.__class__.__name__
+        else:
+            page = urlparse(response.url).netloc
+        labels = dict(labels, page=page)
+
+        if loaded:
+            size = len(response.content)
+        else:
+            size = int(response.headers.get('Content-Length') or 0)
+
+        metrics.HTTP_REQUESTS.inc(status=response.status_code, **labels)
+        metrics.HTTP_BYTES.inc(size, **labels)
+        metrics.HTTP_DURATION.observe(duration, **labels)
+
+    def _record_spans(self, tracer, response, start, received, end):
+        # Connection and DNS timings are not given by requests, only the
+        # time until headers have been parsed.
+        headers = start + response.elapsed.total_seconds()
+        tracer.add(u'%s %s' % (response.request.method, response.url), 'http', start, end,
+                   {'status': response.status_code,
+                    'page': response.page.__class__.__name__ if getattr(response, 'page', None) else None})
+        tracer.add(u'ttfb', 'http', start, headers)
+        tracer.add(u'download', 'http', headers, received)
+
     def async_open(self, url, **kwargs):
         """
         Shortcut to open(url, async=True).
@@ -557,6 +691,8 @@ class _PagesBrowserMeta(type):
         else:
             new_class._urls = deepcopy(new_class._urls)
         new_class._urls.update(urls)
+        # Dispatchers of responses to URL objects, by BASEURL.
+        new_class._dispatchers = {}
         return new_class
 
 
@@ -589,6 +725,7 @@ class PagesBrowser(DomainBrowser):
 
 
     _urls = None
+    _dispatchers = None
     __metaclass__ = _PagesBrowserMeta
 
     def __getattr__(self, name):
@@ -622,8 +759,8 @@ class PagesBrowser(DomainBrowser):
         def internal_callback(response):
             # Try to handle the response page with an URL instance.
             response.page = None
-            for url in self._urls.itervalues():
-                page = url.handle(response)
+            for name, m in self.get_dispatcher().iter_matches(response.url):
+                page = self._urls[name].handle(response, m)
                 if page is not None:
                     self.logger.debug('Handle %s with %s' % (response.url, page.__class__.__name__))
                     response.page = page
@@ -636,6 +773,30 @@ class PagesBrowser(DomainBrowser):
 
         return super(PagesBrowser, self).open(callback=internal_callback, *args, **kwargs)
 
+    def get_dispatcher(self):
+        """
+        Get the index of URL objects, which is shared by browsers of this
+        class with the same BASEURL.
+
+        :rtype: :class:`weboob.browser.url.URLDispatcher`
+        """
+        dispatcher = self._dispatchers.get(self.BASEURL)
+        if dispatcher is None:
+            dispatcher = self._dispatchers[self.BASEURL] = URLDispatcher(self._urls.items(), self.BASEURL)
+        return dispatcher
+
+    def get_cache_ttl(self, url):
+        """
+        Same method than
+        :meth:`weboob.browser.browsers.Browser.get_cache_ttl`, but the TTL
+        declared by the first :class:`URL` object which matches the url is
+        used.
+        """
+        for name, m in self.get_dispatcher().iter_matches(url):
+            if self._urls[name].cache_ttl is not None:
+                return self._urls[name].cache_ttl
+        return super(PagesBrowser, self).get_cache_ttl(url)
+
     def location(self, *args, **kwargs):
         """
         Same method than
@@ -665,7 +826,8 @@ class PagesBrowser(DomainBrowser):
         This helper function can be used to handle pagination pages easily.
 
         When the called function raises an exception :class:`NextPage`, it goes
-        on the wanted page and recall the function.
+        on the wanted page and recall the function, unless the current call
+        on backends has been cancelled or has reached its deadline.
 
         :class:`NextPage` constructor can take an url or a Request object.
 
@@ -692,6 +854,9 @@ class PagesBrowser(DomainBrowser):
                 for r in func(*args, **kwargs):
                     yield r
             except NextPage as e:
+                if should_stop():
+                    self.logger.debug('Call is over, do not follow next page')
+                    return
                 self.location(e.request)
             else:
                 return
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import timedelta
+from email.utils import mktime_tz, parsedate_tz
+from threading import Lock
+from time import time
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from weboob.tools import metrics
+from weboob.tools.cache import MemoryCache
+from weboob.tools.log import getLogger
+
+
+__all__ = ['HTTPCache', 'parse_cache_control']
+
+
+def parse_cache_control(value):
+    """
+    Parse a Cache-Control header.
+
+    >>> sorted(parse_cache_control('public, max-age=3600, no-cache="Set-Cookie"').items())
+    [('max-age', '3600'), ('no-cache', 'Set-Cookie'), ('public', None)]
+
+    :rtype: :class:`dict`
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, arg = directive.partition('=')
+        name = name.strip().lower()
+        if name:
+            directives[name] = arg.strip().strip('"') if arg else None
+    return directives
+
+
+def parse_date(value):
+    """
+    Parse a date of a HTTP header.
+
+    >>> parse_date('Sun, 06 Nov 1994 08:49:37 GMT'), parse_date('0')
+    (784111777, None)
+
+    :returns: timestamp, or None if the date is invalid
+    """
+    if not value:
+        return None
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    try:
+        return mktime_tz(date)
+    except (OverflowError, ValueError):
+        return None
+
+
+class HTTPCache(object):
+    """
+    Private cache of HTTP responses to GET requests, used by
+    :class:`weboob.browser.browsers.Browser`.
+
+    Freshness of responses is computed from the Cache-Control, Expires and
+    Age headers. Stale responses with an ETag or a Last-Modified header are
+    revalidated with a conditional request. A TTL can be forced for
+    websites which do not send correct headers (see
+    :attr:`weboob.browser.browsers.Browser.CACHE_TTL`); it overrides
+    headers of responses, even no-cache and no-store.
+
+    Responses to requests sent with cookies or credentials are only stored
+    when a TTL is forced, as they may be pages of a logged in user, and the
+    store can be on disk.
+
+    Entries never expire from the store, so stale responses can be
+    revalidated; the store discards the least recently used ones.
+
+    :param store: where responses are stored; default is a
+                  :class:`weboob.tools.cache.MemoryCache`
+    :type store: :class:`weboob.tools.cache.ICache`
+    """
+
+    CACHEABLE_STATUS = (200, 203, 300, 301)
+
+    def __init__(self, store=None):
+        self.logger = getLogger('http-cache')
+        if store is None:
+            store = MemoryCache(100)
+        self.store = store
+        self.mutex = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def _count(self, result):
+        with self.mutex:
+            setattr(self, result, getattr(self, result) + 1)
+        if metrics.registry.enabled:
+            metrics.HTTP_CACHE.inc(result=result, backend=metrics.get_labels().get('backend'))
+
+    def get_key(self, url):
+        return ('http', urlparse(url).netloc, url)
+
+    def lookup(self, request, ttl=None):
+        """
+        Look for a stored response to a request.
+
+        :param request: request to send
+        :type request: :class:`requests.PreparedRequest`
+        :param ttl: forced TTL of responses, in seconds
+        :type ttl: :class:`float`
+        :returns: a response if a fresh one is stored, else the stored
+                  entry to give to :func:`handle` (None if the request can't
+                  be cached). Validators of the entry are added to headers
+                  of the request.
+        :rtype: tuple
+        """
+        if request.method != 'GET':
+            return None, None
+        if 'no-store' in parse_cache_control(request.headers.get('Cache-Control')):
+            return None, None
+
+        entry = self.store.get(self.get_key(request.url))
+        if entry is not None and any(request.headers.get(name) != value
+                                     for name, value in entry['vary'].iteritems()):
+            entry = None
+
+        if entry is None:
+            self._count('misses')
+            return None, {}
+
+        if 'no-cache' not in parse_cache_control(request.headers.get('Cache-Control')) and \
+           self.get_age(entry) < self.get_lifetime(entry, ttl):
+            self._count('hits')
+            self.logger.debug(u'Use cached response of %s', request.url)
+            return self.build_response(request, entry), None
+
+        if 'ETag' in entry['headers']:
+            request.headers.setdefault('If-None-Match', entry['headers']['ETag'])
+        if 'Last-Modified' in entry['headers']:
+            request.headers.setdefault('If-Modified-Since', entry['headers']['Last-Modified'])
+        return None, entry
+
+    def handle(self, request, response, entry, ttl=None):
+        """
+        Handle the response to a request which has been looked up.
+
+        :param entry: entry returned by :func:`lookup`
+        :type entry: :class:`dict`
+        :returns: the response to use
+        :rtype: :class:`requests.Response`
+        """
+        if entry and response.status_code == 304:
+            self._count('revalidated')
+            self.logger.debug(u'Cached response of %s is still valid', request.url)
+            # Headers of the 304 response update the stored ones.
+            entry['headers'].update((name, value) for name, value in response.headers.iteritems()
+                                    if name.lower() not in ('content-length', 'content-encoding', 'transfer-encoding'))
+            entry['stored'] = time()
+            self.store.set(self.get_key(request.url), entry)
+            return self.build_response(request, entry)
+
+        if entry:
+            self._count('misses')
+        if self.is_cacheable(response, ttl) and (ttl or not self.is_private(response)):
+            self.store.set(self.get_key(request.url), self.build_entry(request, response))
+        elif entry:
+            # The stored response is outdated.
+            self.store.delete(self.get_key(request.url))
+        return response
+
+    def is_cacheable(self, response, ttl=None):
+        """
+        Check if a response can be stored.
+
+        :rtype: :class:`bool`
+        """
+        if response.status_code not in self.CACHEABLE_STATUS or response.history:
+            return False
+        if ttl:
+            return True
+
+        headers = response.headers
+        if headers.get('Vary', '').strip() == '*' or 'no-store' in parse_cache_control(headers.get('Cache-Control')):
+            return False
+        # A response which is never fresh is only useful if it can be
+        # revalidated.
+        return 'ETag' in headers or 'Last-Modified' in headers or \
+               self.get_lifetime({'headers': headers}) > 0
+
+    def is_private(self, response):
+        """
+        Check if a response is specific to the session, because it sets
+        cookies or it is marked as private.
+
+        Responses to requests sent with cookies or credentials are not
+        private by themselves: the cache is used by one browser, or by the
+        clones of a backend browser, which share their session.
+
+        :rtype: :class:`bool`
+        """
+        return 'Set-Cookie' in response.headers or \
+               'private' in parse_cache_control(response.headers.get('Cache-Control'))
+
+    def build_entry(self, request, response):
+        headers = CaseInsensitiveDict(response.headers)
+        # Content is already decoded.
+        headers.pop('Content-Encoding', None)
+        headers.pop('Transfer-Encoding', None)
+        vary = {}
+        for name in headers.get('Vary', '').split(','):
+            name = name.strip()
+            if name:
+                vary[name] = request.headers.get(name)
+        return {'url': response.url,
+                'status': response.status_code,
+                'reason': response.reason,
+                'headers': headers,
+                'content': response.content,
+                'vary': vary,
+                'stored': time(),
+               }
+
+    def build_response(self, request, entry):
+        """
+        Build a response from a stored entry.
+
+        :rtype: :class:`requests.Response`
+        """
+        response = Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.url = entry['url']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = entry['content']
+        response._content_consumed = True
+        response.request = request
+        response.elapsed = timedelta(0)
+        response.from_cache = True
+        return response
+
+    def get_age(self, entry):
+        try:
+            age = max(0, int(entry['headers'].get('Age', 0)))
+        except ValueError:
+            age = 0
+        return age + time() - entry['stored']
+
+    def get_lifetime(self, entry, ttl=None):
+        """
+        Get the number of seconds during which a stored response is fresh.
+        """
+        if ttl:
+            return ttl
+
+        headers = entry['headers']
+        directives = parse_cache_control(headers.get('Cache-Control'))
+        if 'no-cache' in directives:
+            return 0
+        if 'max-age' in directives:
+            try:
+                return int(directives['max-age'])
+            except ValueError:
+                return 0
+
+        expires = parse_date(headers.get('Expires'))
+        if expires is not None:
+            date = parse_date(headers.get('Date'))
+            return expires - (date if date is not None else entry.get('stored', time()))
+        return 0
+
+    def stats(self):
+        """
+        Get counters of requests handled by the cache.
+
+        :rtype: :class:`dict`
+        """
+        with self.mutex:
+            return {'hits': self.hits, 'misses': self.misses, 'revalidated': self.revalidated}
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from io import BytesIO
+try:
+    from httplib import HTTPMessage
+except ImportError:
+    from http.client import parse_headers
+    HTTPMessage = None
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.response import HTTPResponse
+
+from weboob.tools.cassette import Cassette, NoRecordedResponse
+
+
+__all__ = ['CassetteAdapter']
+
+
+# Content of responses is recorded decoded.
+SKIPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+def get_raw_headers(response):
+    """
+    Get headers of a response as they have been received, with repeated
+    ones like Set-Cookie not merged.
+
+    :rtype: list[(:class:`str`, :class:`str`)]
+    """
+    original = getattr(response.raw, '_original_response', None)
+    msg = getattr(original, 'msg', None)
+    if msg is None:
+        return list(response.headers.items())
+
+    if not isinstance(getattr(msg, 'headers', None), list):
+        return list(msg.items())
+
+    # Python 2 keeps raw lines of headers.
+    headers = []
+    for line in msg.headers:
+        if line[:1] in ' \t' and headers:
+            headers[-1] = (headers[-1][0], headers[-1][1] + ' ' + line.strip())
+        else:
+            name, _, value = line.partition(':')
+            headers.append((name.strip(), value.strip()))
+    return headers
+
+
+class OriginalResponse(object):
+    """
+    Replacement of the httplib response of a replayed response, from which
+    cookies are extracted.
+    """
+
+    def __init__(self, headers):
+        data = ''.join('%s: %s\r\n' % (name, value) for name, value in headers) + '\r\n'
+        if isinstance(data, unicode):
+            data = data.encode('latin-1')
+        if HTTPMessage is not None:
+            self.msg = HTTPMessage(BytesIO(data))
+        else:
+            self.msg = parse_headers(BytesIO(data))
+
+    def isclosed(self):
+        return True
+
+
+class CassetteAdapter(HTTPAdapter):
+    """
+    Transport adapter which records responses in a cassette, or replays
+    them without network access.
+
+    As it is the transport, every response is recorded, including the ones
+    of redirections, and cookies of replayed responses are handled as
+    usual.
+
+    :param cassette: cassette to use
+    :type cassette: :class:`weboob.tools.cassette.Cassette`
+    """
+
+    def __init__(self, cassette, *args, **kwargs):
+        super(CassetteAdapter, self).__init__(*args, **kwargs)
+        self.cassette = cassette
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if self.cassette.mode == Cassette.REPLAY:
+            interaction = self.cassette.play(request.method, request.url, request.body)
+            if interaction is None:
+                raise NoRecordedResponse(u'No recorded response for %s %s' % (request.method, request.url))
+
+            headers = interaction['headers']
+            raw = HTTPResponse(body=BytesIO(interaction['content']),
+                               headers=headers,
+                               status=interaction['status'],
+                               reason=interaction['reason'],
+                               preload_content=False,
+                               decode_content=False,
+                               original_response=OriginalResponse(headers))
+            return self.build_response(request, raw)
+
+        response = super(CassetteAdapter, self).send(request, stream=stream, timeout=timeout, verify=verify,
+                                                     cert=cert, proxies=proxies)
+        self.cassette.record(request.method, request.url, request.body,
+                             response.status_code, response.reason,
+                             [(name, value) for name, value in get_raw_headers(response)
+                              if name.lower() not in SKIPPED_HEADERS],
+                             response.content)
+        return response
@@ -20,8 +20,11 @@
 import re
 import sys
 from copy import deepcopy
+from time import time
 
 from weboob.tools.log import getLogger, DEBUG_FILTERS
+from weboob.tools import metrics
+from weboob.tools.tracing import get_tracer
 from weboob.tools.ordereddict import OrderedDict
 from weboob.browser.pages import NextPage
 
@@ -136,6 +139,21 @@ class ListElement(AbstractElement):
             yield self.el
 
     def __iter__(self):
+        tracer = get_tracer()
+        if tracer is None:
+            return self._iter()
+        return self._traced_iter(tracer)
+
+    def _traced_iter(self, tracer):
+        # Time spent by the consumer between two objects is included.
+        with tracer.span(self.__class__.__name__, 'element') as span:
+            count = 0
+            for obj in self._iter():
+                count += 1
+                yield obj
+            span.args['objects'] = count
+
+    def _iter(self):
         self.parse(self.el)
 
         items = []
@@ -249,6 +267,7 @@ class ItemElement(AbstractElement):
         if self.condition is not None and not self.condition():
             return
 
+        start = time()
         try:
             if self.obj is None:
                 self.obj = self.build_object()
@@ -258,6 +277,14 @@ class ItemElement(AbstractElement):
                 self.handle_attr(attr, getattr(self, 'obj_%s' % attr))
         except SkipItem:
             return
+        finally:
+            if metrics.registry.enabled:
+                metrics.ITEM_DURATION.observe(time() - start,
+                                              **dict(metrics.get_labels(), page=self.page.__class__.__name__,
+                                                     element=self.__class__.__name__))
+            tracer = get_tracer()
+            if tracer is not None:
+                tracer.add(self.__class__.__name__, 'element', start, time())
 
         if self.validate is not None and not self.validate(self.obj):
             return
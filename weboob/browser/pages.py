@@ -21,6 +21,7 @@ from __future__ import absolute_import
 
 import warnings
 from io import BytesIO
+from time import time
 import codecs
 from cgi import parse_header
 
@@ -28,6 +29,8 @@ import requests
 
 from weboob.tools.ordereddict import OrderedDict
 from weboob.tools.compat import basestring
+from weboob.tools.callcontext import should_stop
+from weboob.tools import metrics
 
 from weboob.tools.log import getLogger
 
@@ -37,7 +40,8 @@ def pagination(func):
     This helper decorator can be used to handle pagination pages easily.
 
     When the called function raises an exception :class:`NextPage`, it goes on
-    the wanted page and recall the function.
+    the wanted page and recall the function, unless the current call on
+    backends has been cancelled or has reached its deadline.
 
     :class:`NextPage` constructor can take an url or a Request object.
 
@@ -67,6 +71,9 @@ def pagination(func):
                 for r in func(page, *args, **kwargs):
                     yield r
             except NextPage as e:
+                if should_stop():
+                    page.logger.debug('Call is over, do not follow next page')
+                    return
                 result = page.browser.location(e.request)
                 page = result.page
             else:
@@ -133,7 +140,7 @@ class Page(object):
         self.forced_encoding = encoding or self.ENCODING
         if self.forced_encoding:
             self.response.encoding = self.forced_encoding
-        self.doc = self.build_doc(self.data)
+        self.doc = self._build_doc()
 
         # Last chance to change encoding, according to :meth:`detect_encoding`,
         # which can be used to detect a document-level encoding declaration
@@ -141,7 +148,7 @@ class Page(object):
             encoding = self.detect_encoding()
             if encoding and encoding != self.encoding:
                 self.response.encoding = encoding
-                self.doc = self.build_doc(self.data)
+                self.doc = self._build_doc()
 
     # Encoding issues are delegated to Response instance, implemented by
     # requests module.
@@ -186,6 +193,17 @@ class Page(object):
         Event called when browser leaves this page.
         """
 
+    def _build_doc(self):
+        if not metrics.registry.enabled:
+            return self.build_doc(self.data)
+
+        start = time()
+        try:
+            return self.build_doc(self.data)
+        finally:
+            metrics.PARSE_DURATION.observe(time() - start,
+                                           **dict(metrics.get_labels(), page=self.__class__.__name__))
+
     def build_doc(self, content):
         """
         Abstract method to be implemented by subclasses to build structured
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Lock
+
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from requests.packages.urllib3.connectionpool import port_by_scheme
+from requests.packages.urllib3.poolmanager import PoolManager
+
+from weboob.tools.log import getLogger
+
+
+__all__ = ['SharedPoolManager', 'SharedPoolAdapter', 'get_pool_manager']
+
+
+def get_pool_name(pool):
+    """
+    >>> from requests.packages.urllib3 import HTTPSConnectionPool
+    >>> get_pool_name(HTTPSConnectionPool('weboob.org'))
+    'https://weboob.org:443'
+    """
+    return '%s://%s:%s' % (pool.scheme, pool.host, pool.port or port_by_scheme.get(pool.scheme))
+
+
+class SharedPoolManager(PoolManager):
+    """
+    Pool manager shared by browsers of the process, so they reuse the
+    connections opened by each other to a host.
+
+    Every host has a pool of :attr:`maxsize` connections, which grows to
+    the largest ``MAX_WORKERS`` of browsers using the manager (see
+    :func:`reserve`), unless a limit is set for this host with
+    :func:`set_limit`.
+
+    >>> manager = SharedPoolManager()
+    >>> manager.reserve(20)
+    >>> manager.set_limit('bank.example.org', 4)
+    >>> manager.connection_from_host('weboob.org').pool.maxsize
+    20
+    >>> pool = manager.connection_from_host('bank.example.org', 443, 'https')
+    >>> pool.pool.maxsize, pool.block
+    (4, True)
+
+    :param num_pools: number of hosts for which pools are kept
+    :type num_pools: :class:`int`
+    :param maxsize: default size of pools
+    :type maxsize: :class:`int`
+    """
+
+    def __init__(self, num_pools=100, maxsize=DEFAULT_POOLSIZE, **kwargs):
+        super(SharedPoolManager, self).__init__(num_pools=num_pools, maxsize=maxsize, **kwargs)
+        self.logger = getLogger('pools')
+        self.mutex = Lock()
+        self.limits = {}
+        # Counters of pools which have been discarded.
+        self.closed_stats = {}
+        self.pools.dispose_func = self._dispose
+
+    def _dispose(self, pool):
+        with self.mutex:
+            stats = self.closed_stats.setdefault(get_pool_name(pool), {'connections': 0, 'requests': 0})
+            stats['connections'] += pool.num_connections
+            stats['requests'] += pool.num_requests
+        pool.close()
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        if request_context is None:
+            request_context = self.connection_pool_kw.copy()
+        limit = self.limits.get(host)
+        if limit is not None:
+            # Requests wait for a free connection, so the limit is kept.
+            request_context.update(maxsize=limit, block=True)
+        return super(SharedPoolManager, self)._new_pool(scheme, host, port, request_context)
+
+    def _discard_pools(self, func):
+        with self.pools.lock:
+            for key in list(self.pools.keys()):
+                pool = self.pools.get(key)
+                if pool is not None and func(pool):
+                    # In-flight connections will be closed when released.
+                    del self.pools[key]
+
+    def reserve(self, maxsize):
+        """
+        Grow pools so they can serve at least `maxsize` simultaneous
+        requests to a host, except for hosts with a limit.
+
+        :type maxsize: :class:`int`
+        """
+        with self.mutex:
+            if maxsize <= self.connection_pool_kw['maxsize']:
+                return
+            self.connection_pool_kw['maxsize'] = maxsize
+        self.logger.debug(u'Pools grow to %d connections per host', maxsize)
+        self._discard_pools(lambda pool: pool.host not in self.limits and pool.pool is not None and
+                            pool.pool.maxsize < maxsize)
+
+    def set_limit(self, host, maxsize):
+        """
+        Limit the number of simultaneous connections to a host, for every
+        browser using the manager.
+
+        :param host: hostname
+        :type host: :class:`str`
+        :param maxsize: maximum number of connections, or None to remove
+                        the limit
+        :type maxsize: :class:`int`
+        """
+        with self.mutex:
+            if maxsize is None:
+                self.limits.pop(host, None)
+            else:
+                self.limits[host] = maxsize
+        self._discard_pools(lambda pool: pool.host == host)
+
+    def stats(self):
+        """
+        Get counters of connections by pool, to check how much keep-alive
+        connections are reused.
+
+        :returns: dict of ``scheme://host:port`` to dicts with the number of
+                  `connections` opened, of `requests` sent, and of requests
+                  which have `reused` a connection
+        :rtype: :class:`dict`
+        """
+        with self.mutex:
+            stats = dict((name, dict(values)) for name, values in self.closed_stats.iteritems())
+        with self.pools.lock:
+            pools = [self.pools.get(key) for key in self.pools.keys()]
+
+        for pool in pools:
+            if pool is None:
+                continue
+            values = stats.setdefault(get_pool_name(pool), {'connections': 0, 'requests': 0})
+            values['connections'] += pool.num_connections
+            values['requests'] += pool.num_requests
+
+        for values in stats.itervalues():
+            values['reused'] = max(0, values['requests'] - values['connections'])
+        return stats
+
+
+_manager = None
+_manager_lock = Lock()
+
+
+def get_pool_manager():
+    """
+    Get the pool manager shared by browsers of the process.
+
+    :rtype: :class:`SharedPoolManager`
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SharedPoolManager()
+        return _manager
+
+
+class SharedPoolAdapter(HTTPAdapter):
+    """
+    Transport adapter which uses the pool manager shared by browsers of the
+    process (see :func:`get_pool_manager`). Connections through proxies are
+    not shared.
+
+    The `pool_maxsize` argument is reserved in the shared manager.
+    """
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+
+        self.poolmanager = get_pool_manager()
+        self.poolmanager.reserve(maxsize)
+
+    def close(self):
+        # Pools are used by other browsers.
+        for proxy in self.proxy_manager.values():
+            proxy.clear()
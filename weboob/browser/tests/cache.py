@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from threading import Thread
+from unittest import TestCase
+
+from requests import Request
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from weboob.browser import Browser, PagesBrowser, URL
+from weboob.browser.cache import HTTPCache
+from weboob.browser.pages import Page
+
+
+PAGE_URL = 'http://weboob.org/page'
+
+
+def make_request(**headers):
+    return Request('GET', PAGE_URL, headers=dict((key.replace('_', '-'), value) for key, value in headers.items())).prepare()
+
+
+def make_response(status=200, content='<html></html>', **headers):
+    response = Response()
+    response.status_code = status
+    response.url = PAGE_URL
+    response.headers = CaseInsensitiveDict(dict((key.replace('_', '-'), value) for key, value in headers.items()))
+    response._content = content
+    return response
+
+
+# Class that tests lookup of requests and storage of responses
+class HTTPCacheTest(TestCase):
+
+    def setUp(self):
+        self.cache = HTTPCache()
+
+    def fetch(self, response, ttl=None, **headers):
+        request = make_request(**headers)
+        cached, entry = self.cache.lookup(request, ttl)
+        if cached is not None:
+            return request, cached
+        if entry is None:
+            return request, response
+        return request, self.cache.handle(request, response, entry, ttl)
+
+    def test_fresh(self):
+        self.fetch(make_response(Cache_Control='max-age=60', content='one'))
+        request, response = self.fetch(make_response(content='two'))
+        self.assertEqual(response.content, 'one')
+        self.assertTrue(response.from_cache)
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'revalidated': 0})
+
+    def test_revalidate(self):
+        self.fetch(make_response(Cache_Control='no-cache', ETag='"v1"', content='one'))
+        request, response = self.fetch(make_response(304, content=''))
+        self.assertEqual(request.headers['If-None-Match'], '"v1"')
+        self.assertEqual(response.content, 'one')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cache.stats()['revalidated'], 1)
+
+    def test_modified(self):
+        self.fetch(make_response(Last_Modified='Sun, 06 Nov 1994 08:49:37 GMT', content='one'))
+        request, response = self.fetch(make_response(Last_Modified='Mon, 07 Nov 1994 08:49:37 GMT', content='two'))
+        self.assertEqual(request.headers['If-Modified-Since'], 'Sun, 06 Nov 1994 08:49:37 GMT')
+        self.assertEqual(response.content, 'two')
+        request, response = self.fetch(make_response(304, content=''))
+        self.assertEqual(request.headers['If-Modified-Since'], 'Mon, 07 Nov 1994 08:49:37 GMT')
+        self.assertEqual(response.content, 'two')
+
+    def test_not_cacheable(self):
+        self.fetch(make_response(Cache_Control='no-store, max-age=60', content='one'))
+        self.fetch(make_response(content='two'))
+        request, response = self.fetch(make_response(content='three'))
+        self.assertEqual(response.content, 'three')
+
+    def test_forced_ttl(self):
+        self.fetch(make_response(Cache_Control='no-store', content='one'), ttl=60)
+        request, response = self.fetch(make_response(content='two'), ttl=60)
+        self.assertEqual(response.content, 'one')
+
+    def test_private(self):
+        for headers in ({'Cache_Control': 'max-age=60', 'Set_Cookie': 'session=42'},
+                        {'Cache_Control': 'private, max-age=60'}):
+            self.fetch(make_response(content='one', **headers))
+            request, response = self.fetch(make_response(content='two'))
+            self.assertEqual(response.content, 'two')
+
+        # Unless a TTL is forced.
+        self.fetch(make_response(content='one', Set_Cookie='session=42'), ttl=60)
+        request, response = self.fetch(make_response(content='two'), ttl=60)
+        self.assertEqual(response.content, 'one')
+
+    def test_credentials(self):
+        # Requests of a session are cached.
+        for headers in ({'Cookie': 'session=42'}, {'Authorization': 'Basic dXNlcjpwYXNz'}):
+            self.cache = HTTPCache()
+            self.fetch(make_response(Cache_Control='max-age=60', content='one'), **headers)
+            request, response = self.fetch(make_response(content='two'), **headers)
+            self.assertEqual(response.content, 'one')
+
+    def test_vary(self):
+        self.fetch(make_response(Cache_Control='max-age=60', Vary='Accept-Language', content='fr'),
+                   Accept_Language='fr')
+        request, response = self.fetch(make_response(content='en'), Accept_Language='en')
+        self.assertEqual(response.content, 'en')
+
+
+class MyMockBrowser(PagesBrowser):
+    BASEURL = 'http://weboob.org'
+    CACHE_TTL = 10
+
+    page = URL('/page$', Page, cache_ttl=60)
+    static = URL('/static/(?P<name>.+)', cache_ttl=3600)
+    other = URL('/(?P<name>.+)', Page)
+
+
+# Class that tests TTLs declared by URL objects
+class CacheTTLTest(TestCase):
+
+    def test_url_ttl(self):
+        browser = MyMockBrowser()
+        self.assertEqual(browser.get_cache_ttl(PAGE_URL), 60)
+        # URL objects without a page class are also used.
+        self.assertEqual(browser.get_cache_ttl('http://weboob.org/static/style.css'), 3600)
+        self.assertEqual(browser.get_cache_ttl('http://weboob.org/other'), 10)
+        self.assertEqual(browser.get_cache_ttl('http://example.org/page'), 10)
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('Cookie')))
+        content = 'response %d' % len(self.server.requests)
+        self.send_response(200)
+        self.send_header('Cache-Control', 'max-age=60')
+        if self.path == '/login':
+            self.send_header('Set-Cookie', 'session=42; Path=/')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class PageServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        HTTPServer.__init__(self, *args, **kwargs)
+        # Paths and cookies of requests.
+        self.requests = []
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class CachedBrowser(Browser):
+    HTTP_CACHE = True
+
+
+# Class that tests the HTTP cache of a browser with a session
+class BrowserCacheTest(TestCase):
+
+    def setUp(self):
+        self.server = PageServer(('127.0.0.1', 0), PageHandler)
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+        self.browser = CachedBrowser()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session(self):
+        # Responses setting cookies are not stored.
+        self.browser.open(self.url + 'login')
+        self.browser.open(self.url + 'login')
+        self.assertEqual(self.browser.session.cookies.get('session'), '42')
+
+        response = self.browser.open(self.url + 'page')
+        self.assertEqual(response.text, 'response 3')
+        response = self.browser.open(self.url + 'page')
+        self.assertEqual(response.text, 'response 3')
+        self.assertTrue(response.from_cache)
+        self.assertEqual(self.server.requests, [('/login', None), ('/login', 'session=42'), ('/page', 'session=42')])
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from weboob.browser import Browser
+from weboob.tools.cassette import Cassette, NoRecordedResponse
+
+
+# Class that tests browsers replaying recorded responses
+class CassetteTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='weboob_test_')
+        self.path = os.path.join(self.tmpdir, 'test.cassette')
+
+        cassette = Cassette(self.path, Cassette.RECORD)
+        cassette.record('GET', 'http://weboob.org/', None, 302, 'Found',
+                        [('Location', 'http://weboob.org/home'),
+                         ('Set-Cookie', 'a=1; Path=/'),
+                         ('Set-Cookie', 'b=2; Path=/; expires=Wed, 01 Jan 2031 00:00:00 GMT')],
+                        '')
+        cassette.record('GET', 'http://weboob.org/home', None, 200, 'OK',
+                        [('Content-Type', 'text/html')], '<html>one</html>')
+        cassette.record('POST', 'http://weboob.org/form', 'a=1', 200, 'OK', [], 'posted')
+        cassette.save()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_replay(self):
+        browser = Browser(cassette=Cassette(self.path, Cassette.REPLAY))
+        response = browser.open('http://weboob.org/')
+        self.assertEqual(response.url, 'http://weboob.org/home')
+        self.assertEqual(response.text, '<html>one</html>')
+        self.assertEqual([r.status_code for r in response.history], [302])
+        self.assertEqual(browser.session.cookies.get_dict(), {'a': '1', 'b': '2'})
+
+        self.assertEqual(browser.open('http://weboob.org/form', data={'a': '1'}).content, 'posted')
+        self.assertRaises(NoRecordedResponse, browser.open, 'http://weboob.org/other')
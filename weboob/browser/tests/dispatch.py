@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function
+
+import re
+from time import time
+from unittest import TestCase
+
+from weboob.browser import PagesBrowser, URL
+from weboob.browser.pages import Page
+from weboob.browser.url import get_literal_prefix
+
+
+class MyMockPage(Page):
+    pass
+
+
+# Mock of a big browser, with URLs on several hosts
+class MyMockBrowser(PagesBrowser):
+    BASEURL = 'https://www.weboob.org'
+
+    home = URL('/$', '/index\.html', MyMockPage)
+    accounts = URL('/accounts\?id=(?P<id>\d+)', MyMockPage)
+    history = URL('/accounts/(?P<id>\d+)/history', MyMockPage)
+    noklass = URL('/accounts/(?P<id>\d+)')
+    anyhost = URL('https?://[^/]+/news/(?P<id>\d+)', MyMockPage)
+    other = URL('https://other\.weboob\.org/(?P<page>\w+)', MyMockPage)
+    alternation = URL('https://a\.org/x|https://b\.org/y', MyMockPage)
+
+
+def naive_matches(browser, url):
+    # How PagesBrowser used to look for URL objects matching an url.
+    for name, obj in browser._urls.iteritems():
+        if obj.klass is None:
+            continue
+        for regex in obj.urls:
+            if not re.match(r'^\w+://.*', regex):
+                regex = re.escape(browser.BASEURL).rstrip('/') + '/' + regex.lstrip('/')
+            m = re.match(regex, url)
+            if m:
+                yield name, m.groupdict()
+                break
+
+
+class URLDispatcherTest(TestCase):
+    URLS = ['https://www.weboob.org/',
+            'https://www.weboob.org/index.html',
+            'https://www.weboob.org/accounts?id=42',
+            'https://www.weboob.org/accounts/42',
+            'https://www.weboob.org/accounts/42/history',
+            'https://www.weboob.org/news/3',
+            'http://www.weboob.org/news/3',
+            'https://other.weboob.org/news/3',
+            'https://other.weboob.org/',
+            'https://a.org/x',
+            'https://b.org/y',
+            'https://c.org/z',
+            'https://www.weboob.org',
+           ]
+
+    def setUp(self):
+        self.browser = MyMockBrowser()
+
+    def test_literal_prefix(self):
+        self.assertEqual(get_literal_prefix(r'https://www\.weboob\.org/accounts\?id=(?P<id>\d+)'),
+                         'https://www.weboob.org/accounts?id=')
+        self.assertEqual(get_literal_prefix(r'^http://a\.org/b+'), 'http://a.org/b')
+        self.assertEqual(get_literal_prefix(r'http://a\.org/bc?'), 'http://a.org/b')
+        self.assertEqual(get_literal_prefix(r'http://a\.org/\d'), 'http://a.org/')
+        self.assertEqual(get_literal_prefix(r'http://a\.org/(b|c)'), 'http://a.org/')
+        self.assertEqual(get_literal_prefix(r'(?i)http://a\.org/'), '')
+
+    def test_same_matches(self):
+        dispatcher = self.browser.get_dispatcher()
+        for url in self.URLS:
+            matches = [(name, m.groupdict()) for name, m in dispatcher.iter_matches(url)]
+            self.assertEqual(matches, list(naive_matches(self.browser, url)), url)
+
+    def test_shared_by_baseurl(self):
+        dispatcher = self.browser.get_dispatcher()
+        self.assertIs(MyMockBrowser().get_dispatcher(), dispatcher)
+
+        browser = MyMockBrowser()
+        browser.BASEURL = 'https://www2.weboob.org'
+        self.assertIsNot(browser.get_dispatcher(), dispatcher)
+        self.assertEqual([name for name, m in browser.get_dispatcher().iter_matches('https://www2.weboob.org/')],
+                         ['home'])
+
+
+def bench(n_urls=40, n_lookups=2000):
+    """
+    Compare the time to find URL objects matching urls, with a loop on every
+    URL object and with :class:`weboob.browser.url.URLDispatcher`.
+
+    $ python -m weboob.browser.tests.dispatch
+    """
+    attrs = {'BASEURL': 'https://www.weboob.org'}
+    for i in xrange(n_urls):
+        attrs['url%d' % i] = URL('/section%d/(?P<id>\d+)\.html' % i, '/section%d/list\?page=(?P<page>\d+)' % i,
+                                 MyMockPage)
+    browser = type('BenchBrowser', (PagesBrowser,), attrs)()
+    urls = ['https://www.weboob.org/section%d/%d.html' % (i % n_urls, i) for i in xrange(n_lookups)]
+
+    start = time()
+    for url in urls:
+        next(naive_matches(browser, url), None)
+    naive = time() - start
+
+    start = time()
+    for url in urls:
+        next(browser.get_dispatcher().iter_matches(url), None)
+    dispatched = time() - start
+
+    print('%d lookups on %d URL objects:' % (n_lookups, n_urls))
+    print('  loop on URL objects: %.3fs' % naive)
+    print('  dispatcher:          %.3fs (x%.1f)' % (dispatched, naive / dispatched))
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from threading import Thread
+from unittest import TestCase
+
+from weboob.browser import Browser
+from weboob.browser.pools import SharedPoolManager, get_pool_manager
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class KeepAliveServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class SharedBrowser(Browser):
+    SHARED_POOLS = True
+    MAX_WORKERS = 16
+
+
+# Class that tests connections shared by browsers
+class SharedPoolsTest(TestCase):
+
+    def setUp(self):
+        self.server = KeepAliveServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+
+    def tearDown(self):
+        # Close idle keep-alive connections, so handlers of the server end.
+        get_pool_manager().clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_stats(self, manager):
+        return manager.stats().get(self.url.rstrip('/'), {})
+
+    def test_shared(self):
+        manager = get_pool_manager()
+        before = self.get_stats(manager)
+
+        browsers = [SharedBrowser(), SharedBrowser()]
+        self.assertIs(browsers[0].session.get_adapter(self.url).poolmanager, manager)
+        self.assertGreaterEqual(manager.connection_pool_kw['maxsize'], 16)
+        for browser in browsers * 2:
+            browser.open(self.url)
+
+        after = self.get_stats(manager)
+        self.assertEqual(after['requests'] - before.get('requests', 0), 4)
+        self.assertEqual(after['connections'] - before.get('connections', 0), 1)
+
+        browsers[0].session.close()
+        browsers[1].open(self.url)
+        self.assertEqual(self.get_stats(manager)['connections'], after['connections'])
+
+    def test_not_shared(self):
+        browser = Browser()
+        self.assertIsNot(browser.session.get_adapter(self.url).poolmanager, get_pool_manager())
+
+    def test_limit(self):
+        manager = SharedPoolManager()
+        manager.connection_from_url(self.url).urlopen('GET', '/')
+        manager.set_limit('127.0.0.1', 1)
+        pool = manager.connection_from_url(self.url)
+        self.assertEqual((pool.pool.maxsize, pool.block), (1, True))
+        pool.urlopen('GET', '/')
+        # Counters of the discarded pool are kept.
+        self.assertEqual(self.get_stats(manager), {'connections': 2, 'requests': 2, 'reused': 0})
+        manager.clear()
@@ -45,6 +45,8 @@ class MyMockBrowser(PagesBrowser):
     # URL used by method build
     urlValue = URL("http://test.com/(?P<id>\d+)")
     urlParams = URL("http://test.com\?id=(?P<id>\d+)&name=(?P<name>.+)")
+    urlSeveralPatterns = URL("http://test.com/(?P<id>\d+)/(?P<name>.+)",
+                             "http://test.com/(?P<id>\d+)")
 
     # URL used by method is_here
     urlIsHere = URL('http://weboob.org/(?P<param>)', MyMockPage)
@@ -122,6 +124,14 @@ class URLTest(TestCase):
         self.assertRaises(UrlNotResolvable, self.myBrowser.urlParams.build,
                           id=2, name="weboob", title="test")
 
+    # Checks that build uses the pattern which takes exactly the given
+    # parameters
+    def test_build_several_patterns(self):
+        self.assertEquals(self.myBrowser.urlSeveralPatterns.build(id=2),
+                          "http://test.com/2")
+        self.assertEquals(self.myBrowser.urlSeveralPatterns.build(id=2, name="weboob"),
+                          "http://test.com/2/weboob")
+
     # Check that an assert is sent if both klass is none
     def test_ishere_klass_none(self):
         self.assertRaisesRegexp(AssertionError, "You can use this method" +
@@ -25,6 +25,78 @@ import re
 import requests
 
 from weboob.tools.regex_helper import normalize
+from weboob.tools.tracing import span
+
+
+__all__ = ['URL', 'URLDispatcher', 'UrlNotResolvable', 'get_literal_prefix']
+
+
+# Compiled regexps of URLs, by (base, regexp). The cache of the re module is
+# too small (and entirely flushed when full) for browsers with many URLs.
+_regexes = {}
+
+# Templates to build urls from regexps of URLs, by regexps.
+_templates = {}
+
+
+def get_literal_prefix(regex):
+    r"""
+    Get the literal string every url matched by a regexp starts with.
+
+    >>> get_literal_prefix(r'http://example\.org/list-(?P<id>\d+)\.html')
+    'http://example.org/list-'
+    >>> get_literal_prefix(r'https?://example\.org/'), get_literal_prefix(r'a|b')
+    ('http', '')
+
+    :rtype: :class:`str`
+    """
+    # A top-level alternation means that there is no common prefix.
+    depth = 0
+    escaped = False
+    for c in regex:
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == '|' and depth == 0:
+            return ''
+
+    prefix = []
+    i = 1 if regex.startswith('^') else 0
+    while i < len(regex):
+        c = regex[i]
+        if c == '\\' and i + 1 < len(regex) and not regex[i + 1].isalnum():
+            c = regex[i + 1]
+            i += 2
+        elif c in '.^$*+?{}[]|()\\':
+            break
+        else:
+            i += 1
+        if i < len(regex) and regex[i] in '*?{':
+            # This character is optional.
+            break
+        prefix.append(c)
+    return ''.join(prefix)
+
+
+def get_host(url):
+    """
+    Get the scheme and host of an url, or None if it has no complete host.
+
+    >>> get_host('http://example.org/list.html'), get_host('http://example.org'), get_host('http://ex')
+    ('http://example.org', None, None)
+    """
+    start = url.find('://')
+    if start < 0:
+        return None
+    for i in xrange(start + 3, len(url)):
+        if url[i] in '/?#':
+            return url[:i]
+    return None
 
 
 class UrlNotResolvable(Exception):
@@ -39,13 +111,19 @@ class URL(object):
 
     It takes one or several regexps to match urls, and an optional Page
     class which is instancied by PagesBrowser.open if the page matches a regex.
+
+    The `cache_ttl` keyword argument is the number of seconds during which
+    responses are kept in the HTTP cache of the browser, whatever their
+    headers say (see :attr:`weboob.browser.browsers.Browser.CACHE_TTL`).
     """
     _creation_counter = 0
 
-    def __init__(self, *args):
+    def __init__(self, *args, **kwargs):
         self.urls = []
         self.klass = None
         self.browser = None
+        self.cache_ttl = kwargs.pop('cache_ttl', None)
+        assert not kwargs, 'Unknown arguments: %s' % ', '.join(kwargs)
         for arg in args:
             if isinstance(arg, basestring):
                 self.urls.append(arg)
@@ -125,32 +203,78 @@ class URL(object):
         """
         browser = kwargs.pop('browser', self.browser)
         params = kwargs.pop('params', None)
+        templates, patterns = self.get_templates()
+
+        # Use the first pattern which takes exactly the given arguments.
+        template = templates.get(frozenset(kwargs))
+        if template is None:
+            raise UrlNotResolvable('Unable to resolve URL with %r. Available are %s' % (kwargs, ', '.join(patterns)))
+
+        url = template % dict((key, unicode(value)) for key, value in kwargs.iteritems())
+        url = browser.absurl(url, base=True)
+        if params:
+            p = requests.models.PreparedRequest()
+            p.prepare_url(url, params)
+            url = p.url
+        return url
+
+    def get_templates(self):
+        """
+        Get templates to build urls from regexps of this URL, computed
+        once for all.
+
+        >>> templates, patterns = URL('/list-(?P<page>\\d+)', '/list').get_templates()
+        >>> templates[frozenset(['page'])], templates[frozenset()]
+        (u'/list-%(page)s', u'/list')
+
+        :returns: templates to format with arguments, by names of
+                  arguments, and patterns of urls
+        :rtype: tuple[:class:`dict`, :class:`list`]
+        """
+        key = tuple(self.urls)
+        try:
+            return _templates[key]
+        except KeyError:
+            pass
+
+        templates = {}
         patterns = []
         for url in self.urls:
-            patterns += normalize(url)
-
-        for pattern, _ in patterns:
-            url = pattern
-            # only use full-name substitutions, to allow % in URLs
-            for kwkey in kwargs.keys():  # need to use keys() because of pop()
-                search = '%%(%s)s' % kwkey
-                if search in pattern:
-                    url = url.replace(search, unicode(kwargs.pop(kwkey)))
-            # if there are named substitutions left, ignore pattern
-            if re.search('%\([A-z_]+\)s', url):
-                continue
-            # if not all kwargs were used
-            if len(kwargs):
-                continue
-
-            url = browser.absurl(url, base=True)
-            if params:
-                p = requests.models.PreparedRequest()
-                p.prepare_url(url, params)
-                url = p.url
-            return url
+            for pattern, names in normalize(url):
+                patterns.append(pattern)
+                # Only use full-name substitutions, to allow % in URLs.
+                parts = re.split(r'%\((\w+)\)s', pattern)
+                template = []
+                for i, part in enumerate(parts):
+                    if i % 2 and part in names:
+                        template.append(u'%%(%s)s' % part)
+                    elif i % 2:
+                        template.append((u'%%(%s)s' % part).replace(u'%', u'%%'))
+                    else:
+                        template.append(part.replace(u'%', u'%%'))
+                templates.setdefault(frozenset(names), u''.join(template))
+
+        _templates[key] = templates, patterns
+        return templates, patterns
+
+    def get_regexes(self, base):
+        """
+        Get compiled regexps of this URL, relative ones being joined to
+        *base*.
 
-        raise UrlNotResolvable('Unable to resolve URL with %r. Available are %s' % (kwargs, ', '.join([pattern for pattern, _ in patterns])))
+        :rtype: list
+        """
+        regexes = []
+        for regex in self.urls:
+            compiled = _regexes.get((base, regex))
+            if compiled is None:
+                if re.match(r'^\w+://.*', regex):
+                    compiled = re.compile(regex)
+                else:
+                    compiled = re.compile(re.escape(base).rstrip('/') + '/' + regex.lstrip('/'))
+                _regexes[(base, regex)] = compiled
+            regexes.append(compiled)
+        return regexes
 
     def match(self, url, base=None):
         """
@@ -160,23 +284,26 @@ class URL(object):
             assert self.browser is not None
             base = self.browser.BASEURL
 
-        for regex in self.urls:
-            if not re.match(r'^\w+://.*', regex):
-                regex = re.escape(base).rstrip('/') + '/' + regex.lstrip('/')
-            m = re.match(regex, url)
+        for regex in self.get_regexes(base):
+            m = regex.match(url)
             if m:
                 return m
 
-    def handle(self, response):
+    def handle(self, response, m=None):
         """
         Handle a HTTP response to get an instance of the klass if it matches.
+
+        :param m: result of :func:`match` on the url of response, if it is
+                  already known
         """
         if self.klass is None:
             return
 
-        m = self.match(response.url)
+        if m is None:
+            m = self.match(response.url)
         if m:
-            page = self.klass(self.browser, response, m.groupdict())
+            with span(self.klass.__name__, 'page'):
+                page = self.klass(self.browser, response, m.groupdict())
             if hasattr(page, 'is_here'):
                 if callable(page.is_here):
                     if page.is_here():
@@ -201,3 +328,66 @@ class URL(object):
 
             return func(browser, id_or_url, *args, **kwargs)
         return inner
+
+
+class URLDispatcher(object):
+    """
+    Index of regexps of :class:`URL` objects of a browser, to find which
+    ones match an url without trying every regexp.
+
+    Regexps are indexed by the host they start with, and an url is only
+    checked against the ones of its host (and the ones without a known
+    host) whose literal prefix it starts with.
+
+    >>> from weboob.browser.pages import Page
+    >>> urls = [('home', URL('/(index\\.html)?$', Page)), ('other', URL('http://other\\.org/(?P<id>\\d+)', Page))]
+    >>> dispatcher = URLDispatcher(urls, 'http://example.org')
+    >>> [(name, m.groupdict()) for name, m in dispatcher.iter_matches('http://other.org/42')]
+    [('other', {'id': '42'})]
+
+    :param urls: names and URL objects, in the order they are tried
+    :type urls: list[(:class:`str`, :class:`URL`)]
+    :param base: base url of relative regexps
+    :type base: :class:`str`
+    """
+
+    def __init__(self, urls, base):
+        self.base = base
+        self.hosts = {}
+        others = []
+        for order, (name, url) in enumerate(urls):
+            # URL objects without a page class are only needed to find
+            # their TTL in the HTTP cache.
+            if url.klass is None and url.cache_ttl is None:
+                continue
+            for regex in url.get_regexes(base):
+                prefix = get_literal_prefix(regex.pattern)
+                entry = (order, prefix, regex, name)
+                host = get_host(prefix)
+                if host is None:
+                    others.append(entry)
+                else:
+                    self.hosts.setdefault(host, []).append(entry)
+
+        # Regexps without a known host are tried for every url, so they are
+        # merged once for all with the ones of each host.
+        self.others = others
+        for host, entries in self.hosts.iteritems():
+            self.hosts[host] = sorted(entries + others, key=lambda entry: entry[0])
+
+    def iter_matches(self, url):
+        """
+        Iter on URL objects which match an url, in order.
+
+        :returns: names of URL objects and match objects
+        :rtype: iter[(:class:`str`, match)]
+        """
+        seen = None
+        for order, prefix, regex, name in self.hosts.get(get_host(url), self.others):
+            if not url.startswith(prefix) or name == seen:
+                continue
+            m = regex.match(url)
+            if m:
+                # Only the first matching regexp of an URL is used.
+                seen = name
+                yield name, m
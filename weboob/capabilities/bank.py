@@ -185,6 +185,8 @@ class CapBank(CapCollection):
     Capability of bank websites to see accounts and transactions.
     """
 
+    CACHE_TTL = {'iter_accounts': 60, 'get_account': 60}
+
     def iter_resources(self, objs, split_path):
         """
         Iter resources.
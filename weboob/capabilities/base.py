@@ -115,6 +115,10 @@ class NotAvailableType(object):
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        # Keep the singleton when unpickled.
+        return 'NotAvailable'
+
     def __repr__(self):
         return 'NotAvailable'
 
@@ -144,6 +148,10 @@ class NotLoadedType(object):
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        # Keep the singleton when unpickled.
+        return 'NotLoaded'
+
     def __repr__(self):
         return u'NotLoaded'
 
@@ -166,6 +174,12 @@ class Capability(object):
     Also, it may define some *objects*, using :class:`BaseObject`.
     """
 
+    # Number of seconds during which results of idempotent methods can be
+    # cached (see :class:`weboob.core.cache.ResultsCache`).
+    # The key is the method name, and the value the TTL. A TTL of 0 means
+    # results are not cached, but can be shared by identical concurrent calls.
+    CACHE_TTL = {}
+
 
 class Field(object):
     """
@@ -350,6 +364,26 @@ class BaseObject(object):
     def __deepcopy__(self, memo):
         return self.copy()
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        fields = state.pop('_fields', None)
+        if fields is not None and fields.keys() == type(self)._fields.keys():
+            # Definitions of fields are known by the class, only keep values
+            # to have a compact pickle.
+            state['_values'] = [field.value for field in fields.itervalues()]
+        else:
+            state['_fields'] = fields
+        return state
+
+    def __setstate__(self, state):
+        state = state.copy()
+        values = state.pop('_values', None)
+        if values is not None:
+            state['_fields'] = deepcopy(type(self)._fields)
+            for field, value in zip(state['_fields'].itervalues(), values):
+                field.value = value
+        self.__dict__.update(state)
+
     def set_empty_fields(self, value, excepts=()):
         """
         Set the same value on all empty fields.
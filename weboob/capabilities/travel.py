@@ -100,6 +100,8 @@ class CapTravel(Capability):
     Travel websites.
     """
 
+    CACHE_TTL = {'iter_station_search': 86400, 'iter_station_departures': 30}
+
     def iter_station_search(self, pattern):
         """
         Iterates on search results of stations.
@@ -41,6 +41,8 @@ class CapVideo(CapImage):
     Video file provider.
     """
 
+    CACHE_TTL = {'search_videos': 0, 'get_video': 0}
+
     def search_videos(self, pattern, sortby=CapImage.SEARCH_RELEVANCE, nsfw=False):
         """
         search for a video file
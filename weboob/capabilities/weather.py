@@ -114,6 +114,8 @@ class CapWeather(Capability):
     Capability for weather websites.
     """
 
+    CACHE_TTL = {'iter_city_search': 86400, 'get_current': 300, 'iter_forecast': 1800}
+
     def iter_city_search(self, pattern):
         """
         Look for a city.
@@ -21,6 +21,9 @@
 import stat
 import os
 import sys
+import tempfile
+from contextlib import contextmanager
+from threading import RLock
 try:
     from ConfigParser import RawConfigParser, DuplicateSectionError
 except ImportError:
@@ -40,6 +43,13 @@ class BackendsConfig(object):
 
     def __init__(self, confpath):
         self.confpath = confpath
+        self.mutex = RLock()
+        # Parsed file, and the stat signature of the file it has been read from.
+        self._config = None
+        self._signature = None
+        # Depth of nested batch() blocks, and if the model has to be written.
+        self._batch = 0
+        self._dirty = False
         try:
             mode = os.stat(confpath).st_mode
         except OSError:
@@ -62,82 +72,195 @@ class BackendsConfig(object):
                     raise self.WrongPermissions(
                         u'Weboob will not start as long as config file %s is readable by group or other users.' % confpath)
 
-    def iter_backends(self):
-        config = RawConfigParser()
-        config.read(self.confpath)
-        changed = False
-        for backend_name in config.sections():
-            params = dict(config.items(backend_name))
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.confpath)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime, st.st_size)
+
+    def _read(self):
+        """
+        Get the parsed config file, which is only read again when the file
+        has been changed by somebody else.
+        """
+        with self.mutex:
+            if self._batch:
+                # Do not drop pending edits.
+                if self._config is None:
+                    self._config = RawConfigParser()
+                    self._config.read(self.confpath)
+                return self._config
+
+            signature = self._stat_signature()
+            if self._config is None or signature != self._signature:
+                config = RawConfigParser()
+                config.read(self.confpath)
+                self._config = config
+                self._signature = signature
+            return self._config
+
+    def _write(self):
+        """
+        Write the model in the config file, or wait for the end of the
+        current batch.
+        """
+        with self.mutex:
+            if self._batch:
+                self._dirty = True
+                return
+
+            # Write a temporary file and rename it, so the config file is
+            # never incomplete.
+            dirname = os.path.dirname(self.confpath)
+            fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.%s.' % os.path.basename(self.confpath))
             try:
-                module_name = params.pop('_module')
-            except KeyError:
+                with os.fdopen(fd, 'w') as f:
+                    self._config.write(f)
+                if sys.platform == 'win32' and os.path.exists(self.confpath):
+                    os.remove(self.confpath)
+                os.rename(tmpname, self.confpath)
+            except:
+                if os.path.exists(tmpname):
+                    os.remove(tmpname)
+                raise
+            self._signature = self._stat_signature()
+            self._dirty = False
+
+    @contextmanager
+    def batch(self):
+        """
+        Group several edits, to write the config file only once at the end.
+
+        If an exception is raised in the block, edits are dropped.
+
+        >>> with config.batch():
+        ...     for i in xrange(100):
+        ...         config.add_backend('b%d' % i, 'module', {})
+        """
+        with self.mutex:
+            self._read()
+            self._batch += 1
+            try:
+                yield self
+            except:
+                self._batch -= 1
+                if not self._batch:
+                    self._config = None
+                    self._dirty = False
+                raise
+            else:
+                self._batch -= 1
+                if not self._batch and self._dirty:
+                    try:
+                        self._write()
+                    except:
+                        self._config = None
+                        self._dirty = False
+                        raise
+
+    @contextmanager
+    def _edit(self, section):
+        """
+        Edit a section of the parsed config file.
+
+        If an exception is raised, the parsed file is read again, or inside
+        a batch, the section is restored, so it never has partial edits.
+        """
+        with self.mutex:
+            config = self._read()
+            saved = config.items(section) if config.has_section(section) else None
+            try:
+                yield config
+            except:
+                if not self._batch:
+                    self._config = None
+                elif self._config is config:
+                    config.remove_section(section)
+                    if saved is not None:
+                        config.add_section(section)
+                        for key, value in saved:
+                            config.set(section, key, value)
+                raise
+
+    def iter_backends(self):
+        with self.mutex:
+            config = self._read()
+            backends = []
+            changed = False
+            for backend_name in config.sections():
+                params = dict(config.items(backend_name))
                 try:
-                    module_name = params.pop('_backend')
-                    config.set(backend_name, '_module', module_name)
-                    config.remove_option(backend_name, '_backend')
-                    changed = True
+                    module_name = params.pop('_module')
                 except KeyError:
-                    warning('Missing field "_module" for configured backend "%s"', backend_name)
-                    continue
-            yield backend_name, module_name, params
+                    try:
+                        module_name = params.pop('_backend')
+                        config.set(backend_name, '_module', module_name)
+                        config.remove_option(backend_name, '_backend')
+                        changed = True
+                    except KeyError:
+                        warning('Missing field "_module" for configured backend "%s"', backend_name)
+                        continue
+                backends.append((backend_name, module_name, params))
+
+            if changed:
+                try:
+                    self._write()
+                except:
+                    if not self._batch:
+                        self._config = None
+                    raise
 
-        if changed:
-            with open(self.confpath, 'wb') as f:
-                config.write(f)
+        return iter(backends)
 
     def backend_exists(self, name):
         """
         Return True if the backend exists in config.
         """
-        config = RawConfigParser()
-        config.read(self.confpath)
-        return name in config.sections()
+        with self.mutex:
+            return self._read().has_section(name)
 
     def add_backend(self, backend_name, module_name, params, edit=False):
         if not backend_name:
             raise ValueError(u'Please give a name to the configured backend.')
-        config = RawConfigParser()
-        config.read(self.confpath)
-        if not edit:
-            try:
-                config.add_section(backend_name)
-            except DuplicateSectionError:
-                raise BackendAlreadyExists(backend_name)
-        config.set(backend_name, '_module', module_name)
-        for key, value in params.iteritems():
-            if isinstance(value, unicode):
-                value = value.encode('utf-8')
-            config.set(backend_name, key, value)
-        with open(self.confpath, 'wb') as f:
-            config.write(f)
+        with self._edit(backend_name) as config:
+            if not edit:
+                try:
+                    config.add_section(backend_name)
+                except DuplicateSectionError:
+                    raise BackendAlreadyExists(backend_name)
+            config.set(backend_name, '_module', module_name)
+            for key, value in params.iteritems():
+                if isinstance(value, unicode):
+                    value = value.encode('utf-8')
+                config.set(backend_name, key, value)
+            self._write()
 
     def edit_backend(self, backend_name, module_name, params):
         return self.add_backend(backend_name, module_name, params, True)
 
     def get_backend(self, backend_name):
-        config = RawConfigParser()
-        config.read(self.confpath)
-        if not config.has_section(backend_name):
-            raise KeyError(u'Configured backend "%s" not found' % backend_name)
+        with self.mutex:
+            config = self._read()
+            if not config.has_section(backend_name):
+                raise KeyError(u'Configured backend "%s" not found' % backend_name)
 
-        items = dict(config.items(backend_name))
+            items = dict(config.items(backend_name))
 
-        try:
-            module_name = items.pop('_module')
-        except KeyError:
             try:
-                module_name = items.pop('_backend')
-                self.edit_backend(backend_name, module_name, items)
+                module_name = items.pop('_module')
             except KeyError:
-                warning('Missing field "_module" for configured backend "%s"', backend_name)
-                raise KeyError(u'Configured backend "%s" not found' % backend_name)
-        return module_name, items
+                try:
+                    module_name = items.pop('_backend')
+                    self.edit_backend(backend_name, module_name, items)
+                except KeyError:
+                    warning('Missing field "_module" for configured backend "%s"', backend_name)
+                    raise KeyError(u'Configured backend "%s" not found' % backend_name)
+            return module_name, items
 
     def remove_backend(self, backend_name):
-        config = RawConfigParser()
-        config.read(self.confpath)
-        if not config.remove_section(backend_name):
-            return False
-        with open(self.confpath, 'w') as f:
-            config.write(f)
-        return True
+        with self._edit(backend_name) as config:
+            if not config.remove_section(backend_name):
+                return False
+            self._write()
+            return True
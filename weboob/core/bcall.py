@@ -18,19 +18,29 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+import signal
+from collections import deque
+from contextlib import contextmanager
 from copy import copy
-from threading import Thread
+from time import time
+from multiprocessing import Process, Pipe, Event as ProcessEvent
+from types import GeneratorType
+from threading import Thread, Lock, Event, Condition, current_thread
 try:
     import Queue
 except ImportError:
     import queue as Queue
 
 from weboob.capabilities.base import BaseObject
+from weboob.core.cache import freeze as freeze_result, freeze_all, unfreeze as unfreeze_result
+from weboob.exceptions import CallTimeout, BackendUnhealthy
+from weboob.tools.callcontext import CallContext, get_context
+from weboob.tools import metrics, tracing
 from weboob.tools.misc import get_backtrace
 from weboob.tools.log import getLogger
 
 
-__all__ = ['BackendsCall', 'CallErrors']
+__all__ = ['BackendsCall', 'ProcessBackendsCall', 'BackendProcess', 'BackendProcesses', 'CallErrors']
 
 
 class CallErrors(Exception):
@@ -42,74 +52,528 @@ class CallErrors(Exception):
         Exception.__init__(self, msg)
         self.errors = copy(errors)
 
+    @property
+    def timeouts(self):
+        """
+        Backends which did not finish before the deadline.
+        """
+        return [backend for backend, error, _ in self.errors if isinstance(error, CallTimeout)]
+
     def __iter__(self):
         return self.errors.__iter__()
 
 
+class ProcessCallError(Exception):
+    """
+    Replaces an error raised in a child process which can't be sent back to
+    the parent.
+    """
+
+
+class EndOfStream(object):
+    """
+    Marker put in the responses queue when a backend has finished.
+    """
+    __slots__ = ('backend',)
+
+    def __init__(self, backend):
+        self.backend = backend
+
+
+@contextmanager
+def _nothing():
+    yield
+
+
 class BackendsCall(object):
+    # Maximum duration of a wait of the consumer. A timeout lets
+    # KeyboardInterrupt be raised while waiting, as it can't interrupt a
+    # wait without timeout on Python 2.
+    MAX_WAIT = 86400
+
     def __init__(self, backends, function, *args, **kwargs):
         """
         :param backends: List of backends to call
         :type backends: list[:class:`Module`]
         :param function: backends' method name, or callable object.
         :type function: :class:`str` or :class:`callable`
+        :param workers: pool used to run calls; if not set, a thread is
+                        started for each backend
+        :type workers: :class:`weboob.core.workers.WorkerPool`
+        :param deadline: timestamp after which the call stops, keeping only
+                         results which have arrived
+        :type deadline: :class:`float`
+        :param max_results: cancel the call once this number of results has
+                            been received from all backends
+        :type max_results: :class:`int`
+        :param more_results_error: if set, exception class stored in errors
+                                   for backends which have been stopped
+                                   because *max_results* has been reached
+        :type more_results_error: :class:`type`
+        :param max_pending: maximum number of results waiting to be consumed;
+                            backends are paused when it is reached, so
+                            results have to be consumed (do not use it with
+                            :func:`wait`)
+        :type max_pending: :class:`int`
+        :param cache: cache of results of idempotent methods
+        :type cache: :class:`weboob.core.cache.ResultsCache`
+        :param flights: share results of identical concurrent calls on
+                        idempotent methods
+        :type flights: :class:`weboob.core.cache.SingleFlight`
+        :param health: skip backends whose website is failing
+        :type health: :class:`weboob.core.health.BackendsHealth`
+        :param tracer: record spans of the call
+        :type tracer: :class:`weboob.tools.tracing.Tracer`
+        :param trace_path: if set, save the trace in this file once every
+                           backend has finished
+        :type trace_path: :class:`str`
         """
         self.logger = getLogger('bcall')
 
+        self.workers = kwargs.pop('workers', None)
+        # A call made by a backend is bound by the deadline of its caller.
+        self.context = CallContext(deadline=kwargs.pop('deadline', None), parent=get_context())
+        self.max_results = kwargs.pop('max_results', None)
+        self.more_results_error = kwargs.pop('more_results_error', None)
+        self.limit_reached = False
+        self.max_pending = kwargs.pop('max_pending', None)
+        self.cache = kwargs.pop('cache', None)
+        self.flights = kwargs.pop('flights', None)
+        # Name of method in metrics.
+        self.method = function if isinstance(function, basestring) else getattr(function, '__name__', u'<callable>')
+        self.health = kwargs.pop('health', None)
+        self.tracer = kwargs.pop('tracer', None)
+        self.trace_path = kwargs.pop('trace_path', None)
+        self.started = time()
+        self.caller = current_thread()
+        self.count = 0
+        self.pending = 0
+        self.notifier = None
+
+        # Results and EndOfStream markers, in arrival order.
         self.responses = Queue.Queue()
         self.errors = []
-        self.tasks = Queue.Queue()
+        # Number of EndOfStream markers not consumed yet.
+        self.streams = len(backends)
+        # Backends still running.
+        self.running = set(backends)
+        self.mutex = Lock()
+        # Signaled when consumed results free some room for backends.
+        self.consumed = Condition(self.mutex)
+        self.finished = Event()
+        if not backends:
+            self.finished.set()
+            self.end_trace()
 
         for backend in backends:
-            Thread(target=self.backend_process, args=(function, args, kwargs)).start()
-            self.tasks.put(backend)
+            if self.workers is not None:
+                self.workers.submit(self.backend_process, backend, function, args, kwargs)
+            else:
+                Thread(target=self.backend_process, args=(backend, function, args, kwargs)).start()
 
     def store_result(self, backend, result):
-        if result is None:
+        if result is None or self.context.cancelled:
             return
 
+        with self.mutex:
+            if self.max_pending is not None and self.pending >= self.max_pending:
+                # The worker does not count in the pool while it is paused,
+                # so jobs needed by the consumer are not stuck behind it.
+                with self.blocking():
+                    while self.pending >= self.max_pending and not self.context.should_stop():
+                        self.consumed.wait(self.context.remaining())
+                if self.context.should_stop():
+                    return
+
+            if self.max_results is not None:
+                if self.count >= self.max_results:
+                    return
+                self.count += 1
+                if self.count == self.max_results:
+                    self.logger.debug('Got %d results, cancel the call', self.count)
+                    self.limit_reached = True
+                    self.context.cancel()
+
+            self.pending += 1
+
         if isinstance(result, BaseObject):
             result.backend = backend.name
-        self.responses.put(result)
+        if metrics.registry.enabled:
+            metrics.CALL_RESULTS.inc(backend=backend.name, method=self.method)
+        self._put(result)
+
+    def blocking(self):
+        """
+        Context manager to wrap waits of the current thread, see
+        :func:`weboob.core.workers.WorkerPool.blocking`.
+        """
+        if self.workers is None:
+            return _nothing()
+        return self.workers.blocking()
 
-    def backend_process(self, function, args, kwargs):
-        backend = self.tasks.get()
-        with backend:
+    def _put(self, response):
+        self.responses.put(response)
+        if self.notifier is not None:
+            self.notifier()
+
+    def _taken(self):
+        with self.mutex:
+            self.pending -= 1
+            self.consumed.notify()
+
+    def cancel(self):
+        """
+        Ask backends to stop as soon as possible.
+
+        Backends stop between two yielded results, and browsers do not
+        follow next pages anymore. Results which are still produced are
+        ignored.
+        """
+        with self.mutex:
+            self.context.cancel()
+            self.consumed.notify_all()
+
+    def set_notifier(self, notifier):
+        """
+        Set a function called without argument, from any thread, every time
+        a result or the end of a backend is available.
+
+        It is meant to wake up an event loop, which then gets results
+        without blocking with :func:`fetch_ready`.
+
+        If responses are already available, *notifier* is called at once.
+        When the call has a deadline, the event loop should also call
+        :func:`fetch_ready` once ``call.context.remaining()`` seconds have
+        elapsed.
+        """
+        self.notifier = notifier
+        if notifier is not None and not self.responses.empty():
+            notifier()
+
+    @property
+    def done(self):
+        """
+        True when every result has been consumed and every backend has
+        finished (or has missed the deadline).
+        """
+        return self.streams == 0
+
+    def fetch_ready(self, limit=None):
+        """
+        Get results which are available, without blocking.
+
+        :param limit: maximum number of results to get
+        :type limit: :class:`int`
+        :rtype: :class:`list`
+        """
+        results = []
+        while self.streams > 0 and (limit is None or len(results) < limit):
             try:
-                # Call method on backend
+                response = self.responses.get_nowait()
+            except Queue.Empty:
+                if self.context.expired():
+                    self.expire()
+                break
+
+            if isinstance(response, EndOfStream):
+                self.streams -= 1
+                continue
+            self._taken()
+            results.append(response)
+        return results
+
+    def check_errors(self):
+        """
+        Raise :class:`CallErrors` if some backends have failed.
+        """
+        if self.errors:
+            raise CallErrors(self.errors)
+
+    def backend_process(self, backend, function, args, kwargs):
+        if self.context.should_stop():
+            # The job has waited for a free worker until the end of the call.
+            self.skip_backend(backend)
+            return
+
+        start = time()
+        nb_errors = len(self.errors)
+        try:
+            with self.context, metrics.labels(backend=backend.name, method=self.method), \
+                 tracing.activate(self.tracer), tracing.span(backend.name, 'backend', method=self.method):
+                ttl = None
+                if isinstance(function, basestring):
+                    ttl = backend.get_cache_ttl(function)
+
+                if ttl is None:
+                    # Not an idempotent method.
+                    self.run_call(backend, function, args, kwargs)
+                    return
+
+                if ttl and self.cache is not None:
+                    cached = self.cache.get(backend, function, args, kwargs)
+                    if cached is not None:
+                        self.logger.debug('%s: Got results of %s from cache', backend, function)
+                        for result in cached:
+                            self.store_result(backend, result)
+                        return
+
+                flight = None
+                if self.flights is not None:
+                    flight, leader = self.flights.take_off(backend, function, args, kwargs)
+                    if not leader:
+                        if self.follow_flight(backend, function, flight):
+                            return
+                        flight = None
+
+                cached = ttl and self.cache is not None
+                if not cached and flight is None:
+                    self.run_call(backend, function, args, kwargs)
+                    return
+
+                results = frozen = None
                 try:
-                    self.logger.debug('%s: Calling function %s', backend, function)
-                    if callable(function):
-                        result = function(backend, *args, **kwargs)
-                    else:
-                        result = getattr(backend, function)(*args, **kwargs)
-                except Exception as error:
-                    self.logger.debug('%s: Called function %s raised an error: %r', backend, function, error)
-                    self.errors.append((backend, error, get_backtrace(error)))
-                else:
-                    self.logger.debug('%s: Called function %s returned: %r', backend, function, result)
-
-                    if hasattr(result, '__iter__') and not isinstance(result, basestring):
-                        # Loop on iterator
-                        try:
-                            for subresult in result:
-                                self.store_result(backend, subresult)
-                        except Exception as error:
-                            self.errors.append((backend, error, get_backtrace(error)))
-                    else:
-                        self.store_result(backend, result)
+                    results = self.run_call(backend, function, args, kwargs, collect=True)
+                finally:
+                    # Results are only frozen if they are cached or if
+                    # identical calls wait for them. Once grounded, the
+                    # flight does not get new followers.
+                    followers = self.flights.ground(flight) if flight is not None else 0
+                    if results is not None and (cached or followers):
+                        frozen = self.freeze_results(results)
+                    if flight is not None:
+                        errors = [error[1:] for error in self.errors if error[0] is backend]
+                        self.flights.land(flight, frozen, errors[-1] if errors else None)
+
+                if cached and frozen is not None:
+                    self.cache.set(backend, function, args, kwargs, frozen, ttl)
+        except Exception as error:
+            # For example, a lazy backend which can't be loaded.
+            self.errors.append((backend, error, get_backtrace(error)))
+        finally:
+            if metrics.registry.enabled:
+                self.record_metrics(backend, time() - start,
+                                    any(error[0] is backend for error in self.errors[nb_errors:]))
+            self.backend_finished(backend)
+
+    def skip_backend(self, backend):
+        """
+        Do not call a backend, as the call is over.
+        """
+        self.logger.debug('%s: call is over, do not call the backend', backend)
+        self.interrupted(backend, u'Deadline reached before the backend was called')
+        self.backend_finished(backend)
+
+    def interrupted(self, backend, timeout_msg=u'Deadline reached before the end of the call'):
+        """
+        Signal that *backend* has been stopped before its end.
+        """
+        with self.mutex:
+            # If the deadline is reached, the backend is late, unless it has
+            # already been reported by expire().
+            if self.context.expired() and backend in self.running:
+                self.running.discard(backend)
+                self.errors.append((backend, CallTimeout(timeout_msg), ''))
+        if self.limit_reached and self.more_results_error is not None:
+            self.errors.append((backend, self.more_results_error(), ''))
+
+    def run_call(self, backend, function, args, kwargs, collect=False):
+        """
+        Lock the backend and call the function, unless the website of the
+        backend is known to be down.
+        """
+        if self.health is None:
+            with backend.lock_for(function):
+                return self.call_backend(backend, function, args, kwargs, collect)
+
+        if not self.health.allow(backend.name):
+            state = self.health.get_state(backend.name)
+            self.logger.debug('%s: backend is unhealthy, skip it', backend)
+            self.errors.append((backend, BackendUnhealthy(u'Website is unavailable (%s), retry in %d seconds'
+                                                          % (state['last_error'], state.get('retry_in', 0))), ''))
+            return None
+
+        nb_errors = len(self.errors)
+        try:
+            with backend.lock_for(function):
+                return self.call_backend(backend, function, args, kwargs, collect)
+        finally:
+            if self.context.should_stop() and not self.limit_reached:
+                # Errors may come from the interruption, not from the
+                # website.
+                self.health.release(backend.name)
+            else:
+                self.health.record(backend.name, [error[1] for error in self.errors[nb_errors:]
+                                                  if error[0] is backend])
+
+    def record_metrics(self, backend, duration, failed):
+        metrics.CALLS.inc(backend=backend.name, method=self.method)
+        metrics.CALL_DURATION.observe(duration, backend=backend.name, method=self.method)
+        if failed:
+            metrics.CALL_ERRORS.inc(backend=backend.name, method=self.method)
+
+    def follow_flight(self, backend, function, flight):
+        """
+        Wait for an identical call made by an other thread, and store copies
+        of its results.
+
+        :returns: False if the other call did not finish correctly, so it has
+                  to be done again
+        """
+        self.logger.debug('%s: Wait for results of an identical call to %s', backend, function)
+        if not flight.landed.wait(self.context.remaining()):
+            self.errors.append((backend, CallTimeout(u'Deadline reached before the end of the call'), ''))
+            return True
+
+        if flight.error is not None:
+            self.errors.append((backend,) + flight.error)
+            return True
+
+        if flight.results is None:
+            return False
+
+        for result in flight.unfreeze():
+            self.store_result(backend, result)
+        return True
+
+    def freeze_results(self, results):
+        """
+        Get snapshots of results collected by :func:`call_backend`.
+
+        :returns: snapshots, or None if results can't be pickled
+        """
+        return freeze_all(results)
+
+    def call_backend(self, backend, function, args, kwargs, collect=False):
+        """
+        Call the function on the locked backend, and store its results and
+        errors.
+
+        :param collect: if True, returns results, to give them to
+                        :func:`freeze_results`
+        :returns: results, or None if the call has failed, has been
+                  interrupted or *collect* is False
+        """
+        # Results, None if they must not be returned.
+        collected = [] if collect else None
+
+        # Call method on backend
+        try:
+            self.logger.debug('%s: Calling function %s', backend, function)
+            if callable(function):
+                result = function(backend, *args, **kwargs)
+            else:
+                result = getattr(backend, function)(*args, **kwargs)
+        except Exception as error:
+            self.logger.debug('%s: Called function %s raised an error: %r', backend, function, error)
+            self.errors.append((backend, error, get_backtrace(error)))
+            return None
+
+        self.logger.debug('%s: Called function %s returned: %r', backend, function, result)
+
+        if hasattr(result, '__iter__') and not isinstance(result, basestring):
+            # Loop on iterator
+            try:
+                for subresult in result:
+                    self.store_result(backend, subresult)
+                    if collected is not None and subresult is not None:
+                        collected.append(subresult)
+                    if self.context.should_stop():
+                        self.logger.debug('%s: call is over, stop iteration', backend)
+                        self.interrupted(backend)
+                        collected = None
+                        break
+            except Exception as error:
+                self.errors.append((backend, error, get_backtrace(error)))
+                collected = None
             finally:
-                self.tasks.task_done()
+                # Stop a generator which has been interrupted.
+                if isinstance(result, GeneratorType):
+                    result.close()
+        else:
+            self.store_result(backend, result)
+            if collected is not None and result is not None:
+                collected.append(result)
 
-    def _callback_thread_run(self, callback, errback, finishback):
-        while self.tasks.unfinished_tasks or not self.responses.empty():
+        return collected
+
+    def backend_finished(self, backend):
+        """
+        Signal that *backend* will not produce any other result.
+        """
+        with self.mutex:
+            self.running.discard(backend)
+            if not self.running and not self.finished.is_set():
+                # The trace is saved before consumers get the last marker.
+                self.end_trace()
+                self.finished.set()
+        # Errors are stored before the marker, so consumers see them once
+        # they have received every marker.
+        self._put(EndOfStream(backend))
+
+    def end_trace(self):
+        """
+        Record the span of the whole call, once every backend has finished.
+        """
+        if self.tracer is None:
+            return
+        self.tracer.add(u'do %s' % self.method, 'call', self.started, time(),
+                        {'errors': len(self.errors)}, thread=self.caller)
+        if self.trace_path:
+            self.tracer.save(self.trace_path)
+
+    def expire(self):
+        """
+        Stop waiting for backends which are still running, and store a
+        :class:`weboob.exceptions.CallTimeout` error for each of them.
+        """
+        with self.mutex:
+            late = sorted(self.running, key=lambda backend: backend.name)
+            self.running.clear()
+            self.streams = 0
+            if not self.finished.is_set():
+                self.end_trace()
+                self.finished.set()
+            # Late backends must not wait for room anymore.
+            self.context.cancel()
+            self.consumed.notify_all()
+
+            for backend in late:
+                self.logger.debug('%s: deadline reached', backend)
+                self.errors.append((backend, CallTimeout(u'Deadline reached before the end of the call'), ''))
+
+    def wait_timeout(self):
+        """
+        Get the timeout of a wait of the consumer, bounded by the deadline.
+        """
+        remaining = self.context.remaining()
+        if remaining is None:
+            return self.MAX_WAIT
+        return min(remaining, self.MAX_WAIT)
+
+    def _iter_responses(self):
+        # Block until a result or a marker arrives: there is no polling, so
+        # the consumer is woken up as soon as something happens.
+        while self.streams > 0:
             try:
-                response = self.responses.get(timeout=0.1)
-                if callback:
-                    callback(response)
+                with self.blocking():
+                    response = self.responses.get(True, self.wait_timeout())
             except Queue.Empty:
+                if self.context.expired():
+                    self.expire()
+                    return
                 continue
 
+            if isinstance(response, EndOfStream):
+                self.streams -= 1
+                continue
+            self._taken()
+            yield response
+
+    def _callback_thread_run(self, callback, errback, finishback):
+        for response in self._iter_responses():
+            if callback:
+                callback(response)
+
         # Raise errors
         while errback and self.errors:
             errback(*self.errors.pop(0))
@@ -136,17 +600,340 @@ class BackendsCall(object):
         return thread
 
     def wait(self):
-        self.tasks.join()
+        with self.blocking():
+            while not self.finished.wait(self.wait_timeout()):
+                if self.context.expired():
+                    self.expire()
+                    break
 
-        if self.errors:
-            raise CallErrors(self.errors)
+        self.check_errors()
 
     def __iter__(self):
-        while self.tasks.unfinished_tasks or not self.responses.empty():
+        complete = False
+        try:
+            for response in self._iter_responses():
+                yield response
+            complete = True
+        finally:
+            if not complete:
+                # The consumer stopped iterating, results are not needed
+                # anymore.
+                self.cancel()
+
+        self.check_errors()
+
+
+class BackendProcess(object):
+    """
+    Worker process which keeps its own copy of a backend, to run calls of
+    :class:`ProcessBackendsCall` on it, one at a time.
+
+    The process is forked from the current one when it is needed, so it
+    uses the already loaded module. The copy of the backend keeps its state
+    between calls (for example the session of its browser), but changes
+    are not seen by the backend of the current process.
+
+    If the process is terminated, for example because a call has reached
+    its deadline, a new one is forked for the next call.
+
+    :type backend: :class:`weboob.tools.backend.Module`
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.process = None
+        self.conn = None
+        # Set to stop the current call between two results.
+        self.stop = None
+        # Held by the call using the process.
+        self.lock = Lock()
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        """
+        Fork the process, unless it is running.
+        """
+        if self.is_alive():
+            return
+
+        self.close()
+        conn, child_conn = Pipe()
+        self.stop = ProcessEvent()
+        self.process = Process(target=self._run, args=(child_conn, self.stop),
+                               name='backend-%s' % self.backend.name)
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.conn = conn
+
+    def kill(self):
+        """
+        Terminate the process. It can be called from any thread, and then
+        the user of the process gets an EOFError.
+        """
+        process = self.process
+        if process is not None:
+            process.terminate()
+
+    def close(self):
+        """
+        Terminate the process and wait for it.
+        """
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _run(self, conn, stop):
+        # Only the parent process handles Ctrl-C, and then terminates this
+        # one.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        def send_error(error, backtrace):
             try:
-                yield self.responses.get(timeout=0.1)
-            except Queue.Empty:
+                conn.send(('error', error, backtrace))
+            except Exception:
+                conn.send(('error', ProcessCallError(repr(error)), backtrace))
+
+        backend = self.backend
+        while True:
+            try:
+                function, args, kwargs = conn.recv()
+            except EOFError:
+                return
+
+            try:
+                if callable(function):
+                    result = function(backend, *args, **kwargs)
+                else:
+                    result = getattr(backend, function)(*args, **kwargs)
+
+                if hasattr(result, '__iter__') and not isinstance(result, basestring):
+                    try:
+                        for subresult in result:
+                            if subresult is not None:
+                                conn.send(('result', freeze_result(subresult)))
+                            if stop.is_set():
+                                break
+                    finally:
+                        if isinstance(result, GeneratorType):
+                            result.close()
+                elif result is not None:
+                    conn.send(('result', freeze_result(result)))
+            except Exception as error:
+                send_error(error, get_backtrace(error))
+            finally:
+                conn.send(('end',))
+
+
+class BackendProcesses(object):
+    """
+    Worker processes of backends, see :class:`BackendProcess`.
+    """
+
+    def __init__(self):
+        self.processes = {}
+        self.mutex = Lock()
+
+    def get(self, backend):
+        """
+        Get the worker process of a backend.
+
+        :rtype: :class:`BackendProcess`
+        """
+        with self.mutex:
+            process = self.processes.get(backend.name)
+            if process is None or process.backend is not backend:
+                # The backend has been loaded again.
+                if process is not None:
+                    process.kill()
+                process = self.processes[backend.name] = BackendProcess(backend)
+            return process
+
+    def discard(self, name):
+        """
+        Terminate the worker process of a backend, if any.
+        """
+        with self.mutex:
+            process = self.processes.pop(name, None)
+        if process is not None:
+            process.kill()
+
+    def close(self):
+        """
+        Terminate every worker process.
+        """
+        with self.mutex:
+            processes = list(self.processes.values())
+            self.processes.clear()
+        for process in processes:
+            process.kill()
+
+
+class ProcessBackendsCall(BackendsCall):
+    """
+    Same as :class:`BackendsCall`, but the function is called in a worker
+    process of each backend (see :class:`BackendProcess`), so CPU-bound work
+    (parsing, filters) can use several cores.
+
+    The function has to be a method name or a callable which can be
+    pickled, as arguments. Results are frozen (see
+    :func:`weboob.core.cache.freeze`) to be sent to the parent process,
+    which can then cache and share them with identical concurrent calls
+    without pickling them again.
+
+    When the call is cancelled or gets *max_results* results, worker
+    processes stop between two results. Processes which are still running
+    at the deadline, or which do not send anything during
+    :attr:`SUPERVISION_TIMEOUT` seconds, are terminated.
+
+    :param processes: worker processes to use; if not set, processes are
+                      forked for this call only
+    :type processes: :class:`BackendProcesses`
+    """
+
+    SUPERVISION_TIMEOUT = 600
+    """
+    Number of seconds after which a worker process which has not sent
+    anything is considered as hung.
+    """
+
+    def __init__(self, backends, function, *args, **kwargs):
+        self.processes = kwargs.pop('processes', None)
+        self.own_processes = self.processes is None
+        if self.own_processes:
+            self.processes = BackendProcesses()
+        # Worker processes by backend, while they are used by the call.
+        self.working = {}
+        self.working_lock = Lock()
+
+        # Fork workers before jobs are run in the pool, while locks of the
+        # backends are not held by this call.
+        for backend in backends:
+            worker = self.processes.get(backend)
+            if worker.lock.acquire(False):
+                try:
+                    worker.start()
+                finally:
+                    worker.lock.release()
+
+        super(ProcessBackendsCall, self).__init__(backends, function, *args, **kwargs)
+
+    def stop_workers(self, kill=False):
+        with self.working_lock:
+            workers = list(self.working.values())
+        for worker in workers:
+            if kill:
+                worker.kill()
+            elif worker.stop is not None:
+                worker.stop.set()
+
+    def cancel(self):
+        super(ProcessBackendsCall, self).cancel()
+        self.stop_workers()
+
+    def expire(self):
+        super(ProcessBackendsCall, self).expire()
+        self.stop_workers(kill=True)
+
+    def store_result(self, backend, result):
+        super(ProcessBackendsCall, self).store_result(backend, result)
+        if self.context.cancelled:
+            # max_results is reached.
+            self.stop_workers()
+
+    def freeze_results(self, results):
+        # Results have been frozen by the worker process.
+        return results
+
+    def call_backend(self, backend, function, args, kwargs, collect=False):
+        worker = self.processes.get(backend)
+        with self.blocking():
+            worker.lock.acquire()
+        try:
+            with self.working_lock:
+                self.working[backend] = worker
+            try:
+                return self.call_worker(worker, backend, function, args, kwargs, collect)
+            finally:
+                with self.working_lock:
+                    self.working.pop(backend, None)
+                if self.own_processes:
+                    worker.close()
+        finally:
+            worker.lock.release()
+
+    def call_worker(self, worker, backend, function, args, kwargs, collect):
+        worker.start()
+        worker.stop.clear()
+        try:
+            worker.conn.send((function, args, kwargs))
+        except Exception as error:
+            # The function or the arguments can't be pickled.
+            worker.close()
+            self.errors.append((backend, ProcessCallError(u'Unable to send the call: %r' % error),
+                                get_backtrace(error)))
+            return None
+
+        # Snapshots of results.
+        frozen = [] if collect else None
+        stopped = False
+        last = time()
+        while True:
+            if self.context.expired():
+                self.logger.debug('%s: deadline reached, terminate worker process', backend)
+                worker.close()
+                stopped = True
+                break
+            if self.context.cancelled and not stopped:
+                self.logger.debug('%s: call is over, stop worker process', backend)
+                worker.stop.set()
+                stopped = True
+
+            # The worker sends something as soon as it is stopped, so there
+            # is no need to wake up to check cancellation.
+            timeout = self.SUPERVISION_TIMEOUT - (time() - last)
+            remaining = self.context.remaining()
+            if remaining is not None:
+                timeout = min(timeout, remaining)
+            if timeout <= 0 or not worker.conn.poll(timeout):
+                if time() - last >= self.SUPERVISION_TIMEOUT:
+                    self.logger.warning('%s: worker process is hung, terminate it', backend)
+                    worker.close()
+                    self.errors.append((backend, ProcessCallError(u'Worker process has not answered for %d seconds'
+                                                                  % self.SUPERVISION_TIMEOUT), ''))
+                    frozen = None
+                    break
                 continue
 
-        if self.errors:
-            raise CallErrors(self.errors)
+            try:
+                msg = worker.conn.recv()
+            except EOFError:
+                worker.close()
+                if not self.context.should_stop():
+                    self.errors.append((backend, ProcessCallError(u'Worker process died'), ''))
+                frozen = None
+                break
+            last = time()
+
+            if msg[0] == 'result':
+                self.store_result(backend, unfreeze_result(msg[1]))
+                if frozen is not None:
+                    frozen.append(msg[1])
+            elif msg[0] == 'error':
+                self.errors.append((backend, msg[1], msg[2]))
+                frozen = None
+            else:
+                break
+
+        if stopped or self.context.should_stop():
+            if stopped:
+                self.interrupted(backend)
+            # Results are incomplete.
+            return None
+        return frozen
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from threading import Lock, Event
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from weboob.capabilities.base import BaseObject
+from weboob.tools.cache import MemoryCache
+from weboob.tools.log import getLogger
+
+
+__all__ = ['ResultsCache', 'SingleFlight', 'freeze', 'freeze_all', 'unfreeze', 'make_key']
+
+
+def _arg_key(value):
+    if isinstance(value, BaseObject):
+        return u'%s(%r)' % (type(value).__name__, value.fullid)
+    if isinstance(value, (list, tuple)):
+        return u'[%s]' % u', '.join(_arg_key(v) for v in value)
+    return repr(value).decode('ascii', 'replace')
+
+
+def make_key(backend, method, args, kwargs):
+    """
+    Get a key identifying a call of a method on a backend.
+
+    :rtype: :class:`tuple`
+    """
+    return (backend.name, method,
+            u'%s|%s' % (_arg_key(args), _arg_key(sorted(kwargs.iteritems()))))
+
+
+def freeze(result):
+    """
+    Get a snapshot of a result, which can be stored and unpickled later
+    to get a copy of the result.
+    """
+    return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+
+
+def freeze_all(results):
+    """
+    Get snapshots of results with :func:`freeze`.
+
+    :returns: snapshots, or None if a result can't be pickled, so results
+              are not cacheable
+    :rtype: :class:`list`
+    """
+    try:
+        return [freeze(result) for result in results]
+    except Exception as e:
+        getLogger('cache').debug(u'Results are not cacheable: %s', e)
+        return None
+
+
+def unfreeze(snapshot):
+    """
+    Get a copy of a result from a snapshot returned by :func:`freeze`.
+    """
+    return pickle.loads(snapshot)
+
+
+class ResultsCache(object):
+    """
+    Cache of results of calls on backends.
+
+    Only methods for which a non-zero TTL is declared in the ``CACHE_TTL``
+    attribute of a :class:`weboob.capabilities.base.Capability` (or of the
+    module class) are cached, see
+    :func:`weboob.tools.backend.Module.get_cache_ttl`. Results are pickled,
+    so every hit returns new objects.
+
+    :param store: where results are stored; default is a
+                  :class:`weboob.tools.cache.MemoryCache`
+    :type store: :class:`weboob.tools.cache.ICache`
+    """
+
+    def __init__(self, store=None):
+        self.logger = getLogger('cache')
+        if store is None:
+            store = MemoryCache()
+        self.store = store
+        self.mutex = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, backend, method, args, kwargs):
+        """
+        Get cached results of a call.
+
+        :rtype: :class:`list` or None if results are not in cache
+        """
+        frozen = self.store.get(make_key(backend, method, args, kwargs))
+        with self.mutex:
+            if frozen is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [unfreeze(result) for result in frozen]
+
+    def set(self, backend, method, args, kwargs, frozen, ttl):
+        """
+        Store results of a call.
+
+        :param frozen: results snapshots returned by :func:`freeze`
+        :type frozen: :class:`list`
+        """
+        self.store.set(make_key(backend, method, args, kwargs), frozen, ttl)
+
+    def invalidate(self, backend=None, method=None):
+        """
+        Remove cached results.
+
+        :param backend: only results of this backend
+        :type backend: :class:`str`
+        :param method: only results of this method (requires *backend*)
+        :type method: :class:`str`
+        """
+        assert method is None or backend is not None
+        self.logger.debug('Invalidate cache of backend=%s method=%s', backend, method)
+        self.store.invalidate(tuple(part for part in (backend, method) if part is not None))
+
+    def stats(self):
+        """
+        Get hits and misses counters.
+
+        :rtype: :class:`dict`
+        """
+        with self.mutex:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+class Flight(object):
+    """
+    A call shared by several identical concurrent calls.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.landed = Event()
+        # Results snapshots, or None if the call did not finish correctly.
+        self.results = None
+        # (error, backtrace) if the call has failed.
+        self.error = None
+        # Number of identical calls waiting for this one.
+        self.followers = 0
+
+    def unfreeze(self):
+        """
+        Get a copy of results.
+        """
+        return [unfreeze(result) for result in self.results]
+
+
+class SingleFlight(object):
+    """
+    Register calls of idempotent methods in progress, so an identical call
+    made at the same time waits for the results of the first one instead of
+    calling the backend again.
+    """
+
+    def __init__(self):
+        self.mutex = Lock()
+        self.flights = {}
+        self.coalesced = 0
+
+    def take_off(self, backend, method, args, kwargs):
+        """
+        Get the flight of a call.
+
+        If the caller is the leader, it has to do the call and then give
+        results to :func:`land`. Otherwise, it waits for the
+        :attr:`Flight.landed` event.
+
+        :returns: the flight and True if the caller is the leader
+        :rtype: :class:`tuple`
+        """
+        key = make_key(backend, method, args, kwargs)
+        with self.mutex:
+            flight = self.flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                flight.followers += 1
+                return flight, False
+
+            flight = self.flights[key] = Flight(key)
+            return flight, True
+
+    def ground(self, flight):
+        """
+        Stop giving a flight to new identical calls, before it lands.
+
+        :returns: the number of calls waiting for the flight
+        :rtype: :class:`int`
+        """
+        with self.mutex:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+            return flight.followers
+
+    def land(self, flight, results, error=None):
+        """
+        Give results of a call to the calls which wait for it.
+
+        :param results: snapshots of results (see :func:`freeze`), or None
+                        if the call did not finish correctly
+        :type results: :class:`list`
+        :param error: (error, backtrace) if the call has failed
+        :type error: :class:`tuple`
+        """
+        flight.results = results
+        flight.error = error if results is None else None
+        with self.mutex:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+        flight.landed.set()
+
+    def stats(self):
+        """
+        Get the number of calls which have waited for an identical one.
+
+        :rtype: :class:`dict`
+        """
+        with self.mutex:
+            return {'in_flight': len(self.flights), 'coalesced': self.coalesced}
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+from threading import Lock
+from time import time
+
+from weboob.exceptions import BrowserUnavailable, BrowserHTTPNotFound
+from weboob.tools.log import getLogger
+
+
+__all__ = ['BackendsHealth', 'is_failure']
+
+
+def is_failure(error):
+    """
+    Check if an error means that the website of a backend is down, and not
+    that the call itself is wrong.
+
+    A :class:`weboob.exceptions.CallTimeout` is not a failure, as the
+    deadline is chosen by the caller.
+
+    >>> from weboob.exceptions import CallTimeout
+    >>> is_failure(BrowserUnavailable()), is_failure(BrowserHTTPNotFound()), is_failure(CallTimeout())
+    (True, False, False)
+
+    :rtype: :class:`bool`
+    """
+    if isinstance(error, BrowserHTTPNotFound):
+        return False
+    # Do not import requests only for this: if it has not been imported, the
+    # error can't come from it.
+    exceptions = sys.modules.get('requests.exceptions')
+    if exceptions is not None:
+        if isinstance(error, exceptions.HTTPError):
+            # Only server errors, not 4xx ones.
+            return error.response is None or error.response.status_code >= 500
+        if isinstance(error, (exceptions.ConnectionError, exceptions.Timeout)):
+            return True
+    return isinstance(error, BrowserUnavailable)
+
+
+class BackendsHealth(object):
+    """
+    Circuit breaker of backends.
+
+    After *threshold* consecutive failures (see :func:`is_failure`), a
+    backend is "open": calls fail immediately during *cooldown* seconds.
+    Then it is "half-open": one call is allowed to probe the website, and
+    the backend is closed again if it succeeds, or opened for an other
+    cooldown if it fails.
+
+    It is not enabled by default: applications enable it with
+    :func:`weboob.core.ouiboube.Weboob.enable_health`, and library users can
+    set :attr:`weboob.core.ouiboube.WebNip.health`.
+
+    >>> health = BackendsHealth(threshold=2, cooldown=60)
+    >>> health.record('a', [BrowserUnavailable()])
+    >>> health.allow('a')
+    True
+    >>> health.record('a', [BrowserUnavailable()])
+    >>> health.allow('a'), health.get_state('a')['state']
+    (False, 'open')
+
+    :param threshold: number of consecutive failures to open a backend
+    :type threshold: :class:`int`
+    :param cooldown: number of seconds during which an open backend is
+                     skipped
+    :type cooldown: :class:`float`
+    :param path: dedicated file where states are persisted, so they are
+                 shared by successive runs; it is only read when a state
+                 is needed. If not set, states are only kept in memory.
+    :type path: :class:`str`
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold=5, cooldown=300, path=None):
+        self.logger = getLogger('health')
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.path = path
+        self.storage = None
+        self.states = {}
+        # Backends for which a probe is running.
+        self.probing = set()
+        self.mutex = Lock()
+
+    def _new_state(self):
+        return {'state': self.CLOSED, 'failures': 0, 'opened_at': None,
+                'last_error': None, 'last_failure': None}
+
+    def _get_storage(self):
+        if self.storage is None and self.path is not None:
+            from weboob.tools.storage import StandardStorage
+            self.storage = StandardStorage(self.path)
+        return self.storage
+
+    def _get(self, name):
+        state = self.states.get(name)
+        if state is None:
+            if self._get_storage() is not None:
+                state = self.storage.get('health', name, default=None)
+            if not state:
+                state = self._new_state()
+            self.states[name] = state
+        return state
+
+    def _save(self, name):
+        if self._get_storage() is None:
+            return
+        try:
+            self.storage.set('health', name, dict(self.states[name]))
+            self.storage.save('health', name)
+        except Exception as e:
+            self.logger.warning(u'Unable to save health of backend %s: %s', name, e)
+
+    def allow(self, name):
+        """
+        Check if a backend can be called now. When True is returned for a
+        half-open backend, the caller has to :func:`record` the outcome of
+        its probe.
+
+        :rtype: :class:`bool`
+        """
+        with self.mutex:
+            state = self._get(name)
+            if state['state'] == self.CLOSED:
+                return True
+
+            if state['state'] == self.OPEN:
+                if time() < state['opened_at'] + self.cooldown:
+                    return False
+                self.logger.info(u'Backend %s is half-open, probe it', name)
+                state['state'] = self.HALF_OPEN
+
+            if name in self.probing:
+                return False
+            self.probing.add(name)
+            return True
+
+    def record(self, name, errors):
+        """
+        Record the outcome of a call.
+
+        :param errors: errors raised by the call
+        :type errors: list[:class:`Exception`]
+        """
+        failures = [error for error in errors if is_failure(error)]
+        with self.mutex:
+            state = self._get(name)
+            self.probing.discard(name)
+            if not failures:
+                if state['failures'] or state['state'] != self.CLOSED:
+                    if state['state'] != self.CLOSED:
+                        self.logger.info(u'Backend %s is available again', name)
+                    state.update(state=self.CLOSED, failures=0, opened_at=None)
+                    self._save(name)
+                return
+
+            state['failures'] += 1
+            state['last_error'] = u'%s: %s' % (failures[-1].__class__.__name__, failures[-1])
+            state['last_failure'] = time()
+            if state['state'] == self.HALF_OPEN or state['failures'] >= self.threshold:
+                self.logger.warning(u'Backend %s is unavailable, skip it for %d seconds (%s)',
+                                    name, self.cooldown, state['last_error'])
+                state['state'] = self.OPEN
+                state['opened_at'] = time()
+            self._save(name)
+
+    def release(self, name):
+        """
+        Record that a call has been stopped before its end (cancelled or
+        at the deadline of its caller), so its outcome is unknown. A
+        half-open backend can be probed again.
+
+        >>> health = BackendsHealth(threshold=1, cooldown=0)
+        >>> health.record('a', [BrowserUnavailable()])
+        >>> health.allow('a'), health.allow('a')
+        (True, False)
+        >>> health.release('a')
+        >>> health.allow('a'), health.get_state('a')['state']
+        (True, 'half-open')
+        """
+        with self.mutex:
+            self.probing.discard(name)
+
+    def get_state(self, name):
+        """
+        Get the state of a backend.
+
+        :rtype: :class:`dict`
+        """
+        with self.mutex:
+            state = dict(self._get(name))
+        if state['state'] == self.OPEN:
+            state['retry_in'] = max(0, state['opened_at'] + self.cooldown - time())
+        return state
+
+    def reset(self, name):
+        """
+        Forget failures of a backend.
+        """
+        with self.mutex:
+            self.states[name] = self._new_state()
+            self.probing.discard(name)
+            self._save(name)
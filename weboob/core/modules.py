@@ -20,12 +20,20 @@
 import os
 import imp
 import logging
-
-from weboob.tools.backend import Module
+import tempfile
+from importlib import import_module
+from threading import Lock
+
+from weboob.capabilities.base import Capability
+from weboob.tools import value as values
+from weboob.tools.backend import Module, BackendConfig
+from weboob.tools.json import json
 from weboob.tools.log import getLogger
+from weboob.tools.ordereddict import OrderedDict
 
 
-__all__ = ['LoadedModule', 'ModulesLoader', 'RepositoryModulesLoader', 'ModuleLoadError']
+__all__ = ['LoadedModule', 'LazyBackend', 'ModuleManifest', 'ModulesLoader', 'RepositoryModulesLoader',
+           'ModuleLoadError']
 
 
 class ModuleLoadError(Exception):
@@ -39,6 +47,7 @@ class LoadedModule(object):
         self.logger = getLogger('backend')
         self.package = package
         self.klass = None
+        self._manifest = None
         for attrname in dir(self.package):
             attr = getattr(self.package, attrname)
             if isinstance(attr, type) and issubclass(attr, Module) and attr != Module:
@@ -88,7 +97,7 @@ class LoadedModule(object):
 
     def has_caps(self, *caps):
         for c in caps:
-            if (isinstance(c, basestring) and c in [cap.__name__ for cap in self.iter_caps()]) or \
+            if (isinstance(c, basestring) and c in self.klass.get_caps_names()) or \
                (type(c) == type and issubclass(self.klass, c)):
                 return True
         return False
@@ -98,16 +107,343 @@ class LoadedModule(object):
         self.logger.debug(u'Created backend "%s" for module "%s"' % (instance_name, self.name))
         return backend_instance
 
+    @property
+    def manifest(self):
+        """
+        Manifest describing this module.
+
+        :rtype: :class:`ModuleManifest`
+        """
+        if self._manifest is None:
+            self._manifest = ModuleManifest.from_module(self)
+        return self._manifest
+
+
+class ModuleManifest(object):
+    """
+    Description of a module, which can be saved in a cache to list
+    modules, read their configuration schema and filter them by
+    capabilities without importing their code.
+
+    It has the same attributes than :class:`LoadedModule`, except the
+    module class itself.
+
+    A manifest is only valid while files of the module are not modified
+    (see :func:`is_fresh`).
+    """
+
+    # Name of manifests saved in directories of modules by previous
+    # versions, which are ignored.
+    FILENAME = 'manifest.json'
+
+    def __init__(self, name):
+        self.name = name
+        self.version = None
+        self.maintainer = u''
+        self.description = u''
+        self.license = u''
+        self.icon = None
+        self.website = None
+        # Capabilities, as "module.Class" paths.
+        self.capabilities = []
+        self.account_register = False
+        self.config = BackendConfig()
+        # Last modification time of files of the module.
+        self.mtime = 0
+
+    @classmethod
+    def from_module(cls, module):
+        """
+        Build the manifest of a loaded module.
+
+        :type module: :class:`LoadedModule`
+        :rtype: :class:`ModuleManifest`
+        """
+        manifest = cls(module.name)
+        manifest.version = module.version
+        manifest.maintainer = module.maintainer
+        manifest.description = module.description
+        manifest.license = module.license
+        manifest.icon = module.icon
+        manifest.website = module.website
+        manifest.capabilities = []
+        for cap in module.iter_caps():
+            path = '%s.%s' % (cap.__module__, cap.__name__)
+            if path not in manifest.capabilities:
+                manifest.capabilities.append(path)
+        manifest.account_register = getattr(module.klass, 'ACCOUNT_REGISTER_PROPERTIES', None) is not None
+        manifest.config = module.config
+        manifest.mtime = cls.get_tree_mtime(module.package.__path__[0])
+        return manifest
+
+    @staticmethod
+    def get_tree_mtime(path):
+        """
+        Get the last modification time of files of a module.
+
+        :rtype: :class:`float`
+        """
+        mtime = 0
+        for root, dirs, files in os.walk(path):
+            for f in files:
+                if f.endswith(('.pyc', '.pyo')) or f == ModuleManifest.FILENAME:
+                    continue
+                mtime = max(mtime, os.path.getmtime(os.path.join(root, f)))
+        return mtime
+
+    def is_fresh(self, path):
+        """
+        Check if files of the module in this directory have not been
+        modified since the manifest has been built.
+        """
+        return self.get_tree_mtime(path) <= self.mtime
+
+    def dump(self):
+        """
+        Dump the manifest in a dictionary.
+
+        :rtype: :class:`dict`
+        """
+        config = []
+        for field in self.config.itervalues():
+            attrs = dict(field.__dict__)
+            if attrs.get('choices') is not None:
+                attrs['choices'] = list(attrs['choices'].iteritems())
+            config.append((type(field).__name__, attrs))
+
+        return {'name': self.name,
+                'version': self.version,
+                'maintainer': self.maintainer,
+                'description': self.description,
+                'license': self.license,
+                'icon': self.icon,
+                'website': self.website,
+                'capabilities': self.capabilities,
+                'account_register': self.account_register,
+                'config': config,
+                'mtime': self.mtime,
+               }
+
+    @classmethod
+    def load(cls, data):
+        """
+        Build a manifest from a dictionary returned by :func:`dump`.
+
+        :rtype: :class:`ModuleManifest`
+        """
+        manifest = cls(data['name'])
+        for key in ('version', 'maintainer', 'description', 'license', 'icon', 'website', 'capabilities',
+                    'account_register', 'mtime'):
+            setattr(manifest, key, data[key])
+        for classname, attrs in data['config']:
+            klass = getattr(values, classname)
+            if not (isinstance(klass, type) and issubclass(klass, values.Value)):
+                raise ValueError('%s is not a Value class' % classname)
+            # Do not call the constructor, as subclasses force some attributes.
+            field = klass.__new__(klass)
+            field.__dict__.update(attrs)
+            if field.choices is not None:
+                field.choices = OrderedDict((tuple(choice) for choice in field.choices))
+            manifest.config[field.id] = field
+        return manifest
+
+    @classmethod
+    def read(cls, filename):
+        """
+        Read a manifest saved in a file.
+
+        :rtype: :class:`ModuleManifest` or None if there is no valid manifest
+        """
+        try:
+            with open(filename, 'r') as fp:
+                return cls.load(json.load(fp))
+        except (IOError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def save(self, filename):
+        """
+        Save the manifest in a file. Manifests are not saved in directories
+        of modules, so they are not shipped with them.
+        """
+        dirname = os.path.dirname(filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # Write in a temporary file to never let an incomplete file.
+        fd, tmpname = tempfile.mkstemp(dir=dirname)
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(self.dump(), fp)
+        except Exception:
+            os.remove(tmpname)
+            raise
+        os.rename(tmpname, filename)
+
+    def iter_caps(self):
+        """
+        Iter capabilities implemented by this module.
+
+        :rtype: iter[:class:`weboob.capabilities.base.Capability`]
+        """
+        for path in self.capabilities:
+            modname, clsname = path.rsplit('.', 1)
+            yield getattr(import_module(modname), clsname)
+
+    def get_caps_names(self):
+        """
+        Get names of capabilities implemented by this module.
+
+        :rtype: frozenset[:class:`str`]
+        """
+        return frozenset(path.rsplit('.', 1)[1] for path in self.capabilities)
+
+    def has_caps(self, *caps):
+        names = self.get_caps_names()
+        for c in caps:
+            if type(c) == type:
+                c = c.__name__
+            if c in names:
+                return True
+        return False
+
+
+class LazyBackend(object):
+    """
+    Proxy of a backend which is not created before it is needed.
+
+    The module is imported and the backend instance created (and so its
+    config and storage loaded) on the first access to an attribute which is
+    not known from the repository metadata of the module. Checks of
+    capabilities with :func:`has_caps` do not import the module, and
+    ``isinstance(backend, CapXXX)`` imports it without creating the backend.
+
+    :param loader: loader of the module
+    :type loader: :class:`ModulesLoader`
+    :param minfo: information about the module
+    :type minfo: :class:`weboob.core.repositories.ModuleInfo`
+    :param weboob: weboob object given to the backend
+    :param name: name of backend
+    :type name: :class:`basestring`
+    :param config: parameters to give to backend
+    :type config: :class:`dict`
+    :param storage: storage to use
+    :type storage: :class:`weboob.tools.storage.IStorage`
+    """
+
+    def __init__(self, loader, minfo, weboob, name, config, storage):
+        self.loader = loader
+        self.minfo = minfo
+        self.weboob = weboob
+        self.name = name
+        self.config_params = config
+        self.storage_backend = storage
+        self.instance = None
+        self.mutex = Lock()
+
+    @property
+    def __class__(self):
+        # isinstance(backend, CapXXX) uses the class of the module, which is
+        # loaded without creating the backend.
+        return self.loader.get_or_load_module(self.minfo.name).klass
+
+    @property
+    def NAME(self):
+        return self.minfo.name
+
+    @property
+    def DESCRIPTION(self):
+        return self.minfo.description
+
+    @property
+    def MAINTAINER(self):
+        return self.minfo.maintainer
+
+    @property
+    def LICENSE(self):
+        return self.minfo.license
+
+    def __repr__(self):
+        return u"<Backend %r>" % self.name
+
+    def get_instance(self):
+        """
+        Get the backend, and create it if needed.
+
+        Can raise a :class:`ModuleLoadError` or a
+        :class:`weboob.tools.backend.Module.ConfigError` exception.
+
+        :rtype: :class:`weboob.tools.backend.Module`
+        """
+        if self.instance is None:
+            with self.mutex:
+                if self.instance is None:
+                    module = self.loader.get_or_load_module(self.minfo.name)
+                    self.instance = module.create_instance(self.weboob, self.name,
+                                                           self.config_params, self.storage_backend)
+        return self.instance
+
+    def get_caps_names(self):
+        """
+        Get names of capabilities implemented by this backend, without
+        loading it.
+
+        :rtype: frozenset[:class:`str`]
+        """
+        return self.minfo.get_caps_names()
+
+    def has_caps(self, *caps):
+        """
+        Check if this backend implements at least one of these capabilities,
+        without loading it.
+
+        Other classes (for example the class of a module) can be given too,
+        but then the module is imported to check them.
+        """
+        flat = []
+        for c in caps:
+            if isinstance(c, (list, tuple)):
+                flat.extend(c)
+            else:
+                flat.append(c)
+
+        # Modules are subclasses of their capabilities.
+        names = [c for c in flat if isinstance(c, basestring) or
+                 (issubclass(c, Capability) and not issubclass(c, Module))]
+        klasses = [c for c in flat if c not in names]
+        if self.minfo.has_caps(names):
+            return True
+        return any(issubclass(self.__class__, c) for c in klasses)
+
+    def deinit(self):
+        """
+        Deinit the backend, if it has been created.
+        """
+        if self.instance is not None:
+            with self.instance:
+                self.instance.deinit()
+
+    def __enter__(self):
+        return self.get_instance().__enter__()
+
+    def __exit__(self, t, v, tb):
+        return self.instance.__exit__(t, v, tb)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get_instance(), name)
+
 
 class ModulesLoader(object):
     """
     Load modules.
     """
 
-    def __init__(self, path, version=None):
+    def __init__(self, path, version=None, manifests_dir=None):
         self.version = version
         self.path = path
+        self.manifests_dir = manifests_dir
         self.loaded = {}
+        self.manifests = {}
         self.logger = getLogger('modules')
 
     def get_or_load_module(self, module_name):
@@ -118,6 +454,56 @@ class ModulesLoader(object):
             self.load_module(module_name)
         return self.loaded[module_name]
 
+    def get_manifest(self, module_name):
+        """
+        Get the manifest of a module. The module is not imported if it has
+        a valid manifest.
+
+        Can raise a ModuleLoadError exception.
+
+        :rtype: :class:`ModuleManifest`
+        """
+        if module_name in self.loaded:
+            return self.loaded[module_name].manifest
+
+        manifest = self.manifests.get(module_name)
+        if manifest is None:
+            filename = self.get_manifest_filename(module_name)
+            if filename is not None:
+                manifest = self.read_manifest(filename, os.path.join(self.get_module_path(module_name), module_name))
+            if manifest is None:
+                self.logger.debug('No valid manifest for module "%s", load it' % module_name)
+                manifest = self.get_or_load_module(module_name).manifest
+            self.manifests[module_name] = manifest
+        return manifest
+
+    def read_manifest(self, filename, module_path):
+        """
+        Read the manifest of a module, if it is valid for this version of
+        weboob and files of the module have not been modified since.
+
+        :param filename: file of the manifest
+        :type filename: str
+        :param module_path: directory of the module
+        :type module_path: str
+        :rtype: :class:`ModuleManifest` or None
+        """
+        manifest = ModuleManifest.read(filename)
+        if manifest is None or manifest.version != self.version or not manifest.is_fresh(module_path):
+            return None
+        return manifest
+
+    def get_manifest_filename(self, module_name):
+        """
+        Get the file where the manifest of a module is saved when it is
+        loaded.
+
+        :rtype: str or None if manifests are not saved
+        """
+        if self.manifests_dir is None:
+            return None
+        return os.path.join(self.manifests_dir, '%s.json' % module_name)
+
     def iter_existing_module_names(self):
         for name in os.listdir(self.path):
             try:
@@ -160,6 +546,14 @@ class ModulesLoader(object):
         self.loaded[module_name] = module
         self.logger.debug('Loaded module "%s" from %s' % (module_name, module.package.__path__[0]))
 
+        module_path = module.package.__path__[0]
+        filename = self.get_manifest_filename(module_name)
+        if filename is not None and self.read_manifest(filename, module_path) is None:
+            try:
+                module.manifest.save(filename)
+            except (IOError, OSError, TypeError, ValueError) as e:
+                self.logger.warning('Unable to save manifest of module "%s": %s' % (module_name, e))
+
     def get_module_path(self, module_name):
         return self.path
 
@@ -170,7 +564,8 @@ class RepositoryModulesLoader(ModulesLoader):
     """
 
     def __init__(self, repositories):
-        super(RepositoryModulesLoader, self).__init__(repositories.modules_dir, repositories.version)
+        super(RepositoryModulesLoader, self).__init__(repositories.modules_dir, repositories.version,
+                                                      repositories.manifests_dir)
         self.repositories = repositories
 
     def iter_existing_module_names(self):
@@ -185,3 +580,11 @@ class RepositoryModulesLoader(ModulesLoader):
             raise ModuleLoadError(module_name, 'Module %s is not installed' % module_name)
 
         return minfo.path
+
+    def get_manifest_filename(self, module_name):
+        # Modules of local repositories and installed ones have distinct
+        # manifests, see Repositories.get_manifests_dir().
+        minfo = self.repositories.get_module_info(module_name)
+        if minfo is None or minfo.path is None:
+            return None
+        return os.path.join(self.repositories.get_manifests_dir(minfo.path), '%s.json' % module_name)
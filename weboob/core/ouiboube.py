@@ -19,15 +19,21 @@
 
 
 import os
+from time import time
 
-from weboob.core.bcall import BackendsCall
-from weboob.core.modules import ModulesLoader, RepositoryModulesLoader, ModuleLoadError
+from weboob.core.bcall import BackendsCall, BackendProcesses, ProcessBackendsCall
+from weboob.core.cache import SingleFlight
+from weboob.core.health import BackendsHealth
+from weboob.core.modules import ModulesLoader, RepositoryModulesLoader, ModuleLoadError, LazyBackend
 from weboob.core.backendscfg import BackendsConfig
 from weboob.core.repositories import Repositories, PrintProgress
 from weboob.core.scheduler import Scheduler
+from weboob.core.workers import WorkerPool
+from weboob.capabilities.base import Capability
 from weboob.tools.backend import Module
 from weboob.tools.config.iconfig import ConfigError
 from weboob.tools.log import getLogger
+from weboob.tools.tracing import Tracer, get_tracer
 
 
 __all__ = ['WebNip', 'Weboob']
@@ -37,6 +43,103 @@ class VersionsMismatchError(ConfigError):
     pass
 
 
+class BackendsIndex(dict):
+    """
+    Dictionary of loaded backends, indexed by name, which also keeps an
+    index of backends by capability.
+    """
+
+    def __init__(self):
+        super(BackendsIndex, self).__init__()
+        # capability name -> set of backend names
+        self.caps = {}
+
+    @staticmethod
+    def get_caps_names(caps):
+        """
+        Get names of capabilities, or None if one of them is not a
+        capability (for example a module class).
+
+        :rtype: :class:`set`
+        """
+        if isinstance(caps, (basestring, type)):
+            caps = (caps,)
+        names = set()
+        for cap in caps:
+            if isinstance(cap, (list, tuple)):
+                subnames = BackendsIndex.get_caps_names(cap)
+                if subnames is None:
+                    return None
+                names |= subnames
+            elif isinstance(cap, basestring):
+                names.add(cap)
+            elif isinstance(cap, type) and issubclass(cap, Capability) and \
+                    not issubclass(cap, Module) and cap is not Capability:
+                names.add(cap.__name__)
+            else:
+                return None
+        return names
+
+    def select(self, caps):
+        """
+        Get names of backends which implement at least one of these
+        capabilities.
+
+        :rtype: :class:`set` or None if they can't be found from the index
+        """
+        names = self.get_caps_names(caps)
+        if names is None:
+            return None
+        selected = set()
+        for name in names:
+            selected |= self.caps.get(name, set())
+        return selected
+
+    def __setitem__(self, name, backend):
+        if name in self:
+            self._unindex(name, self[name])
+        super(BackendsIndex, self).__setitem__(name, backend)
+        for cap in backend.get_caps_names():
+            self.caps.setdefault(cap, set()).add(name)
+
+    def __delitem__(self, name):
+        self._unindex(name, self[name])
+        super(BackendsIndex, self).__delitem__(name)
+
+    def _unindex(self, name, backend):
+        for cap in backend.get_caps_names():
+            names = self.caps.get(cap)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.caps[cap]
+
+    def pop(self, name, *default):
+        if name not in self:
+            return super(BackendsIndex, self).pop(name, *default)
+        backend = self[name]
+        del self[name]
+        return backend
+
+    def popitem(self):
+        name, backend = super(BackendsIndex, self).popitem()
+        self._unindex(name, backend)
+        return name, backend
+
+    def setdefault(self, name, backend=None):
+        if name not in self:
+            self[name] = backend
+        return self[name]
+
+    def update(self, *args, **kwargs):
+        for name, backend in dict(*args, **kwargs).iteritems():
+            self[name] = backend
+
+    def clear(self):
+        super(BackendsIndex, self).clear()
+        self.caps.clear()
+
+
 class WebNip(object):
     """
     Weboob in Non Integrated Programs
@@ -50,12 +153,28 @@ class WebNip(object):
     :type storage: :class:`weboob.tools.storage.IStorage`
     :param scheduler: what scheduler to use; default is :class:`weboob.core.scheduler.Scheduler`
     :type scheduler: :class:`weboob.core.scheduler.IScheduler`
+    :param max_workers: maximum number of backends called concurrently;
+                        default is :attr:`MAX_WORKERS`
+    :type max_workers: :class:`int`
+    :param results_cache: if set, cache results of idempotent methods
+    :type results_cache: :class:`weboob.core.cache.ResultsCache`
     """
     VERSION = '1.1'
 
-    def __init__(self, modules_path=None, storage=None, scheduler=None):
+    MAX_WORKERS = 20
+    """
+    Default size of the pool of threads used by :func:`do`.
+    """
+
+    DEINIT_TIMEOUT = 0.1
+    """
+    Maximum number of seconds during which :func:`deinit` waits for workers
+    to exit.
+    """
+
+    def __init__(self, modules_path=None, storage=None, scheduler=None, max_workers=None, results_cache=None):
         self.logger = getLogger('weboob')
-        self.backend_instances = {}
+        self.backend_instances = BackendsIndex()
         self.callbacks = {'login':   lambda backend_name, value: None,
                           'captcha': lambda backend_name, image: None,
                          }
@@ -73,6 +192,21 @@ class WebNip(object):
 
         self.storage = storage
 
+        if max_workers is None:
+            max_workers = int(os.environ.get('WEBOOB_MAX_WORKERS', self.MAX_WORKERS))
+        self.workers = WorkerPool(max_workers, name='bcall')
+        # Worker processes of backends called with executor='process'.
+        self.processes = BackendProcesses()
+
+        self.results_cache = results_cache
+        self.flights = SingleFlight()
+        self.health = None
+        """
+        Circuit breaker of backends (see
+        :class:`weboob.core.health.BackendsHealth`). It is disabled unless
+        it is set.
+        """
+
     def __deinit__(self):
         self.deinit()
 
@@ -82,6 +216,12 @@ class WebNip(object):
         properly unload all correctly.
         """
         self.unload_backends()
+        # A backend still running after the deadline or the cancellation of
+        # its call would block the exit until its requests return, so
+        # workers are not waited for long. Idle ones exit at once, and then
+        # are not stopped by the exit of the interpreter.
+        self.workers.shutdown(wait=True, timeout=self.DEINIT_TIMEOUT)
+        self.processes.close()
 
     def build_backend(self, module_name, params=None, storage=None, name=None):
         """
@@ -155,8 +295,12 @@ class WebNip(object):
 
         for name in names:
             backend = self.backend_instances.pop(name)
-            with backend:
+            self.processes.discard(name)
+            if isinstance(backend, LazyBackend):
                 backend.deinit()
+            else:
+                with backend:
+                    backend.deinit()
             unloaded[backend.name] = backend
 
         return unloaded
@@ -203,8 +347,9 @@ class WebNip(object):
         :type module: :class:`basestring`
         :rtype: iter[:class:`weboob.tools.backend.Module`]
         """
-        for _, backend in sorted(self.backend_instances.iteritems()):
-            if (caps is None or backend.has_caps(caps)) and \
+        selected = None if caps is None else self.backend_instances.select(caps)
+        for name, backend in sorted(self.backend_instances.iteritems()):
+            if (caps is None or (name in selected if selected is not None else backend.has_caps(caps))) and \
                (module is None or backend.NAME == module):
                 with backend:
                     yield backend
@@ -216,8 +361,8 @@ class WebNip(object):
 
     def do(self, function, *args, **kwargs):
         r"""
-        Do calls on loaded backends with specified arguments, in separated
-        threads.
+        Do calls on loaded backends with specified arguments, in threads
+        of the :attr:`workers` pool.
 
         This function has two modes:
 
@@ -233,8 +378,56 @@ class WebNip(object):
         :type backends: list[:class:`str`]
         :param caps: iterate on backends which implement this caps
         :type caps: list[:class:`weboob.capabilities.base.Capability`]
+        :param timeout: stop the call after this number of seconds, keeping
+                        results which have arrived; late backends are
+                        reported with a :class:`weboob.exceptions.CallTimeout`
+                        error
+        :type timeout: :class:`float`
+        :param deadline: same as *timeout*, but with an absolute timestamp
+        :type deadline: :class:`float`
+        :param max_results: stop every backend once this number of results
+                            has been received from all of them
+        :type max_results: :class:`int`
+        :param more_results_error: exception class stored in errors for
+                                   backends stopped by *max_results*
+        :type more_results_error: :class:`type`
+        :param max_pending: pause backends while this number of results are
+                            waiting to be consumed
+        :type max_pending: :class:`int`
+        :param use_cache: if False, do not use :attr:`results_cache`
+        :type use_cache: :class:`bool`
+        :param check_health: if False, call backends even if their
+                             website is known to be down (see
+                             :attr:`health`)
+        :type check_health: :class:`bool`
+        :param trace: record spans of the call (see
+                      :mod:`weboob.tools.tracing`) in this tracer, or in a
+                      new one saved in this file once the call is over
+        :type trace: :class:`weboob.tools.tracing.Tracer` or :class:`str`
+        :param executor: 'thread' (default) to call backends in threads, or
+                         'process' to call them in worker processes kept
+                         by :attr:`processes` (see
+                         :class:`weboob.core.bcall.ProcessBackendsCall`)
+        :type executor: :class:`str`
         :rtype: A :class:`weboob.core.bcall.BackendsCall` object (iterable)
         """
+        executor = kwargs.pop('executor', 'thread')
+        cache = self.results_cache if kwargs.pop('use_cache', True) else None
+        max_results = kwargs.pop('max_results', None)
+        more_results_error = kwargs.pop('more_results_error', None)
+        max_pending = kwargs.pop('max_pending', None)
+        deadline = kwargs.pop('deadline', None)
+        timeout = kwargs.pop('timeout', None)
+        if timeout is not None:
+            deadline = min(deadline or float('inf'), time() + timeout)
+        tracer = kwargs.pop('trace', None)
+        trace_path = None
+        if isinstance(tracer, basestring):
+            trace_path = tracer
+            tracer = Tracer()
+        elif tracer is None:
+            tracer = get_tracer()
+
         backends = self.backend_instances.values()
         _backends = kwargs.pop('backends', None)
         if _backends is not None:
@@ -261,13 +454,34 @@ class WebNip(object):
 
         if 'caps' in kwargs:
             caps = kwargs.pop('caps')
-            backends = [backend for backend in backends if backend.has_caps(caps)]
+            selected = self.backend_instances.select(caps)
+            if selected is None:
+                backends = [backend for backend in backends if backend.has_caps(caps)]
+            elif _backends is None:
+                backends = [self.backend_instances[name] for name in selected]
+            else:
+                # Backends which are not loaded are not in the index.
+                backends = [backend for backend in backends
+                            if (backend.name in selected if self.backend_instances.get(backend.name) is backend
+                                else backend.has_caps(caps))]
 
         # The return value MUST BE the BackendsCall instance. Please never iterate
         # here on this object, because caller might want to use other methods, like
         # wait() on callback_thread().
         # Thanks a lot.
-        return BackendsCall(backends, function, *args, **kwargs)
+        if executor == 'process':
+            klass = ProcessBackendsCall
+            kwargs['processes'] = self.processes
+        elif executor == 'thread':
+            klass = BackendsCall
+        else:
+            raise ValueError(u'Unknown executor %r' % executor)
+
+        return klass(backends, function, workers=self.workers, deadline=deadline,
+                     max_results=max_results, more_results_error=more_results_error, max_pending=max_pending,
+                     cache=cache, flights=self.flights,
+                     health=self.health if kwargs.pop('check_health', True) else None,
+                     tracer=tracer, trace_path=trace_path, *args, **kwargs)
 
     def schedule(self, interval, function, *args):
         """
@@ -328,11 +542,18 @@ class Weboob(WebNip):
     :type backends_filename: str
     :param storage: provide a storage where backends can save data
     :type storage: :class:`weboob.tools.storage.IStorage`
+    :param max_workers: maximum number of backends called concurrently
+    :type max_workers: :class:`int`
+    :param results_cache: if set, cache results of idempotent methods
+    :type results_cache: :class:`weboob.core.cache.ResultsCache`
     """
     BACKENDS_FILENAME = 'backends'
+    HEALTH_FILENAME = 'health.storage'
 
-    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None):
-        super(Weboob, self).__init__(modules_path=False, scheduler=scheduler, storage=storage)
+    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None, max_workers=None,
+                 results_cache=None):
+        super(Weboob, self).__init__(modules_path=False, scheduler=scheduler, storage=storage, max_workers=max_workers,
+                                     results_cache=results_cache)
 
         # Create WORKDIR
         if workdir is not None:
@@ -357,6 +578,21 @@ class Weboob(WebNip):
             backends_filename = os.path.join(self.workdir, backends_filename)
         self.backends_config = BackendsConfig(backends_filename)
 
+    def enable_health(self, threshold=5, cooldown=300):
+        """
+        Enable the circuit breaker of backends (see
+        :class:`weboob.core.health.BackendsHealth`). Its states are kept
+        across runs in the :attr:`HEALTH_FILENAME` file of the workdir.
+
+        :param threshold: number of consecutive failures to skip a backend
+        :type threshold: :class:`int`
+        :param cooldown: number of seconds during which a backend is skipped
+        :type cooldown: :class:`float`
+        :rtype: :class:`weboob.core.health.BackendsHealth`
+        """
+        self.health = BackendsHealth(threshold, cooldown, path=os.path.join(self.workdir, self.HEALTH_FILENAME))
+        return self.health
+
     def _create_dir(self, name):
         if not os.path.exists(name):
             os.makedirs(name)
@@ -397,10 +633,17 @@ class Weboob(WebNip):
 
         return super(Weboob, self).build_backend(module_name, params, storage, name)
 
-    def load_backends(self, caps=None, names=None, modules=None, exclude=None, storage=None, errors=None):
+    def load_backends(self, caps=None, names=None, modules=None, exclude=None, storage=None, errors=None,
+                      lazy=None):
         """
         Load backends listed in config file.
 
+        With *lazy*, modules are not imported and backends are not created
+        before they are used: :class:`weboob.core.modules.LazyBackend`
+        proxies are loaded instead, and errors (for example a
+        :class:`weboob.tools.backend.Module.ConfigError`) are raised on the
+        first call.
+
         :param caps: load backends which implement all of specified caps
         :type caps: tuple[:class:`weboob.capabilities.base.Capability`]
         :param names: load backends with instance name in list
@@ -413,12 +656,17 @@ class Weboob(WebNip):
         :type storage: :class:`weboob.tools.storage.IStorage`
         :param errors: if specified, store every errors in this list
         :type errors: list[:class:`LoadError`]
+        :param lazy: defer the loading of backends; default is True if the
+                     WEBOOB_LAZY_BACKENDS environment variable is set
+        :type lazy: :class:`bool`
         :returns: loaded backends
         :rtype: dict[:class:`str`, :class:`weboob.tools.backend.Module`]
         """
         loaded = {}
         if storage is None:
             storage = self.storage
+        if lazy is None:
+            lazy = bool(os.environ.get('WEBOOB_LAZY_BACKENDS'))
 
         if not self.repositories.check_repositories():
             self.logger.error(u'Repositories are not consistent with the sources.list')
@@ -443,6 +691,15 @@ class Weboob(WebNip):
             if not minfo.is_installed():
                 self.repositories.install(minfo)
 
+            if lazy:
+                if instance_name in self.backend_instances:
+                    self.logger.warning(u'Oops, the backend "%s" is already loaded. Unload it before reloading...', instance_name)
+                    self.unload_backends(instance_name)
+
+                self.backend_instances[instance_name] = loaded[instance_name] = \
+                    LazyBackend(self.modules_loader, minfo, self, instance_name, params, storage)
+                continue
+
             module = None
             try:
                 module = self.modules_loader.get_or_load_module(module_name)
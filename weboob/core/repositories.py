@@ -27,19 +27,26 @@ import sys
 import os
 import subprocess
 import hashlib
+import tempfile
 from datetime import datetime
 from contextlib import closing
 from compileall import compile_dir
 from io import BytesIO
+from threading import Event, Lock, local
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
 
 from weboob.exceptions import BrowserHTTPError, BrowserHTTPNotFound
-from .modules import LoadedModule
+from .modules import LoadedModule, ModuleManifest
+from .workers import WorkerPool
 from weboob.tools.log import getLogger
 from weboob.tools.misc import get_backtrace, to_unicode
 try:
-    from ConfigParser import RawConfigParser, DEFAULTSECT
+    from ConfigParser import RawConfigParser, DEFAULTSECT, Error as ConfigParserError
 except ImportError:
-    from configparser import RawConfigParser, DEFAULTSECT
+    from configparser import RawConfigParser, DEFAULTSECT, Error as ConfigParserError
 
 
 class ModuleInfo(object):
@@ -57,6 +64,7 @@ class ModuleInfo(object):
 
         self.version = 0
         self.capabilities = ()
+        self._caps_names = None
         self.description = u''
         self.maintainer = u''
         self.license = u''
@@ -72,13 +80,25 @@ class ModuleInfo(object):
         self.icon = items['icon'].strip() or None
         self.urls = items['urls']
 
+    def get_caps_names(self):
+        """
+        Get names of capabilities implemented by this module.
+
+        :rtype: frozenset[:class:`str`]
+        """
+        # Computed again only if capabilities have been replaced.
+        if self._caps_names is None or self._caps_names[0] is not self.capabilities:
+            self._caps_names = (self.capabilities, frozenset(self.capabilities))
+        return self._caps_names[1]
+
     def has_caps(self, caps):
         if not isinstance(caps, (list, tuple)):
             caps = [caps]
+        names = self.get_caps_names()
         for c in caps:
             if type(c) == type:
                 c = c.__name__
-            if c in self.capabilities:
+            if c in names:
                 return True
         return False
 
@@ -112,6 +132,10 @@ class Repository(object):
     INDEX = 'modules.list'
     KEYDIR = '.keys'
     KEYRING = 'trusted.gpg'
+    # Directory of deltas between previous versions of the index and the
+    # current one, named after the "update" stamp of the previous version.
+    DELTAS_DIR = 'deltas'
+    DELTAS_KEPT = 50
 
     def __init__(self, url):
         self.url = url
@@ -121,6 +145,9 @@ class Repository(object):
         self.local = None
         self.signed = False
         self.key_update = 0
+        # Validators of the index, for conditional requests.
+        self.etag = None
+        self.last_modified = None
         self.logger = getLogger('repository')
 
         self.modules = {}
@@ -148,13 +175,19 @@ class Repository(object):
             return self.url[len('file://'):]
         return self.url
 
-    def retrieve_index(self, browser, repo_path):
+    def retrieve_index(self, browser, repo_path, previous=None, manifests_dir=None):
         """
         Retrieve the index file of this repository. It can use network
         if this is a remote repository.
 
         :param repo_path: path to save the downloaded index file.
         :type repo_path: str
+        :param previous: previously retrieved index of this repository, to
+                         only download changes
+        :type previous: :class:`Repository`
+        :param manifests_dir: directory of manifests of modules of a local
+                              repository (see :func:`build_index`)
+        :type manifests_dir: str
         """
         if self.local:
             # Repository is local, open the file.
@@ -164,24 +197,86 @@ class Repository(object):
             except IOError as e:
                 # This local repository doesn't contain a built modules.list index.
                 self.name = Repositories.url2filename(self.url)
-                self.build_index(self.localurl2path(), filename)
+                self.build_index(self.localurl2path(), filename, manifests_dir=manifests_dir)
                 fp = open(filename, 'r')
+        elif previous is not None and previous.update and self.retrieve_delta(browser, previous):
+            fp = None
         else:
             # This is a remote repository, download file
+            headers = {}
+            if previous is not None and previous.etag:
+                headers['If-None-Match'] = previous.etag
+            if previous is not None and previous.last_modified:
+                headers['If-Modified-Since'] = previous.last_modified
             try:
-                fp = BytesIO(browser.open(posixpath.join(self.url, self.INDEX)).content)
+                response = browser.open(posixpath.join(self.url, self.INDEX), headers=headers)
             except BrowserHTTPError as e:
                 raise RepositoryUnavailable(unicode(e))
 
-        self.parse_index(fp)
+            if response.status_code == 304:
+                self.logger.debug(u'Index of %s has not changed', self.url)
+                self.copy_index(previous)
+                fp = None
+            else:
+                fp = BytesIO(response.content)
+                self.etag = response.headers.get('ETag')
+                self.last_modified = response.headers.get('Last-Modified')
+
+        if fp is not None:
+            self.parse_index(fp)
 
         if self.local:
             # Always rebuild index of a local repository.
-            self.build_index(self.localurl2path(), filename)
+            self.build_index(self.localurl2path(), filename, manifests_dir=manifests_dir)
 
         # Save the repository index in ~/.weboob/repositories/
         self.save(repo_path, private=True)
 
+    def copy_index(self, other):
+        """
+        Use the index of an other instance of this repository.
+        """
+        for key in ('name', 'update', 'maintainer', 'signed', 'key_update', 'etag', 'last_modified'):
+            setattr(self, key, getattr(other, key))
+        self.modules = dict(other.modules)
+
+    def retrieve_delta(self, browser, previous):
+        """
+        Update the previous index of this repository with the changes made
+        since, if the repository provides them.
+
+        :type previous: :class:`Repository`
+        :returns: False if there is no delta
+        :rtype: :class:`bool`
+        """
+        try:
+            response = browser.open(posixpath.join(self.url, self.DELTAS_DIR, '%s.list' % previous.update))
+        except (BrowserHTTPNotFound, BrowserHTTPError) as e:
+            self.logger.debug(u'No delta for %s since %s: %s', self.url, previous.update, e)
+            return False
+
+        config = RawConfigParser()
+        try:
+            config.readfp(BytesIO(response.content))
+            items = dict(config.items(DEFAULTSECT))
+            if int(items['since']) != previous.update:
+                return False
+            self.copy_index(previous)
+            self.read_header(items)
+            # Validators of the previous index do not match this one
+            # anymore, and the ones of the delta are not for the index.
+            self.etag = self.last_modified = None
+        except (ConfigParserError, KeyError, ValueError) as e:
+            self.logger.warning(u'Invalid delta for %s since %s: %s', self.url, previous.update, e)
+            return False
+
+        for name in items.get('removed', '').split():
+            self.modules.pop(name, None)
+        for section in config.sections():
+            self.modules[section] = self.load_module_info(section, dict(config.items(section)))
+        self.logger.debug(u'Index of %s updated with a delta of %d modules', self.url, len(config.sections()))
+        return True
+
     def retrieve_keyring(self, browser, keyring_path, progress):
         # ignore local
         if self.local:
@@ -223,11 +318,7 @@ class Repository(object):
         # Read default parameters
         items = dict(config.items(DEFAULTSECT))
         try:
-            self.name = items['name']
-            self.update = int(items['update'])
-            self.maintainer = items['maintainer']
-            self.signed = bool(int(items.get('signed', '0')))
-            self.key_update = int(items.get('key_update', '0'))
+            self.read_header(items)
         except KeyError as e:
             raise RepositoryUnavailable('Missing global parameters in repository: %s' % e)
         except ValueError as e:
@@ -239,21 +330,44 @@ class Repository(object):
         if 'url' in items:
             self.url = items['url']
             self.local = self.url.startswith('file://')
+            self.etag = items.get('etag') or None
+            self.last_modified = items.get('last_modified') or None
         elif self.local is None:
             raise RepositoryUnavailable('Missing "url" key in settings')
 
         # Load modules
         self.modules.clear()
         for section in config.sections():
-            module = ModuleInfo(section)
-            module.load(dict(config.items(section)))
-            if not self.local:
-                module.url = posixpath.join(self.url, '%s.tar.gz' % module.name)
-                module.repo_url = self.url
-                module.signed = self.signed
-            self.modules[section] = module
+            self.modules[section] = self.load_module_info(section, dict(config.items(section)))
+
+    def read_header(self, items):
+        """
+        Read global parameters of an index.
+
+        :param items: parameters of the DEFAULT section
+        :type items: :class:`dict`
+        """
+        self.name = items['name']
+        self.update = int(items['update'])
+        self.maintainer = items['maintainer']
+        self.signed = bool(int(items.get('signed', '0')))
+        self.key_update = int(items.get('key_update', '0'))
+
+    def load_module_info(self, name, items):
+        """
+        Get information about a module from its section of an index.
 
-    def build_index(self, path, filename):
+        :rtype: :class:`ModuleInfo`
+        """
+        module = ModuleInfo(name)
+        module.load(items)
+        if not self.local:
+            module.url = posixpath.join(self.url, '%s.tar.gz' % module.name)
+            module.repo_url = self.url
+            module.signed = self.signed
+        return module
+
+    def build_index(self, path, filename, deltas=False, manifests_dir=None):
         """
         Rebuild index of modules of repository.
 
@@ -261,8 +375,18 @@ class Repository(object):
         :type path: str
         :param filename: file to save index
         :type filename: str
+        :param deltas: write deltas since previous versions of the index in
+                       the :attr:`DELTAS_DIR` directory next to *filename*
+        :type deltas: bool
+        :param manifests_dir: directory where manifests of modules are saved,
+                              to import only modules modified since the
+                              previous build
+        :type manifests_dir: str
         """
         print('Rebuild index')
+        previous_update = self.update
+        previous_modules = dict((name, dict(module.dump())) for name, module in self.modules.iteritems())
+        previous_key_update = self.key_update
         self.modules.clear()
 
         if os.path.isdir(os.path.join(path, self.KEYDIR)):
@@ -274,32 +398,118 @@ class Repository(object):
 
         for name in sorted(os.listdir(path)):
             module_path = os.path.join(path, name)
-            if not os.path.isdir(module_path) or '.' in name or name == self.KEYDIR:
+            if not os.path.isdir(module_path) or '.' in name or name in (self.KEYDIR, self.DELTAS_DIR):
                 continue
 
-            try:
-                fp, pathname, description = imp.find_module(name, [path])
+            # Import the module only if it has been modified since its
+            # manifest has been saved.
+            module = None
+            if manifests_dir is not None:
+                manifest_path = os.path.join(manifests_dir, '%s.json' % name)
+                module = ModuleManifest.read(manifest_path)
+            if module is None or not module.is_fresh(module_path):
                 try:
-                    module = LoadedModule(imp.load_module(name, fp, pathname, description))
-                finally:
-                    if fp:
-                        fp.close()
-            except Exception as e:
-                print('Unable to build module %s: [%s] %s' % (name, type(e).__name__, e), file=sys.stderr)
-                self.logger.debug(get_backtrace(e))
-            else:
-                m = ModuleInfo(module.name)
-                m.version = self.get_tree_mtime(module_path)
-                m.capabilities = list(set([c.__name__ for c in module.iter_caps()]))
-                m.description = module.description
-                m.maintainer = module.maintainer
-                m.license = module.license
-                m.icon = module.icon or ''
-                self.modules[module.name] = m
-
-        self.update = int(datetime.now().strftime('%Y%m%d%H%M'))
+                    fp, pathname, description = imp.find_module(name, [path])
+                    try:
+                        module = LoadedModule(imp.load_module(name, fp, pathname, description)).manifest
+                    finally:
+                        if fp:
+                            fp.close()
+                except Exception as e:
+                    print('Unable to build module %s: [%s] %s' % (name, type(e).__name__, e), file=sys.stderr)
+                    self.logger.debug(get_backtrace(e))
+                    continue
+
+                if manifests_dir is not None:
+                    try:
+                        module.save(manifest_path)
+                    except (IOError, OSError, TypeError, ValueError) as e:
+                        self.logger.warning('Unable to save manifest of module %s: %s' % (name, e))
+
+            m = ModuleInfo(module.name)
+            m.version = self.get_tree_mtime(module_path)
+            m.capabilities = list(module.get_caps_names())
+            m.description = module.description
+            m.maintainer = module.maintainer
+            m.license = module.license
+            m.icon = module.icon or ''
+            self.modules[module.name] = m
+
+        modules = dict((name, dict(module.dump())) for name, module in self.modules.iteritems())
+        if previous_update and modules == previous_modules and self.key_update == previous_key_update:
+            # Nothing has changed, keep the stamp so clients do not download
+            # the index again.
+            self.update = previous_update
+        else:
+            self.update = max(int(datetime.now().strftime('%Y%m%d%H%M')), previous_update + 1)
+            if deltas and previous_update:
+                self.write_deltas(os.path.dirname(os.path.abspath(filename)), previous_update, previous_modules)
         self.save(filename)
 
+    def write_deltas(self, path, previous_update, previous_modules):
+        """
+        Write deltas between the previous versions of the index and this
+        one, so clients only download what has changed.
+
+        :param path: directory of the index
+        :type path: str
+        :param previous_update: stamp of the previous version of the index
+        :type previous_update: int
+        :param previous_modules: modules of the previous version, as dumps
+        :type previous_modules: dict
+        """
+        deltas_dir = os.path.join(path, self.DELTAS_DIR)
+        if not os.path.isdir(deltas_dir):
+            os.makedirs(deltas_dir)
+
+        changed = set(name for name, module in self.modules.iteritems()
+                      if dict(module.dump()) != previous_modules.get(name))
+        removed = set(previous_modules) - set(self.modules)
+
+        # Deltas since older versions are merged with this one.
+        deltas = {previous_update: (set(), set())}
+        for filename in os.listdir(deltas_dir):
+            if not filename.endswith('.list'):
+                continue
+            config = RawConfigParser()
+            try:
+                config.read(os.path.join(deltas_dir, filename))
+                deltas[int(config.get(DEFAULTSECT, 'since'))] = (set(config.sections()),
+                                                                   set(config.get(DEFAULTSECT, 'removed').split()))
+            except (ConfigParserError, ValueError):
+                pass
+            os.remove(os.path.join(deltas_dir, filename))
+
+        for since in sorted(deltas)[-self.DELTAS_KEPT:]:
+            old_changed, old_removed = deltas[since]
+            self.save_delta(os.path.join(deltas_dir, '%s.list' % since), since,
+                            (old_changed | changed) - removed, (old_removed | removed) - changed)
+
+        # Clients which are up to date only get the header.
+        self.save_delta(os.path.join(deltas_dir, '%s.list' % self.update), self.update, set(), set())
+
+    def save_delta(self, filename, since, changed, removed):
+        """
+        Save a delta from the *since* version of the index.
+        """
+        config = RawConfigParser()
+        config.set(DEFAULTSECT, 'name', self.name)
+        config.set(DEFAULTSECT, 'update', self.update)
+        config.set(DEFAULTSECT, 'maintainer', self.maintainer)
+        config.set(DEFAULTSECT, 'signed', int(self.signed))
+        config.set(DEFAULTSECT, 'key_update', self.key_update)
+        config.set(DEFAULTSECT, 'since', since)
+        config.set(DEFAULTSECT, 'removed', ' '.join(sorted(removed)))
+
+        for name in sorted(changed):
+            module = self.modules[name]
+            config.add_section(name)
+            for key, value in module.dump():
+                config.set(name, key, to_unicode(value).encode('utf-8'))
+
+        with open(filename, 'wb') as f:
+            config.write(f)
+
     @staticmethod
     def get_tree_mtime(path, include_root=False):
         mtime = 0
@@ -307,7 +517,7 @@ class Repository(object):
             mtime = int(datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y%m%d%H%M'))
         for root, dirs, files in os.walk(path):
             for f in files:
-                if f.endswith('.pyc'):
+                if f.endswith('.pyc') or f == ModuleManifest.FILENAME:
                     continue
                 m = int(datetime.fromtimestamp(os.path.getmtime(os.path.join(root, f))).strftime('%Y%m%d%H%M'))
                 mtime = max(mtime, m)
@@ -331,6 +541,10 @@ class Repository(object):
         config.set(DEFAULTSECT, 'key_update', self.key_update)
         if private:
             config.set(DEFAULTSECT, 'url', self.url)
+            if self.etag:
+                config.set(DEFAULTSECT, 'etag', self.etag)
+            if self.last_modified:
+                config.set(DEFAULTSECT, 'last_modified', self.last_modified)
 
         for module in self.modules.itervalues():
             config.add_section(module.name)
@@ -347,6 +561,7 @@ class Versions(object):
     def __init__(self, path):
         self.path = path
         self.versions = {}
+        self.mutex = Lock()
 
         try:
             with open(os.path.join(self.path, self.VERSIONS_LIST), 'r') as fp:
@@ -363,15 +578,19 @@ class Versions(object):
         return self.versions.get(name, None)
 
     def set(self, name, version):
-        self.versions[name] = int(version)
-        self.save()
+        with self.mutex:
+            self.versions[name] = int(version)
+            self.save()
 
     def save(self):
         config = RawConfigParser()
         for name, version in self.versions.iteritems():
             config.set(DEFAULTSECT, name, version)
-        with open(os.path.join(self.path, self.VERSIONS_LIST), 'wb') as fp:
+        # Write in a temporary file to never let an incomplete file.
+        fd, tmpname = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'wb') as fp:
             config.write(fp)
+        os.rename(tmpname, os.path.join(self.path, self.VERSIONS_LIST))
 
 
 class IProgress(object):
@@ -425,18 +644,31 @@ class Repositories(object):
     REPOS_DIR = 'repositories'
     KEYRINGS_DIR = 'keyrings'
     ICONS_DIR = 'icons'
+    # In the working directory, where manifests of modules are saved.
+    MANIFESTS_DIR = 'manifests'
 
     SHARE_DIRS = [MODULES_DIR, REPOS_DIR, KEYRINGS_DIR, ICONS_DIR]
 
+    # In the modules directory, where archives are downloaded.
+    DOWNLOADS_DIR = '.downloads'
+    # Prefix of directories where modules are set up before being moved.
+    STAGING_PREFIX = '.install-'
+    # Number of modules installed at the same time by update().
+    INSTALL_WORKERS = 4
+    CHUNK_SIZE = 64 * 1024
+
     def __init__(self, workdir, datadir, version):
         self.logger = getLogger('repositories')
         self.version = version
 
         self.browser = None
+        # Browsers of threads which install modules.
+        self.local = local()
 
         self.workdir = workdir
         self.datadir = datadir
         self.sources_list = os.path.join(self.workdir, self.SOURCES_LIST)
+        self.manifests_dir = os.path.join(self.workdir, self.MANIFESTS_DIR)
         self.modules_dir = os.path.join(self.datadir, self.MODULES_DIR, self.version)
         self.repos_dir = os.path.join(self.datadir, self.REPOS_DIR)
         self.keyrings_dir = os.path.join(self.datadir, self.KEYRINGS_DIR)
@@ -459,14 +691,27 @@ class Repositories(object):
         else:
             self.load()
 
-    def load_browser(self):
+    def create_browser(self):
         from weboob.browser.browsers import Browser
         from weboob.browser.profiles import Weboob as WeboobProfile
 
         class WeboobBrowser(Browser):
             PROFILE = WeboobProfile(self.version)
+        return WeboobBrowser()
+
+    def load_browser(self):
         if self.browser is None:
-            self.browser = WeboobBrowser()
+            self.browser = self.create_browser()
+
+    def get_browser(self):
+        """
+        Get a browser to use in the current thread, as modules can be
+        installed by several threads.
+        """
+        browser = getattr(self.local, 'browser', None)
+        if browser is None:
+            browser = self.local.browser = self.create_browser()
+        return browser
 
     def create_dir(self, name):
         if not os.path.exists(name):
@@ -474,6 +719,18 @@ class Repositories(object):
         elif not os.path.isdir(name):
             self.logger.error(u'"%s" is not a directory' % name)
 
+    def get_manifests_dir(self, path):
+        """
+        Get the directory where manifests of modules of a directory are
+        saved, outside of this directory so they are not shipped with
+        modules.
+
+        :param path: directory of modules
+        :type path: str
+        :rtype: str
+        """
+        return os.path.join(self.manifests_dir, self.url2filename(os.path.realpath(path)))
+
     def _extend_module_info(self, repo, info):
         if repo.local:
             info.path = repo.localurl2path()
@@ -531,7 +788,6 @@ class Repositories(object):
         """
         Retrieve the icon of a module and save it in ~/.local/share/weboob/icons/.
         """
-        self.load_browser()
         if not isinstance(module, ModuleInfo):
             module = self.get_module_info(module)
 
@@ -548,7 +804,7 @@ class Repositories(object):
                 icon_url = module.url.replace('.tar.gz', '.png')
 
         try:
-            icon = self.browser.open(icon_url)
+            icon = self.get_browser().open(icon_url)
         except BrowserHTTPNotFound:
             pass  # no icon, no problem
         else:
@@ -574,9 +830,10 @@ class Repositories(object):
         :param progress: observer object.
         :type progress: :class:`IProgress`
         """
+        # Previous indexes are used to only download changes.
+        previous = dict((repository.url, repository) for repository in self.repositories)
         self.repositories = []
-        for name in os.listdir(self.repos_dir):
-            os.remove(os.path.join(self.repos_dir, name))
+        saved = set()
 
         gpgv = Keyring.find_gpgv()
         for line in self._parse_source_list():
@@ -587,7 +844,9 @@ class Repositories(object):
             repo_path = os.path.join(self.repos_dir, prio_filename)
             keyring_path = os.path.join(self.keyrings_dir, filename)
             try:
-                repository.retrieve_index(self.browser, repo_path)
+                manifests_dir = self.get_manifests_dir(repository.localurl2path()) if repository.local else None
+                repository.retrieve_index(self.browser, repo_path, previous.get(repository.url), manifests_dir)
+                saved.add(prio_filename)
                 if gpgv:
                     repository.retrieve_keyring(self.browser, keyring_path, progress)
                 else:
@@ -598,6 +857,11 @@ class Repositories(object):
             else:
                 self.repositories.append(repository)
 
+        # Remove indexes of repositories which are not used anymore.
+        for name in os.listdir(self.repos_dir):
+            if name not in saved:
+                os.remove(os.path.join(self.repos_dir, name))
+
     def check_repositories(self):
         """
         Check if sources.list is consistent with repositories
@@ -621,29 +885,184 @@ class Repositories(object):
         :type progress: :class:`IProgress`
         """
         self.update_repositories(progress)
+        self.clean_modules_dir()
 
         to_update = []
         for name, info in self.get_all_modules_info().iteritems():
-            if not info.is_local() and info.is_installed():
+            if not info.is_local() and info.is_installed() and \
+               (info.version > self.versions.get(name) or not os.path.isdir(os.path.join(self.modules_dir, name))):
                 to_update.append(info)
 
         if len(to_update) == 0:
             progress.progress(1.0, 'All modules are up-to-date.')
             return
 
-        class InstallProgress(PrintProgress):
+        for name, error in sorted(self.install_many(to_update, progress).iteritems()):
+            progress.error(u'Unable to install module %s: %s' % (name, error))
+
+    def install_many(self, modules, progress=PrintProgress(), max_workers=None):
+        """
+        Install several modules at the same time.
+
+        Modules are downloaded, checked and set up by a pool of threads,
+        but *progress* is only called from the current thread, with the
+        overall progression.
+
+        :param modules: modules to install
+        :type modules: list[:class:`ModuleInfo`]
+        :param progress: observer object
+        :type progress: :class:`IProgress`
+        :param max_workers: number of modules installed at the same time
+                            (default is :attr:`INSTALL_WORKERS`)
+        :type max_workers: :class:`int`
+        :returns: errors by name of modules which have not been installed
+        :rtype: :class:`dict`
+        """
+        if not modules:
+            return {}
+
+        # Events sent by workers: (index, percent, message), with a None
+        # message when the module is done.
+        events = Queue()
+        errors = {}
+        # Set to not start queued installations.
+        stop = Event()
+
+        class ModuleProgress(IProgress):
             def __init__(self, n):
                 self.n = n
 
             def progress(self, percent, message):
-                progress.progress(float(self.n)/len(to_update) + 1.0/len(to_update)*percent, message)
+                events.put((self.n, percent, message))
 
-        for n, info in enumerate(to_update):
-            inst_progress = InstallProgress(n)
+        def install(n, info):
             try:
-                self.install(info, inst_progress)
+                if stop.is_set():
+                    errors[info.name] = ModuleInstallError('Installation has been interrupted')
+                    return
+                self.install(info, ModuleProgress(n))
             except ModuleInstallError as e:
-                inst_progress.progress(1.0, unicode(e))
+                errors[info.name] = e
+            except Exception as e:
+                self.logger.debug(get_backtrace(e))
+                errors[info.name] = e
+            finally:
+                events.put((n, 1.0, None))
+
+        pool = WorkerPool(max_workers or self.INSTALL_WORKERS, name='install')
+        percents = [0.0] * len(modules)
+        remaining = len(modules)
+        try:
+            for n, info in enumerate(modules):
+                pool.submit(install, n, info)
+
+            while remaining:
+                # A timeout lets KeyboardInterrupt be raised while waiting.
+                n, percent, message = events.get(True, 86400)
+                percents[n] = max(percents[n], percent)
+                if message is None:
+                    remaining -= 1
+                else:
+                    progress.progress(sum(percents) / len(modules), message)
+        finally:
+            stop.set()
+            # If interrupted, do not wait for installations in progress.
+            pool.shutdown(wait=remaining == 0)
+
+        return errors
+
+    def clean_modules_dir(self):
+        """
+        Remove what an interrupted installation has let in the modules
+        directory.
+
+        If a module has been removed but its new version has not been moved
+        yet, the previous version is restored.
+        """
+        for name in os.listdir(self.modules_dir):
+            if not name.startswith(self.STAGING_PREFIX):
+                continue
+            staging = os.path.join(self.modules_dir, name)
+            module_name = name[len(self.STAGING_PREFIX):].rsplit('-', 1)[0]
+            previous = os.path.join(staging, '.previous')
+            module_dir = os.path.join(self.modules_dir, module_name)
+            if os.path.isdir(previous) and not os.path.exists(module_dir):
+                self.logger.warning(u'Restore module %s after an interrupted installation', module_name)
+                os.rename(previous, module_dir)
+            shutil.rmtree(staging, ignore_errors=True)
+
+        downloads_dir = os.path.join(self.modules_dir, self.DOWNLOADS_DIR)
+        if os.path.isdir(downloads_dir):
+            for name in os.listdir(downloads_dir):
+                if name.endswith('.part'):
+                    os.remove(os.path.join(downloads_dir, name))
+
+    def download_module(self, module):
+        """
+        Download the archive of a module in a file.
+
+        The archive is kept if the installation is interrupted, so it is
+        not downloaded again by the next one.
+
+        :type module: :class:`ModuleInfo`
+        :returns: path of the archive
+        :rtype: :class:`str`
+        """
+        downloads_dir = os.path.join(self.modules_dir, self.DOWNLOADS_DIR)
+        self.create_dir(downloads_dir)
+
+        path = os.path.join(downloads_dir, '%s-%s.tar.gz' % (module.name, module.version))
+        if os.path.exists(path):
+            return path
+
+        fd, tmpname = tempfile.mkstemp(dir=downloads_dir, prefix=module.name, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                response = self.get_browser().open(module.url, stream=True)
+                try:
+                    for chunk in response.iter_content(self.CHUNK_SIZE):
+                        fp.write(chunk)
+                finally:
+                    response.close()
+        except BaseException as e:
+            os.remove(tmpname)
+            if isinstance(e, BrowserHTTPError):
+                raise ModuleInstallError('Unable to fetch module: %s' % e)
+            raise
+
+        os.rename(tmpname, path)
+        return path
+
+    def setup_module(self, module, archive):
+        """
+        Extract and compile a module in a staging directory, and then
+        replace the installed version by this one.
+
+        :type module: :class:`ModuleInfo`
+        :param archive: path of the archive of the module
+        :type archive: :class:`str`
+        """
+        import tarfile
+
+        module_dir = os.path.join(self.modules_dir, module.name)
+        staging = tempfile.mkdtemp(dir=self.modules_dir, prefix='%s%s-' % (self.STAGING_PREFIX, module.name))
+        try:
+            try:
+                with closing(tarfile.open(archive, 'r:gz')) as tar:
+                    tar.extractall(staging)
+            except (tarfile.TarError, IOError, EOFError) as e:
+                raise ModuleInstallError('The archive for %s looks invalid: %s' % (module.name, e))
+            new_dir = os.path.join(staging, module.name)
+            if not os.path.isdir(new_dir):
+                raise ModuleInstallError('The archive for %s looks invalid.' % module.name)
+            # Precompile, with paths of the final location.
+            compile_dir(new_dir, ddir=module_dir, quiet=True)
+
+            if os.path.isdir(module_dir):
+                os.rename(module_dir, os.path.join(staging, '.previous'))
+            os.rename(new_dir, module_dir)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
 
     def install(self, module, progress=PrintProgress()):
         """
@@ -654,9 +1073,6 @@ class Repositories(object):
         :param progress: observer object
         :type progress: :class:`IProgress`
         """
-        import tarfile
-        self.load_browser()
-
         if isinstance(module, ModuleInfo):
             info = module
         elif isinstance(module, basestring):
@@ -681,37 +1097,36 @@ class Repositories(object):
         else:
             raise ModuleInstallError('The latest version of %s is already installed' % module.name)
 
-        progress.progress(0.2, 'Downloading module...')
+        progress.progress(0.2, 'Downloading module %s...' % module.name)
+        archive = self.download_module(module)
+
         try:
-            tardata = self.browser.open(module.url).content
-        except BrowserHTTPError as e:
-            raise ModuleInstallError('Unable to fetch module: %s' % e)
-
-        # Check signature
-        if module.signed and Keyring.find_gpgv():
-            progress.progress(0.5, 'Checking module authenticity...')
-            sig_data = self.browser.open(posixpath.join(module.url + '.sig')).content
-            keyring_path = os.path.join(self.keyrings_dir, self.url2filename(module.repo_url))
-            keyring = Keyring(keyring_path)
-            if not keyring.exists():
-                raise ModuleInstallError('No keyring found, please update repos.')
-            if not keyring.is_valid(tardata, sig_data):
-                raise ModuleInstallError('Invalid signature for %s.' % module.name)
-
-        # Extract module from tarball.
-        if os.path.isdir(module_dir):
-            shutil.rmtree(module_dir)
-        progress.progress(0.7, 'Setting up module...')
-        with closing(tarfile.open('', 'r:gz', BytesIO(tardata))) as tar:
-            tar.extractall(self.modules_dir)
-        if not os.path.isdir(module_dir):
-            raise ModuleInstallError('The archive for %s looks invalid.' % module.name)
-        # Precompile
-        compile_dir(module_dir, quiet=True)
+            # Check signature
+            if module.signed and Keyring.find_gpgv():
+                progress.progress(0.5, 'Checking authenticity of module %s...' % module.name)
+                try:
+                    sig_data = self.get_browser().open(posixpath.join(module.url + '.sig')).content
+                except BrowserHTTPError as e:
+                    raise ModuleInstallError('Unable to fetch signature of module: %s' % e)
+                keyring_path = os.path.join(self.keyrings_dir, self.url2filename(module.repo_url))
+                keyring = Keyring(keyring_path)
+                if not keyring.exists():
+                    raise ModuleInstallError('No keyring found, please update repos.')
+                with open(archive, 'rb') as fp:
+                    if not keyring.is_valid(fp, sig_data):
+                        raise ModuleInstallError('Invalid signature for %s.' % module.name)
+
+            progress.progress(0.7, 'Setting up module %s...' % module.name)
+            self.setup_module(module, archive)
+        except ModuleInstallError:
+            # Do not use this archive again.
+            os.remove(archive)
+            raise
 
         self.versions.set(module.name, module.version)
+        os.remove(archive)
 
-        progress.progress(0.9, 'Downloading icon...')
+        progress.progress(0.9, 'Downloading icon of module %s...' % module.name)
         self.retrieve_icon(module)
 
         progress.progress(1.0, 'Module %s has been installed!' % module.name)
@@ -781,7 +1196,7 @@ class Keyring(object):
     def is_valid(self, data, sigdata):
         """
         Check if the data is signed by an accepted key.
-        data and sigdata should be strings.
+        data should be a string or a file, and sigdata a string.
         """
         gpgv = self.find_gpgv()
         from tempfile import NamedTemporaryFile
@@ -793,14 +1208,18 @@ class Keyring(object):
             try:
                 sigfile.write(sigdata)
                 sigfile.flush()  # very important
-                assert isinstance(data, basestring)
+                if isinstance(data, basestring):
+                    stdin, data = subprocess.PIPE, data
+                else:
+                    # gpgv reads the file itself.
+                    stdin, data = data, None
                 # Yes, all of it is necessary
                 proc = subprocess.Popen([gpgv,
                         '--status-fd', '1',
                         '--keyring', os.path.realpath(self.path),
                         os.path.realpath(sigfile.name),
                         '-'],
-                    stdin=subprocess.PIPE,
+                    stdin=stdin,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.PIPE)
                 out, err = proc.communicate(data)
@@ -20,17 +20,25 @@
 
 from __future__ import print_function
 
-from threading import Event, RLock
+import errno
+import heapq
+import os
+import select
+import sys
+from random import uniform
+from threading import Event, RLock, Thread
+from time import time
 try:
     from threading import _Timer as Timer
 except ImportError:
     from threading import Timer
 
+from weboob.core.workers import WorkerPool
 from weboob.tools.log import getLogger
 from weboob.tools.misc import get_backtrace
 
 
-__all__ = ['Scheduler']
+__all__ = ['Scheduler', 'HeapScheduler']
 
 
 class IScheduler(object):
@@ -140,3 +148,312 @@ class Scheduler(IScheduler):
                 # Contrary to _wait_to_stop(), don't call t.join
                 # because want_stop() have to be non-blocking.
             self.queue = {}
+
+
+class Waker(object):
+    """
+    Let a thread sleep until a timeout, or until an other thread wakes it
+    up.
+
+    On Python 2, timed waits of threading objects are loops which wake up
+    every 50 ms at most. This one blocks in select() on a pipe, so a
+    sleeping thread does not use the CPU. On Windows, where select() does
+    not support pipes, it falls back to an event.
+    """
+
+    def __init__(self):
+        self.event = None
+        if sys.platform == 'win32':
+            self.event = Event()
+            return
+
+        import fcntl
+        self.rfd, self.wfd = os.pipe()
+        for fd in (self.rfd, self.wfd):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+            fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+    def wait(self, timeout=None):
+        """
+        Sleep until *timeout* seconds have elapsed or :func:`wake` is
+        called. A call to :func:`wake` made before is not lost.
+
+        :param timeout: None to wait for :func:`wake` only
+        :type timeout: :class:`float`
+        """
+        if self.event is not None:
+            self.event.wait(timeout)
+            self.event.clear()
+            return
+
+        try:
+            select.select([self.rfd], [], [], timeout)
+        except (select.error, OSError) as e:
+            # Interrupted by a signal.
+            if e.args[0] != errno.EINTR:
+                raise
+        try:
+            while os.read(self.rfd, 4096):
+                pass
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def wake(self):
+        """
+        Wake up the sleeping thread.
+        """
+        if self.event is not None:
+            self.event.set()
+            return
+
+        try:
+            os.write(self.wfd, b'x')
+        except OSError as e:
+            # The pipe is full, so the thread is woken up anyway.
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def __del__(self):
+        if self.event is None:
+            os.close(self.rfd)
+            os.close(self.wfd)
+
+
+class ScheduledEvent(object):
+    """
+    Event planned by :class:`HeapScheduler`.
+    """
+
+    def __init__(self, id, interval, function, args, repeat, jitter, missed):
+        self.id = id
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.repeat = repeat
+        self.jitter = jitter
+        self.missed = missed
+        # Time of the next run, without jitter.
+        self.base = None
+        self.cancelled = False
+        self.running = False
+        # A run has been coalesced while the previous one was running.
+        self.pending = False
+
+
+class HeapScheduler(IScheduler):
+    """
+    Scheduler which uses only one thread to wait for events, whatever their
+    number is.
+
+    Deadlines are kept in a heap, and the dispatcher thread sleeps until the
+    earliest one, in a :class:`Waker`, so it does not wake up while there is
+    nothing to do. Due functions are run in a pool of workers.
+
+    When a repeated function can't be run on time, because the previous run
+    is not finished yet or because workers are all busy, *missed* decides
+    what to do:
+
+    * ``'coalesce'``: missed runs are merged into one run, done as soon as
+      possible;
+    * ``'skip'``: missed runs are dropped, and the function is run again at
+      the next planned time.
+
+    >>> scheduler = HeapScheduler(max_workers=1)
+    >>> done = Event()
+    >>> scheduler.schedule(0.01, done.set)
+    1
+    >>> done.wait(5)
+    True
+    >>> scheduler.want_stop()
+
+    :param workers: pool in which functions are run; by default, a pool of
+                    *max_workers* workers is created
+    :type workers: :class:`weboob.core.workers.WorkerPool`
+    :param max_workers: number of workers of the created pool
+    :type max_workers: :class:`int`
+    :param jitter: default maximum number of seconds randomly added to each
+                   planned time, to spread runs
+    :type jitter: :class:`float`
+    :param missed: default policy for missed runs ('coalesce' or 'skip')
+    :type missed: :class:`str`
+    """
+
+    MISSED_POLICIES = ('coalesce', 'skip')
+
+    def __init__(self, workers=None, max_workers=4, jitter=0, missed='coalesce'):
+        assert missed in self.MISSED_POLICIES
+        self.logger = getLogger('scheduler')
+        self.own_workers = workers is None
+        if workers is None:
+            workers = WorkerPool(max_workers, name='scheduler')
+        self.workers = workers
+        self.jitter = jitter
+        self.missed = missed
+        self.mutex = RLock()
+        self.stop_event = Event()
+        # Wake up the dispatcher, and the thread waiting in run().
+        self.waker = Waker()
+        self.stopper = Waker()
+        self.count = 0
+        self.events = {}
+        self.heap = []
+        self.dispatcher = None
+
+    def schedule(self, interval, function, *args, **kwargs):
+        """
+        Call a function once, after *interval* seconds.
+
+        :param jitter: override the default jitter of scheduler
+        :type jitter: :class:`float`
+        :returns: identifier of event, to give to :func:`cancel`
+        """
+        return self._schedule(False, interval, function, args, **kwargs)
+
+    def repeat(self, interval, function, *args, **kwargs):
+        """
+        Call a function now, and then every *interval* seconds.
+
+        :param interval: number of seconds between runs, which must be
+                         positive
+        :type interval: :class:`float`
+
+        :param jitter: override the default jitter of scheduler
+        :type jitter: :class:`float`
+        :param missed: override the default policy for missed runs
+        :type missed: :class:`str`
+        :returns: identifier of event, to give to :func:`cancel`
+        """
+        return self._schedule(True, interval, function, args, **kwargs)
+
+    def _schedule(self, repeat, interval, function, args, jitter=None, missed=None):
+        if self.stop_event.isSet():
+            return
+
+        if missed is None:
+            missed = self.missed
+        assert missed in self.MISSED_POLICIES
+        if repeat and not interval > 0:
+            raise ValueError(u'Interval of a repeated function must be positive, not %r' % interval)
+
+        with self.mutex:
+            self.count += 1
+            event = ScheduledEvent(self.count, interval, function, args, repeat,
+                                   self.jitter if jitter is None else jitter, missed)
+            self.events[event.id] = event
+            self.logger.debug('function "%s" will be called in %s seconds' % (function.__name__, 0 if repeat else interval))
+            self._push(event, time() + (0 if repeat else interval))
+
+            if self.dispatcher is None:
+                self.dispatcher = Thread(target=self._dispatcher_run, name='scheduler')
+                self.dispatcher.daemon = True
+                self.dispatcher.start()
+            return event.id
+
+    def _push(self, event, base):
+        event.base = base
+        deadline = base
+        if event.jitter:
+            deadline += uniform(0, event.jitter)
+        # Wake up the dispatcher only if it sleeps too long.
+        if not self.heap or deadline < self.heap[0][0]:
+            self.waker.wake()
+        heapq.heappush(self.heap, (deadline, event.id, event))
+
+    def _dispatcher_run(self):
+        while True:
+            with self.mutex:
+                if self.stop_event.isSet():
+                    return
+
+                # Time to sleep, None until an event is added.
+                timeout = None
+                now = time()
+                while self.heap:
+                    deadline, _, event = self.heap[0]
+                    if deadline > now:
+                        timeout = deadline - now
+                        break
+
+                    heapq.heappop(self.heap)
+                    if not event.cancelled:
+                        self._dispatch(event, now)
+
+            self.waker.wait(timeout)
+
+    def _dispatch(self, event, now):
+        if not event.repeat:
+            self.events.pop(event.id, None)
+            self.workers.submit(self._run_event, event)
+            return
+
+        # Plan the next run on the grid of planned times.
+        late = now - event.base
+        missed_runs = int(late // event.interval) if event.interval > 0 else 0
+        self._push(event, event.base + (missed_runs + 1) * event.interval)
+
+        if event.running:
+            if event.missed == 'coalesce' and not event.pending:
+                self.logger.debug('function "%s" is still running, its next run is coalesced' % event.function.__name__)
+                event.pending = True
+            return
+        if missed_runs and event.missed == 'skip':
+            self.logger.debug('function "%s" is late, skip %d run(s)' % (event.function.__name__, missed_runs))
+            return
+
+        event.running = True
+        self.workers.submit(self._run_event, event)
+
+    def _run_event(self, event):
+        while True:
+            try:
+                event.function(*event.args)
+            except Exception:
+                # do not stop repeating because of an exception
+                self.logger.error(u'Error in scheduled function "%s":\n%s', event.function.__name__, get_backtrace())
+
+            with self.mutex:
+                if not event.pending or event.cancelled or self.stop_event.isSet():
+                    event.running = False
+                    event.pending = False
+                    return
+                event.pending = False
+
+    def cancel(self, ev):
+        with self.mutex:
+            try:
+                event = self.events.pop(ev)
+            except KeyError:
+                return False
+            # The event is removed from the heap when it is reached.
+            event.cancelled = True
+            self.logger.debug('scheduled function "%s" is canceled' % event.function.__name__)
+            return True
+
+    def run(self):
+        try:
+            while not self.stop_event.isSet():
+                self.stopper.wait()
+        except KeyboardInterrupt:
+            self._wait_to_stop()
+            raise
+        else:
+            self._wait_to_stop()
+        return True
+
+    def _wait_to_stop(self):
+        self.want_stop()
+        if self.dispatcher is not None:
+            self.dispatcher.join()
+        if self.own_workers:
+            self.workers.shutdown(wait=True)
+
+    def want_stop(self):
+        self.stop_event.set()
+        with self.mutex:
+            for event in self.events.itervalues():
+                event.cancelled = True
+            self.events = {}
+            self.heap = []
+        self.waker.wake()
+        self.stopper.wake()
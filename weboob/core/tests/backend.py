@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Lock, Thread
+from time import sleep
+from unittest import TestCase
+
+from weboob.browser import Browser
+from weboob.capabilities.bank import CapBank
+from weboob.core.ouiboube import WebNip
+from weboob.tools.backend import Module
+
+
+class MyModule(Module, CapBank):
+    NAME = 'test'
+    BROWSER = Browser
+    PARALLEL_CALLS = 3
+    PARALLEL_METHODS = ('read', 'read_nested')
+
+    def __init__(self, *args, **kwargs):
+        super(MyModule, self).__init__(*args, **kwargs)
+        self.mutex = Lock()
+        self.active = []
+        self.events = []
+
+    def create_default_browser(self):
+        # Let concurrent calls race to create the main browser.
+        sleep(0.05)
+        return super(MyModule, self).create_default_browser()
+
+    def _run(self, method, delay):
+        with self.mutex:
+            self.active.append(method)
+            self.events.append(list(self.active))
+        browser = self.browser
+        sleep(delay)
+        with self.mutex:
+            self.active.remove(method)
+        return browser
+
+    def read(self, delay=0.1):
+        return self._run('read', delay)
+
+    def write(self, delay=0.1):
+        return self._run('write', delay)
+
+    def read_nested(self, method):
+        sleep(0.1)
+        # Call made in an other thread, as fillobj() of applications.
+        results = list(self.weboob.do(method, 0.05, backends=[self]))
+        # Exclusive call in the same thread.
+        with self:
+            results.append(self._run('write', 0.05))
+        return results
+
+
+# Class that tests concurrent calls on a backend
+class ParallelCallsTest(TestCase):
+
+    def setUp(self):
+        self.weboob = WebNip(modules_path=False)
+        self.backend = MyModule(self.weboob, 'test')
+        self.results = []
+
+    def tearDown(self):
+        self.weboob.deinit()
+
+    def call(self, method, *args):
+        def run():
+            with self.backend.lock_for(method):
+                self.results.append(getattr(self.backend, method)(*args))
+        thread = Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def test_is_parallel(self):
+        self.assertTrue(self.backend.is_parallel('read'))
+        self.assertFalse(self.backend.is_parallel('write'))
+        self.assertIs(self.backend.lock_for('write'), self.backend)
+
+        MyModule.PARALLEL_METHODS = None
+        try:
+            # Idempotent methods of capabilities.
+            self.assertTrue(self.backend.is_parallel('iter_accounts'))
+            self.assertFalse(self.backend.is_parallel('transfer'))
+        finally:
+            MyModule.PARALLEL_METHODS = ('read', 'read_nested')
+
+    def test_parallel(self):
+        for thread in [self.call('read') for i in xrange(3)]:
+            thread.join()
+
+        self.assertEqual(max(len(active) for active in self.backend.events), 3)
+        self.assertEqual(len(set(self.results)), 3)
+        # Clones share cookies of the main browser, even if they have been
+        # created while it was created.
+        self.assertIn(self.backend._browser, self.results)
+        self.assertEqual(len(set(id(browser.session.cookies) for browser in self.results)), 1)
+
+    def test_exclusive(self):
+        threads = [self.call('read', 0.2), self.call('read', 0.2)]
+        sleep(0.05)
+        threads.append(self.call('write'))
+        sleep(0.05)
+        # Waits for the write, which waits for the first reads.
+        threads.append(self.call('read'))
+        for thread in threads:
+            thread.join()
+
+        self.assertIn(['write'], self.backend.events)
+        self.assertTrue(all(len(active) == 1 for active in self.backend.events if 'write' in active))
+        self.assertEqual([active[-1] for active in self.backend.events], ['read', 'read', 'write', 'read'])
+
+    def test_nested(self):
+        for method in ('read', 'write'):
+            self.backend.events = []
+            results = []
+            outer = Thread(target=lambda: results.extend(self.weboob.do('read_nested', method, backends=[self.backend])))
+            outer.daemon = True
+            outer.start()
+            sleep(0.05)
+            # Waits for the call to read_nested, but not for its own calls.
+            writer = self.call('write')
+            outer.join(5)
+            writer.join(5)
+            self.assertFalse(outer.is_alive() or writer.is_alive())
+
+            self.assertEqual(len(results), 2)
+            self.assertEqual([active[-1] for active in self.backend.events], [method, 'write', 'write'])
+            # The last write has waited for the end of read_nested.
+            self.assertEqual(self.backend.events[-1], ['write'])
+
+    def test_deinit(self):
+        thread = self.call('read', 0.2)
+        sleep(0.05)
+        with self.backend:
+            self.assertEqual(self.backend.active, [])
+        thread.join()
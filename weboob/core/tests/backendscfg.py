@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import stat
+import tempfile
+from unittest import TestCase
+
+from weboob.core.backendscfg import BackendsConfig, BackendAlreadyExists
+
+
+class Unwritable(object):
+    def __str__(self):
+        raise ValueError('unable to write this value')
+
+
+class BrokenParams(dict):
+    def iteritems(self):
+        yield 'login', 'john'
+        raise ValueError('broken')
+
+
+# Class that tests the file of configured backends
+class BackendsConfigTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='weboob_test_')
+        self.path = os.path.join(self.tmpdir, 'backends')
+        self.config = BackendsConfig(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get_names(self, config=None):
+        return sorted(name for name, module, params in (config or self.config).iter_backends())
+
+    def read_file(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def test_add(self):
+        self.config.add_backend('a', 'module', {'login': u'jöhn'})
+        self.assertRaises(BackendAlreadyExists, self.config.add_backend, 'a', 'module', {})
+        self.assertEqual(self.config.get_backend('a'), ('module', {'login': u'jöhn'.encode('utf-8')}))
+
+        self.config.edit_backend('a', 'module', {'password': 'secret'})
+        self.assertEqual(BackendsConfig(self.path).get_backend('a')[1],
+                         {'login': u'jöhn'.encode('utf-8'), 'password': 'secret'})
+        self.assertTrue(self.config.remove_backend('a'))
+        self.assertFalse(self.config.remove_backend('a'))
+        self.assertEqual(self.get_names(BackendsConfig(self.path)), [])
+
+    def test_atomic_write(self):
+        self.config.add_backend('a', 'module', {})
+        inode = os.stat(self.path).st_ino
+        self.config.add_backend('b', 'module', {})
+
+        # The file has been replaced by a complete new one.
+        self.assertNotEqual(os.stat(self.path).st_ino, inode)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertEqual(os.listdir(self.tmpdir), ['backends'])
+
+    def test_changed_file(self):
+        self.config.add_backend('a', 'module', {})
+        self.assertEqual(self.get_names(), ['a'])
+
+        # An other process edits the file.
+        BackendsConfig(self.path).add_backend('b', 'module', {})
+        self.assertEqual(self.get_names(), ['a', 'b'])
+
+    def test_batch(self):
+        self.config.add_backend('a', 'module', {})
+        content = self.read_file()
+        with self.config.batch():
+            for name in ('b', 'c'):
+                self.config.add_backend(name, 'module', {})
+            self.assertEqual(self.read_file(), content)
+            self.assertEqual(self.get_names(), ['a', 'b', 'c'])
+        self.assertEqual(self.get_names(BackendsConfig(self.path)), ['a', 'b', 'c'])
+
+        with self.assertRaises(ValueError):
+            with self.config.batch():
+                self.config.add_backend('d', 'module', {})
+                raise ValueError()
+        self.assertEqual(self.get_names(), ['a', 'b', 'c'])
+
+    def test_failed_write(self):
+        self.config.add_backend('a', 'module', {})
+        self.assertRaises(ValueError, self.config.add_backend, 'b', 'module', {'login': Unwritable()})
+
+        # Edits which have not been written are dropped.
+        self.assertFalse(self.config.backend_exists('b'))
+        self.assertEqual(self.get_names(), ['a'])
+        self.assertEqual(os.listdir(self.tmpdir), ['backends'])
+
+        with self.assertRaises(ValueError):
+            with self.config.batch():
+                self.config.add_backend('c', 'module', {'login': Unwritable()})
+        self.assertEqual(self.get_names(), ['a'])
+
+    def test_failed_edit(self):
+        self.config.add_backend('a', 'module', {'login': 'jane'})
+        self.assertRaises(ValueError, self.config.edit_backend, 'a', 'module', BrokenParams())
+        self.assertEqual(self.config.get_backend('a')[1], {'login': 'jane'})
+
+        with self.config.batch():
+            self.config.add_backend('b', 'module', {})
+            self.assertRaises(ValueError, self.config.edit_backend, 'a', 'module', BrokenParams())
+            self.assertRaises(ValueError, self.config.add_backend, 'c', 'module', BrokenParams())
+        self.assertEqual(self.get_names(BackendsConfig(self.path)), ['a', 'b'])
+        self.assertEqual(self.config.get_backend('a')[1], {'login': 'jane'})
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import signal
+import tempfile
+from threading import Event, Lock, Timer
+from time import sleep, time
+from unittest import TestCase
+
+from weboob.core.bcall import CallErrors, ProcessBackendsCall, ProcessCallError
+from weboob.core.health import BackendsHealth
+from weboob.core.ouiboube import WebNip
+from weboob.exceptions import BackendUnhealthy, BrowserUnavailable, CallTimeout
+from weboob.tools.backend import Module
+
+
+class MyModule(Module):
+    NAME = 'test'
+
+    calls = []
+    closed = []
+    calls_lock = Lock()
+
+    def _called(self, method):
+        with self.calls_lock:
+            self.calls.append((self.name, method))
+
+    def sleep(self, seconds):
+        self._called('sleep')
+        sleep(seconds)
+        return self.name
+
+    def iter_items(self, count, delay=0):
+        self._called('iter_items')
+        try:
+            for i in xrange(count):
+                if delay:
+                    sleep(delay)
+                yield u'%s-%d' % (self.name, i)
+        finally:
+            with self.calls_lock:
+                self.closed.append(self.name)
+
+    def get_pid(self):
+        return os.getpid()
+
+    def count(self):
+        self.counter = getattr(self, 'counter', 0) + 1
+        return self.counter
+
+    def unavailable(self):
+        self._called('unavailable')
+        raise BrowserUnavailable()
+
+    def die(self):
+        os._exit(1)
+
+
+class MoreResults(Exception):
+    pass
+
+
+# Class that tests jobs of BackendsCall
+class BackendsCallTest(TestCase):
+
+    def setUp(self):
+        MyModule.calls = []
+        MyModule.closed = []
+        self.weboob = WebNip(modules_path=False, max_workers=2)
+        self.backends = [MyModule(self.weboob, 'backend%d' % i) for i in xrange(6)]
+
+    def tearDown(self):
+        self.weboob.deinit()
+
+    def test_queued_after_deadline(self):
+        call = self.weboob.do('sleep', 0.3, backends=self.backends, timeout=0.1)
+        with self.assertRaises(CallErrors) as cm:
+            list(call)
+        self.weboob.workers.join()
+
+        # Jobs which have waited for a free worker until the deadline do
+        # not call their backend.
+        self.assertEqual(len(MyModule.calls), 2)
+        self.assertEqual(sorted(backend.name for backend in cm.exception.timeouts),
+                         [backend.name for backend in self.backends])
+        self.assertEqual(len(call.errors), 6)
+        self.assertTrue(all(isinstance(error, CallTimeout) for backend, error, bt in call.errors))
+
+    def test_deadline_health(self):
+        self.weboob.health = BackendsHealth(threshold=1)
+        with self.assertRaises(CallErrors):
+            list(self.weboob.do('sleep', 0.3, backends=self.backends[:2], timeout=0.1))
+        self.weboob.workers.join()
+
+        # The deadline of the caller is not a failure of websites.
+        for backend in self.backends[:2]:
+            self.assertEqual(self.weboob.health.get_state(backend.name)['failures'], 0)
+        self.assertEqual(sorted(self.weboob.do('sleep', 0, backends=self.backends[:2])), ['backend0', 'backend1'])
+
+    def test_health(self):
+        # The circuit breaker is disabled by default.
+        for i in xrange(6):
+            self.assertRaises(CallErrors, self.weboob.do('unavailable', backends=self.backends[:1]).wait)
+        self.assertEqual(len(MyModule.calls), 6)
+
+        tmpdir = tempfile.mkdtemp(prefix='weboob_test_')
+        try:
+            path = os.path.join(tmpdir, 'health.storage')
+            self.weboob.health = BackendsHealth(threshold=1, path=path)
+            self.assertRaises(CallErrors, self.weboob.do('unavailable', backends=self.backends[:1]).wait)
+            with self.assertRaises(CallErrors) as cm:
+                self.weboob.do('unavailable', backends=self.backends[:1]).wait()
+            self.assertIsInstance(cm.exception.errors[0][1], BackendUnhealthy)
+            self.assertEqual(len(MyModule.calls), 7)
+
+            # States are kept in the dedicated file.
+            self.assertEqual(BackendsHealth(path=path).get_state('backend0')['state'], BackendsHealth.OPEN)
+            self.assertEqual(BackendsHealth(path=path).get_state('backend1')['state'], BackendsHealth.CLOSED)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def interrupt(self, delay):
+        timer = Timer(delay, os.kill, (os.getpid(), signal.SIGINT))
+        timer.start()
+        return timer
+
+    def test_interrupt(self):
+        # Ctrl-C stops the consumer of a call without deadline.
+        start = time()
+        self.interrupt(0.2)
+        with self.assertRaises(KeyboardInterrupt):
+            list(self.weboob.do('sleep', 2, backends=self.backends[:1]))
+        self.assertLess(time() - start, 1)
+
+        start = time()
+        self.interrupt(0.2)
+        with self.assertRaises(KeyboardInterrupt):
+            self.weboob.do('sleep', 2, backends=self.backends[:1]).wait()
+        self.assertLess(time() - start, 1)
+
+    def test_deinit(self):
+        start = time()
+        with self.assertRaises(CallErrors):
+            list(self.weboob.do('sleep', 1, backends=self.backends[:1], timeout=0.1))
+        # The late backend does not block the exit.
+        self.weboob.deinit()
+        self.assertLess(time() - start, 0.5)
+
+    def test_max_results(self):
+        start = time()
+        call = self.weboob.do('iter_items', 100, 0.01, backends=self.backends[:3], max_results=5,
+                              more_results_error=MoreResults)
+        results = []
+        with self.assertRaises(CallErrors):
+            for result in call:
+                results.append(result)
+        self.weboob.workers.join()
+
+        self.assertEqual(len(results), 5)
+        self.assertLess(time() - start, 0.5)
+        # Running backends have been stopped, the queued one has not been
+        # called, and they are all reported as having more results.
+        self.assertEqual(sorted(MyModule.closed), ['backend0', 'backend1'])
+        self.assertEqual(sorted(backend.name for backend, error, bt in call.errors if isinstance(error, MoreResults)),
+                         ['backend0', 'backend1', 'backend2'])
+
+    def test_max_results_queued(self):
+        results = list(self.weboob.do('iter_items', 100, 0.01, backends=self.backends, max_results=1))
+        self.weboob.workers.join()
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(len(MyModule.calls), 2)
+
+    def test_stop_iterating(self):
+        call = self.weboob.do('iter_items', 100, 0.01, backends=self.backends[:2])
+        for result in call:
+            break
+        self.weboob.workers.join()
+
+        self.assertTrue(call.context.cancelled)
+        self.assertEqual(sorted(MyModule.closed), ['backend0', 'backend1'])
+        self.assertEqual(call.errors, [])
+
+    def test_cancel(self):
+        call = self.weboob.do('iter_items', 100, 0.01, backends=self.backends)
+        results = []
+        for result in call:
+            results.append(result)
+            call.cancel()
+        self.weboob.workers.join()
+
+        self.assertLess(len(results), 10)
+        self.assertEqual(len(MyModule.calls), 2)
+        self.assertEqual(sorted(MyModule.closed), ['backend0', 'backend1'])
+
+    def test_paused_backends(self):
+        call = self.weboob.do('iter_items', 20, backends=self.backends[:2], max_pending=1)
+        results = []
+        for result in call:
+            # Backends paused by max_pending do not keep workers from
+            # running the nested call.
+            results.extend(self.weboob.do('sleep', 0, backends=self.backends[2:4], timeout=5))
+        self.weboob.workers.join()
+
+        self.assertEqual(len(results), 40 * 2)
+        self.assertLessEqual(self.weboob.workers.stats()['workers'], 2)
+
+    def test_fetch_ready(self):
+        call = self.weboob.do('iter_items', 10, backends=self.backends[:3])
+        ready = Event()
+        call.set_notifier(ready.set)
+        results = []
+        while not call.done:
+            self.assertTrue(ready.wait(5))
+            ready.clear()
+            fetched = call.fetch_ready(4)
+            self.assertLessEqual(len(fetched), 4)
+            results.extend(fetched)
+            if len(fetched) == 4:
+                ready.set()
+        call.check_errors()
+
+        self.assertEqual(len(results), 30)
+
+
+# Class that tests calls made in child processes
+class ProcessBackendsCallTest(TestCase):
+
+    def setUp(self):
+        self.weboob = WebNip(modules_path=False, max_workers=2)
+        self.backends = [MyModule(self.weboob, 'backend%d' % i) for i in xrange(2)]
+
+    def tearDown(self):
+        self.weboob.deinit()
+
+    def do(self, function, *args, **kwargs):
+        return self.weboob.do(function, backends=self.backends, executor='process', *args, **kwargs)
+
+    def test_results(self):
+        self.assertEqual(sorted(self.do('iter_items', 3)),
+                         sorted(u'backend%d-%d' % (i, j) for i in xrange(2) for j in xrange(3)))
+        pids = list(self.do('get_pid'))
+        self.assertEqual(len(set(pids)), 2)
+        self.assertNotIn(os.getpid(), pids)
+
+    def test_state(self):
+        # Worker processes are kept, with their copy of the backend.
+        pids = sorted(self.do('get_pid'))
+        self.assertEqual(sorted(self.do('count')), [1, 1])
+        self.assertEqual(sorted(self.do('count')), [2, 2])
+        self.assertEqual(sorted(self.do('get_pid')), pids)
+        self.assertFalse(hasattr(self.backends[0], 'counter'))
+
+    def test_died(self):
+        with self.assertRaises(CallErrors) as cm:
+            list(self.do('die'))
+        self.assertTrue(all(isinstance(error, ProcessCallError) for backend, error, bt in cm.exception))
+        # New processes are forked.
+        self.assertEqual(sorted(self.do('count')), [1, 1])
+
+    def test_hang(self):
+        timeout = ProcessBackendsCall.SUPERVISION_TIMEOUT
+        ProcessBackendsCall.SUPERVISION_TIMEOUT = 0.3
+        try:
+            start = time()
+            with self.assertRaises(CallErrors) as cm:
+                list(self.do('sleep', 60))
+            self.assertLess(time() - start, 2)
+        finally:
+            ProcessBackendsCall.SUPERVISION_TIMEOUT = timeout
+        self.assertEqual(len(cm.exception.errors), 2)
+        self.assertTrue(all(isinstance(error, ProcessCallError) for backend, error, bt in cm.exception))
+        self.assertEqual(sorted(self.do('sleep', 0)), ['backend0', 'backend1'])
+
+    def test_deadline(self):
+        start = time()
+        with self.assertRaises(CallErrors) as cm:
+            list(self.do('sleep', 5, timeout=0.2))
+        self.assertEqual(len(cm.exception.timeouts), 2)
+        self.weboob.workers.join()
+        self.assertLess(time() - start, 1)
+
+    def test_cancel(self):
+        start = time()
+        call = self.do('iter_items', 100, 0.05)
+        for result in call:
+            break
+        # Children are terminated, there is no error.
+        self.weboob.workers.join()
+        self.assertLess(time() - start, 1)
+        self.assertEqual(call.errors, [])
+
+    def test_deadline_health(self):
+        self.weboob.health = BackendsHealth(threshold=1)
+        with self.assertRaises(CallErrors):
+            list(self.do('sleep', 0.3, timeout=0.1))
+        self.weboob.workers.join()
+
+        # The deadline of the caller is not a failure of websites.
+        for backend in self.backends:
+            self.assertEqual(self.weboob.health.get_state(backend.name)['failures'], 0)
+        self.assertEqual(sorted(self.do('sleep', 0)), ['backend0', 'backend1'])
+
+    def test_max_results(self):
+        start = time()
+        results = list(self.do('iter_items', 100, 0.05, max_results=3))
+        self.weboob.workers.join()
+        self.assertEqual(len(results), 3)
+        self.assertLess(time() - start, 1)
+
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from threading import Lock, Thread
+from time import sleep
+from unittest import TestCase
+
+from weboob.capabilities.base import BaseObject
+from weboob.core.cache import ResultsCache, SingleFlight, freeze, make_key
+from weboob.core.ouiboube import WebNip
+from weboob.tools.backend import Module
+
+
+class Snapshotted(object):
+    frozen = 0
+
+    def __getstate__(self):
+        Snapshotted.frozen += 1
+        return {}
+
+
+class MyModule(Module):
+    NAME = 'test'
+    CACHE_TTL = {'get_cached': 60, 'get_shared': 0, 'get_object': 0, 'get_lock': 60}
+
+    calls = 0
+
+    def get_cached(self, value):
+        MyModule.calls += 1
+        return [BaseObject(u'%s-%d' % (value, i)) for i in xrange(3)]
+
+    def get_shared(self, delay):
+        MyModule.calls += 1
+        sleep(delay)
+        return os.getpid()
+
+    def get_object(self):
+        return Snapshotted()
+
+    def get_lock(self):
+        MyModule.calls += 1
+        return Lock()
+
+
+# Class that tests cache of results of calls
+class ResultsCacheTest(TestCase):
+
+    def setUp(self):
+        self.backend = MyModule(None, 'backend')
+        self.other = MyModule(None, 'other')
+        self.cache = ResultsCache()
+
+    def test_make_key(self):
+        self.assertEqual(make_key(self.backend, 'get_cached', (1,), {'a': 1, 'b': 2}),
+                         make_key(self.backend, 'get_cached', (1,), {'b': 2, 'a': 1}))
+        self.assertNotEqual(make_key(self.backend, 'get_cached', (1,), {}),
+                            make_key(self.other, 'get_cached', (1,), {}))
+        self.assertNotEqual(make_key(self.backend, 'get_cached', (1,), {}),
+                            make_key(self.backend, 'get_cached', (2,), {}))
+        # Objects are identified by their full ID.
+        self.assertEqual(make_key(self.backend, 'get_cached', (BaseObject(u'1', backend='backend'),), {}),
+                         make_key(self.backend, 'get_cached', (BaseObject(u'1', backend='backend'),), {}))
+        self.assertNotEqual(make_key(self.backend, 'get_cached', (BaseObject(u'1', backend='backend'),), {}),
+                            make_key(self.backend, 'get_cached', (BaseObject(u'1', backend='other'),), {}))
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get(self.backend, 'get_cached', (1,), {}))
+        results = [BaseObject(u'1'), BaseObject(u'2')]
+        self.cache.set(self.backend, 'get_cached', (1,), {}, [freeze(result) for result in results], 60)
+
+        cached = self.cache.get(self.backend, 'get_cached', (1,), {})
+        self.assertEqual([obj.id for obj in cached], [u'1', u'2'])
+        # Every hit gets new objects.
+        self.assertIsNot(cached[0], results[0])
+        self.assertIsNot(self.cache.get(self.backend, 'get_cached', (1,), {})[0], cached[0])
+        self.assertIsNone(self.cache.get(self.backend, 'get_cached', (2,), {}))
+        self.assertEqual(self.cache.stats(), {'hits': 2, 'misses': 2})
+
+    def test_expiry(self):
+        self.cache.set(self.backend, 'get_cached', (), {}, [freeze(1)], 0.05)
+        self.assertEqual(self.cache.get(self.backend, 'get_cached', (), {}), [1])
+        sleep(0.1)
+        self.assertIsNone(self.cache.get(self.backend, 'get_cached', (), {}))
+
+    def test_invalidate(self):
+        for backend in (self.backend, self.other):
+            for method in ('get_cached', 'get_shared'):
+                self.cache.set(backend, method, (), {}, [freeze(1)], 60)
+
+        self.cache.invalidate('backend', 'get_cached')
+        self.assertIsNone(self.cache.get(self.backend, 'get_cached', (), {}))
+        self.assertIsNotNone(self.cache.get(self.backend, 'get_shared', (), {}))
+        self.cache.invalidate('backend')
+        self.assertIsNone(self.cache.get(self.backend, 'get_shared', (), {}))
+        self.assertIsNotNone(self.cache.get(self.other, 'get_cached', (), {}))
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.get(self.other, 'get_cached', (), {}))
+
+
+# Class that tests sharing of results of identical concurrent calls
+class SingleFlightTest(TestCase):
+
+    def setUp(self):
+        self.backend = MyModule(None, 'backend')
+        self.flights = SingleFlight()
+
+    def test_take_off(self):
+        flight, leader = self.flights.take_off(self.backend, 'get_shared', (), {})
+        self.assertTrue(leader)
+        follower, leader = self.flights.take_off(self.backend, 'get_shared', (), {})
+        self.assertIs(follower, flight)
+        self.assertFalse(leader)
+        self.assertEqual(self.flights.stats(), {'in_flight': 1, 'coalesced': 1})
+
+        self.flights.land(flight, [freeze(1)])
+        self.assertTrue(follower.landed.is_set())
+        self.assertEqual(follower.unfreeze(), [1])
+        # The next call is a new flight.
+        self.assertTrue(self.flights.take_off(self.backend, 'get_shared', (), {})[1])
+
+    def test_error(self):
+        flight, leader = self.flights.take_off(self.backend, 'get_shared', (), {})
+        error = (ValueError('broken'), '')
+        self.flights.land(flight, None, error)
+        self.assertIs(flight.error, error)
+        self.assertIsNone(flight.results)
+
+
+# Class that tests calls using the cache and shared results
+class CachedCallsTest(TestCase):
+
+    def setUp(self):
+        MyModule.calls = 0
+        Snapshotted.frozen = 0
+        self.weboob = WebNip(modules_path=False, results_cache=ResultsCache())
+        self.backend = MyModule(self.weboob, 'backend')
+
+    def tearDown(self):
+        self.weboob.deinit()
+
+    def do(self, function, *args, **kwargs):
+        return list(self.weboob.do(function, backends=[self.backend], *args, **kwargs))
+
+    def test_cached(self):
+        first = self.do('get_cached', u'a')
+        second = self.do('get_cached', u'a')
+        self.assertEqual(MyModule.calls, 1)
+        self.assertEqual([obj.id for obj in second], [obj.id for obj in first])
+        self.assertEqual(set(obj.backend for obj in second), set(['backend']))
+
+        self.do('get_cached', u'b')
+        self.do('get_cached', u'a', use_cache=False)
+        self.assertEqual(MyModule.calls, 3)
+
+    def test_not_cached(self):
+        self.do('get_shared', 0)
+        self.do('get_shared', 0)
+        self.assertEqual(MyModule.calls, 2)
+
+    def test_not_frozen(self):
+        # Results are not frozen if nobody needs a copy.
+        self.assertEqual(len(self.do('get_object')), 1)
+        self.assertEqual(Snapshotted.frozen, 0)
+        self.weboob.results_cache = None
+        self.assertEqual(len(self.do('get_cached', u'a')), 3)
+        self.assertEqual(Snapshotted.frozen, 0)
+
+    def test_not_picklable(self):
+        self.assertEqual(len(self.do('get_lock')), 1)
+        self.assertEqual(len(self.do('get_lock')), 1)
+        self.assertEqual(MyModule.calls, 2)
+
+    def coalesce(self, executor):
+        results = []
+
+        def run():
+            results.extend(self.do('get_shared', 0.3, executor=executor))
+        threads = [Thread(target=run) for i in xrange(2)]
+        for thread in threads:
+            thread.start()
+            sleep(0.05)
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_coalesced(self):
+        results = self.coalesce('thread')
+        self.assertEqual(results, [os.getpid()] * 2)
+        self.assertEqual(MyModule.calls, 1)
+        self.assertEqual(self.weboob.flights.stats()['coalesced'], 1)
+
+    def test_coalesced_process(self):
+        results = self.coalesce('process')
+        # The follower got results of the child process of the leader.
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(set(results)), 1)
+        self.assertNotEqual(results[0], os.getpid())
+        self.assertEqual(self.weboob.flights.stats()['coalesced'], 1)
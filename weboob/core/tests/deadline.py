@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from threading import Thread
+from time import sleep, time
+from unittest import TestCase
+
+from weboob.browser import Browser
+from weboob.core.ouiboube import WebNip
+from weboob.exceptions import CallTimeout
+from weboob.tools.backend import Module
+from weboob.tools.callcontext import CallContext, remaining_time
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        sleep(1)
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class SlowServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients which have given up close the connection.
+        pass
+
+
+class MyModule(Module):
+    NAME = 'test'
+
+    def get_remaining(self):
+        return remaining_time()
+
+    def get_nested_remaining(self, other, timeout=None):
+        return list(self.weboob.do('get_remaining', backends=[other], timeout=timeout))
+
+
+# Class that tests the propagation of the deadline of a call to browsers
+class BrowserDeadlineTest(TestCase):
+
+    def setUp(self):
+        self.server = SlowServer(('127.0.0.1', 0), SlowHandler)
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_expired(self):
+        with CallContext(deadline=time() - 1):
+            self.assertRaises(CallTimeout, Browser().open, self.url)
+
+    def test_timeout_capped(self):
+        start = time()
+        with CallContext(deadline=time() + 0.2):
+            self.assertRaises(CallTimeout, Browser().open, self.url)
+        self.assertLess(time() - start, 0.8)
+
+    def test_no_deadline(self):
+        self.assertEqual(Browser().open(self.url).text, 'ok')
+
+
+# Class that tests deadlines of calls made by backends
+class NestedDeadlineTest(TestCase):
+
+    def setUp(self):
+        self.weboob = WebNip(modules_path=False)
+        self.backends = [MyModule(self.weboob, 'a'), MyModule(self.weboob, 'b')]
+
+    def tearDown(self):
+        self.weboob.deinit()
+
+    def do(self, function, *args, **kwargs):
+        return list(self.weboob.do(function, backends=self.backends[:1], *args, **kwargs))
+
+    def test_without_deadline(self):
+        self.assertEqual(self.do('get_remaining'), [])
+        self.assertEqual(self.do('get_nested_remaining', self.backends[1]), [])
+
+    def test_inner_deadline(self):
+        remaining, = self.do('get_nested_remaining', self.backends[1], 5)
+        self.assertTrue(4 < remaining <= 5)
+
+    def test_outer_deadline(self):
+        remaining, = self.do('get_nested_remaining', self.backends[1], 60, timeout=10)
+        self.assertTrue(9 < remaining <= 10)
+
+    def test_cancelled_outer(self):
+        call = self.weboob.do('get_remaining', backends=self.backends, timeout=10)
+        with CallContext(parent=call.context) as ctx:
+            call.cancel()
+            self.assertTrue(ctx.should_stop())
+        call.wait()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from SocketServer import ThreadingMixIn
+from threading import Thread
+from unittest import TestCase
+
+from weboob.applications.weboobdebug import WeboobDebug
+from weboob.browser import PagesBrowser, URL
+from weboob.browser.elements import ItemElement, ListElement, method
+from weboob.browser.filters.standard import CleanText
+from weboob.browser.pages import HTMLPage
+from weboob.capabilities.base import BaseObject
+from weboob.core.bcall import CallErrors
+from weboob.core.ouiboube import WebNip
+from weboob.core.repositories import Repositories
+from weboob.exceptions import BrowserUnavailable
+from weboob.tools import metrics
+from weboob.tools.backend import Module
+
+
+ITEMS = '<html><body><ul><li>a</li><li>b</li></ul></body></html>'
+
+
+class ItemsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/items':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(ITEMS)))
+        self.end_headers()
+        self.wfile.write(ITEMS)
+
+    def log_message(self, *args):
+        pass
+
+
+class ItemsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class ItemsPage(HTMLPage):
+    @method
+    class iter_items(ListElement):
+        item_xpath = '//li'
+
+        class item(ItemElement):
+            klass = BaseObject
+
+            obj_id = CleanText('.')
+
+
+class ItemsBrowser(PagesBrowser):
+    items = URL('/items', ItemsPage)
+
+    def iter_items(self):
+        self.items.go()
+        return self.page.iter_items()
+
+
+class MyModule(Module):
+    NAME = 'test'
+    BROWSER = ItemsBrowser
+
+    baseurl = None
+
+    def create_default_browser(self):
+        return self.create_browser(self.baseurl)
+
+    def iter_items(self):
+        return self.browser.iter_items()
+
+    def unavailable(self):
+        raise BrowserUnavailable()
+
+
+# Class that tests metrics recorded by calls on backends and their browsers
+class CallMetricsTest(TestCase):
+
+    def setUp(self):
+        self.enabled = metrics.registry.enabled
+        metrics.registry.enabled = True
+        metrics.registry.reset()
+
+        self.server = ItemsServer(('127.0.0.1', 0), ItemsHandler)
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.weboob = WebNip(modules_path=False)
+        self.backend = MyModule(self.weboob, 'backend0')
+        self.backend.baseurl = 'http://127.0.0.1:%d/' % self.server.server_port
+
+    def tearDown(self):
+        self.weboob.deinit()
+        self.server.shutdown()
+        self.server.server_close()
+        metrics.registry.reset()
+        metrics.registry.enabled = self.enabled
+
+    def test_call(self):
+        self.assertEqual([obj.id for obj in self.weboob.do('iter_items', backends=[self.backend])], [u'a', u'b'])
+
+        labels = {'backend': 'backend0', 'method': 'iter_items'}
+        self.assertEqual(metrics.CALLS.get(**labels), 1)
+        self.assertEqual(metrics.CALL_RESULTS.get(**labels), 2)
+        self.assertEqual(metrics.CALL_ERRORS.get(**labels), 0)
+        self.assertEqual(metrics.CALL_DURATION.get(**labels)['count'], 1)
+
+        # Requests and parsing are labelled with the call and the page.
+        labels['page'] = 'ItemsPage'
+        self.assertEqual(metrics.HTTP_REQUESTS.get(status=200, **labels), 1)
+        self.assertEqual(metrics.HTTP_BYTES.get(**labels), len(ITEMS))
+        self.assertEqual(metrics.HTTP_DURATION.get(**labels)['count'], 1)
+        self.assertEqual(metrics.PARSE_DURATION.get(**labels)['count'], 1)
+        self.assertEqual(metrics.ITEM_DURATION.get(element='item', **labels)['count'], 2)
+
+    def test_errors(self):
+        self.assertRaises(CallErrors, self.weboob.do('unavailable', backends=[self.backend]).wait)
+        labels = {'backend': 'backend0', 'method': 'unavailable'}
+        self.assertEqual(metrics.CALLS.get(**labels), 1)
+        self.assertEqual(metrics.CALL_ERRORS.get(**labels), 1)
+
+    def test_disabled(self):
+        metrics.registry.enabled = False
+        self.assertEqual(len(list(self.weboob.do('iter_items', backends=[self.backend]))), 2)
+        self.assertEqual([values for values in metrics.registry.snapshot().values() if values], [])
+
+
+# Class that tests display of recorded metrics by weboob-debug
+class DebugStatsTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='weboob_test_')
+        # Repositories are not updated when sources.list exists.
+        open(os.path.join(self.tmpdir, Repositories.SOURCES_LIST), 'w').close()
+        self.path = os.path.join(self.tmpdir, 'metrics')
+        self.environ = dict(os.environ)
+        os.environ['WEBOOB_WORKDIR'] = self.tmpdir
+        os.environ['WEBOOB_METRICS_FILE'] = self.path
+        metrics.registry.reset()
+        self.app = WeboobDebug()
+
+    def tearDown(self):
+        self.app.weboob.deinit()
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.tmpdir)
+
+    def run_stats(self, *args):
+        stdout = sys.stdout
+        sys.stdout = BytesIO()
+        try:
+            self.assertEqual(self.app.main(['weboob-debug', 'stats'] + list(args)), 0)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_stats(self):
+        # Metrics of two runs.
+        for i in xrange(2):
+            metrics.CALLS.inc(backend='backend0', method='iter_items')
+            metrics.registry.save(self.path)
+
+        self.assertIn('weboob_calls_total\n  backend=backend0, method=iter_items: 2\n', self.run_stats())
+        self.assertIn('weboob_calls_total{backend="backend0",method="iter_items"} 2\n', self.run_stats('prometheus'))
+        # Metrics of the process are not mixed with recorded ones.
+        self.assertEqual(metrics.CALLS.get(backend='backend0', method='iter_items'), 0)
+
+        self.run_stats('reset')
+        self.assertFalse(os.path.exists(self.path))
+        self.assertNotIn('weboob_calls_total', self.run_stats())
+
+    def test_no_file(self):
+        del os.environ['WEBOOB_METRICS_FILE']
+        stderr = self.app.stderr
+        self.app.stderr = BytesIO()
+        try:
+            self.assertEqual(self.app.main(['weboob-debug', 'stats']), 1)
+        finally:
+            self.app.stderr = stderr
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+
+from weboob.capabilities.bank import CapBank
+from weboob.capabilities.video import CapVideo
+from weboob.core.modules import LazyBackend, ModuleManifest, ModulesLoader
+from weboob.core.ouiboube import WebNip
+from weboob.core.repositories import ModuleInfo, Repository
+from weboob.tools.backend import Module
+
+
+MODULE = """
+from weboob.capabilities.bank import CapBank
+from weboob.tools.backend import BackendConfig, Module
+from weboob.tools.value import Value
+
+
+class LazyTestModule(Module, CapBank):
+    NAME = 'lazytest'
+    VERSION = '1.0'
+    CONFIG = BackendConfig(Value('login', label='Login', choices={'a': 'A', 'b': 'B'}, default='a'))
+
+    def iter_accounts(self):
+        return []
+"""
+
+
+# Class that tests backends which are created when they are needed
+class LazyBackendTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='weboob_test_')
+        os.mkdir(os.path.join(self.tmpdir, 'lazytest'))
+        with open(os.path.join(self.tmpdir, 'lazytest', '__init__.py'), 'w') as f:
+            f.write(MODULE)
+
+        self.weboob = WebNip(modules_path=False)
+        self.loader = ModulesLoader(self.tmpdir, '1.0')
+        minfo = ModuleInfo('lazytest')
+        minfo.capabilities = ['CapBank', 'CapCollection']
+        self.backend = LazyBackend(self.loader, minfo, self.weboob, 'lazy', {}, None)
+
+    def tearDown(self):
+        self.weboob.deinit()
+        sys.modules.pop('lazytest', None)
+        shutil.rmtree(self.tmpdir)
+
+    def test_has_caps(self):
+        self.assertTrue(self.backend.has_caps(CapBank))
+        self.assertTrue(self.backend.has_caps('CapBank'))
+        self.assertTrue(self.backend.has_caps(CapVideo, CapBank))
+        self.assertTrue(self.backend.has_caps([CapVideo, 'CapBank']))
+        self.assertFalse(self.backend.has_caps(CapVideo))
+        # The module has not been imported.
+        self.assertEqual(self.loader.loaded, {})
+
+        # Classes which are not capabilities are checked on the class of the
+        # module.
+        self.assertTrue(self.backend.has_caps(Module))
+        self.assertTrue(self.backend.has_caps(CapVideo, self.loader.get_or_load_module('lazytest').klass))
+        self.assertFalse(self.backend.has_caps([CapVideo, ModuleInfo]))
+
+    def test_isinstance(self):
+        self.assertIsInstance(self.backend, LazyBackend)
+        self.assertIsInstance(self.backend, CapBank)
+        self.assertIsInstance(self.backend, Module)
+        self.assertNotIsInstance(self.backend, CapVideo)
+        # The module is imported, but the backend is not created.
+        self.assertIsNone(self.backend.instance)
+
+    def test_call(self):
+        self.assertEqual(list(self.weboob.do('iter_accounts', backends=[self.backend])), [])
+        self.assertIsNotNone(self.backend.instance)
+        self.assertEqual(self.backend.instance.name, 'lazy')
+
+
+# Class that tests manifests of modules saved to list them without importing them
+class ModuleManifestTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='weboob_test_')
+        self.modules_dir = os.path.join(self.tmpdir, 'modules')
+        self.module_dir = os.path.join(self.modules_dir, 'lazytest')
+        os.makedirs(self.module_dir)
+        with open(os.path.join(self.module_dir, '__init__.py'), 'w') as f:
+            f.write(MODULE)
+        self.manifests_dir = os.path.join(self.tmpdir, 'manifests')
+
+    def tearDown(self):
+        sys.modules.pop('lazytest', None)
+        shutil.rmtree(self.tmpdir)
+
+    def get_loader(self):
+        return ModulesLoader(self.modules_dir, '1.0', self.manifests_dir)
+
+    def test_save_load(self):
+        loader = self.get_loader()
+        loader.load_module('lazytest')
+        filename = os.path.join(self.manifests_dir, 'lazytest.json')
+        self.assertTrue(os.path.isfile(filename))
+        # Nothing is written in the directory of the module.
+        self.assertEqual(sorted(f for f in os.listdir(self.module_dir) if not f.endswith('.pyc')), ['__init__.py'])
+
+        manifest = ModuleManifest.read(filename)
+        self.assertEqual(manifest.dump(), loader.loaded['lazytest'].manifest.dump())
+        self.assertIn('weboob.capabilities.bank.CapBank', manifest.capabilities)
+        self.assertEqual(manifest.config['login'].label, 'Login')
+        self.assertEqual(list(manifest.config['login'].choices.items()), [('a', 'A'), ('b', 'B')])
+
+        # Another loader uses the manifest without importing the module.
+        sys.modules.pop('lazytest', None)
+        loader = self.get_loader()
+        self.assertEqual(loader.get_manifest('lazytest').dump(), manifest.dump())
+        self.assertEqual(loader.loaded, {})
+
+    def test_invalid(self):
+        filename = os.path.join(self.manifests_dir, 'lazytest.json')
+        self.assertIsNone(ModuleManifest.read(filename))
+        os.makedirs(self.manifests_dir)
+        with open(filename, 'w') as f:
+            f.write('{"name": "lazytest"}')
+        self.assertIsNone(ModuleManifest.read(filename))
+
+    def test_modified(self):
+        self.get_loader().load_module('lazytest')
+        sys.modules.pop('lazytest', None)
+
+        mtime = os.path.getmtime(os.path.join(self.module_dir, '__init__.py')) + 10
+        os.utime(os.path.join(self.module_dir, '__init__.py'), (mtime, mtime))
+        loader = self.get_loader()
+        filename = os.path.join(self.manifests_dir, 'lazytest.json')
+        self.assertIsNone(loader.read_manifest(filename, self.module_dir))
+
+        # The module is imported and its manifest is saved again.
+        self.assertEqual(loader.get_manifest('lazytest').mtime,
+                         os.path.getmtime(os.path.join(self.module_dir, '__init__.py')))
+        self.assertIn('lazytest', loader.loaded)
+        self.assertIsNotNone(loader.read_manifest(filename, self.module_dir))
+
+    def test_build_index(self):
+        index = os.path.join(self.tmpdir, Repository.INDEX)
+        repository = Repository('file://%s' % self.modules_dir)
+        repository.build_index(self.modules_dir, index, manifests_dir=self.manifests_dir)
+        self.assertIn('CapBank', repository.modules['lazytest'].capabilities)
+        self.assertTrue(os.path.isfile(os.path.join(self.manifests_dir, 'lazytest.json')))
+        self.assertFalse(os.path.exists(os.path.join(self.module_dir, ModuleManifest.FILENAME)))
+
+        # Unmodified modules are not imported again.
+        sys.modules.pop('lazytest', None)
+        repository.build_index(self.modules_dir, index, manifests_dir=self.manifests_dir)
+        self.assertNotIn('lazytest', sys.modules)
+        self.assertIn('CapBank', repository.modules['lazytest'].capabilities)
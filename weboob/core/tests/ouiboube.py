@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+from weboob.capabilities.bank import CapBank
+from weboob.capabilities.collection import CapCollection
+from weboob.capabilities.video import CapVideo
+from weboob.core.ouiboube import WebNip
+from weboob.tools.backend import Module
+
+
+class BankModule(Module, CapBank):
+    NAME = 'bank'
+
+    def iter_accounts(self):
+        return [self.name]
+
+
+class VideoModule(Module, CapVideo):
+    NAME = 'video'
+
+
+# Class that tests the index of loaded backends by capability
+class BackendsIndexTest(TestCase):
+
+    def setUp(self):
+        self.weboob = WebNip(modules_path=False)
+        self.index = self.weboob.backend_instances
+        self.index['bank1'] = BankModule(self.weboob, 'bank1')
+        self.index['bank2'] = BankModule(self.weboob, 'bank2')
+        self.index['video'] = VideoModule(self.weboob, 'video')
+
+    def tearDown(self):
+        self.weboob.deinit()
+
+    def test_select(self):
+        self.assertEqual(self.index.select(CapBank), set(['bank1', 'bank2']))
+        self.assertEqual(self.index.select('CapVideo'), set(['video']))
+        self.assertEqual(self.index.select([CapVideo, (CapBank,)]), set(['bank1', 'bank2', 'video']))
+        # Inherited capabilities are indexed.
+        self.assertEqual(self.index.select(CapCollection), set(['bank1', 'bank2']))
+        self.assertEqual(self.index.select('CapMessages'), set())
+        # Other classes can't be found from the index.
+        self.assertIsNone(self.index.select(BankModule))
+
+    def test_setitem(self):
+        # Replace a backend by one with other capabilities.
+        self.index['bank2'] = VideoModule(self.weboob, 'bank2')
+        self.assertEqual(self.index.select(CapBank), set(['bank1']))
+        self.assertEqual(self.index.select(CapVideo), set(['bank2', 'video']))
+
+        self.assertIs(self.index.setdefault('bank1', None), self.index['bank1'])
+        self.index.update(bank3=BankModule(self.weboob, 'bank3'))
+        self.assertEqual(self.index.select(CapBank), set(['bank1', 'bank3']))
+
+    def test_delitem(self):
+        del self.index['bank1']
+        self.assertEqual(self.index.select(CapBank), set(['bank2']))
+        self.assertIsNotNone(self.index.pop('bank2'))
+        self.assertEqual(self.index.pop('bank2', None), None)
+        self.assertRaises(KeyError, self.index.pop, 'bank2')
+        self.assertNotIn('CapBank', self.index.caps)
+        self.assertEqual(self.index.select(CapCollection), set())
+
+        self.index.popitem()
+        self.assertEqual(self.index.caps, {})
+
+    def test_clear(self):
+        self.index.clear()
+        self.assertEqual(self.index.caps, {})
+        self.assertEqual(self.index.select(CapBank), set())
+
+    def test_unload(self):
+        unloaded = self.weboob.unload_backends('bank1')
+        self.assertEqual(list(unloaded), ['bank1'])
+        self.assertEqual(self.index.select(CapBank), set(['bank2']))
+        self.assertEqual(list(self.weboob.do('iter_accounts', caps=CapBank)), ['bank2'])
+
+        self.weboob.unload_backends()
+        self.assertEqual(self.index.caps, {})
+        self.assertEqual(list(self.weboob.do('iter_accounts', caps=CapBank)), [])
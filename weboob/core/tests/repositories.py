@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from ConfigParser import DEFAULTSECT, RawConfigParser
+from contextlib import closing
+from io import BytesIO
+from SocketServer import ThreadingMixIn
+from threading import Thread
+from unittest import TestCase
+
+from weboob.core.repositories import IProgress, ModuleInfo, ModuleInstallError, Repositories, Repository
+
+
+class FilesHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        content = self.server.files.get(self.path)
+        if content is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        etag = '"%s"' % hashlib.md5(content).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.server.not_modified.append(self.path)
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class FilesServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        HTTPServer.__init__(self, *args, **kwargs)
+        # Contents by path, paths which have been requested, and the ones
+        # which have not been modified since the previous request.
+        self.files = {}
+        self.requests = []
+        self.not_modified = []
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class QuietProgress(IProgress):
+    def __init__(self):
+        self.errors = []
+
+    def progress(self, percent, message):
+        pass
+
+    def error(self, message):
+        self.errors.append(message)
+
+
+def make_archive(name, content):
+    data = BytesIO()
+    with closing(tarfile.open(fileobj=data, mode='w:gz')) as tar:
+        info = tarfile.TarInfo('%s/__init__.py' % name)
+        info.size = len(content)
+        tar.addfile(info, BytesIO(content))
+    return data.getvalue()
+
+
+class ServerTestCase(TestCase):
+    def setUp(self):
+        self.server = FilesServer(('127.0.0.1', 0), FilesHandler)
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+
+        self.tmpdir = tempfile.mkdtemp(prefix='weboob_test_')
+        # Repositories are not updated when sources.list exists.
+        with open(os.path.join(self.tmpdir, Repositories.SOURCES_LIST), 'w') as f:
+            f.write(self.url)
+        self.repositories = Repositories(self.tmpdir, self.tmpdir, '1.0')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+
+# Class that tests installation of modules from a repository
+class InstallTest(ServerTestCase):
+
+    def get_module(self, name, version, content=None):
+        if content is not None:
+            self.server.files['/%s.tar.gz' % name] = make_archive(name, content)
+        info = ModuleInfo(name)
+        info.version = version
+        info.url = '%s%s.tar.gz' % (self.url, name)
+        info.repo_url = self.url
+        info.signed = False
+        return info
+
+    def read_module(self, name):
+        with open(os.path.join(self.repositories.modules_dir, name, '__init__.py')) as f:
+            return f.read()
+
+    def assertClean(self):
+        modules_dir = self.repositories.modules_dir
+        self.assertEqual([name for name in os.listdir(modules_dir) if name.startswith(Repositories.STAGING_PREFIX)], [])
+        downloads_dir = os.path.join(modules_dir, Repositories.DOWNLOADS_DIR)
+        self.assertEqual(os.listdir(downloads_dir) if os.path.isdir(downloads_dir) else [], [])
+
+    def test_install_many(self):
+        modules = [self.get_module('mod%d' % i, 201401010000, 'VALUE = %d\n' % i) for i in xrange(6)]
+        progress = QuietProgress()
+        self.assertEqual(self.repositories.install_many(modules, progress, max_workers=3), {})
+
+        for i in xrange(6):
+            self.assertEqual(self.read_module('mod%d' % i), 'VALUE = %d\n' % i)
+            # Modules are compiled in the staging directory.
+            self.assertTrue(os.path.exists(os.path.join(self.repositories.modules_dir, 'mod%d' % i, '__init__.pyc')))
+            self.assertEqual(self.repositories.versions.get('mod%d' % i), 201401010000)
+        self.assertClean()
+
+    def test_upgrade(self):
+        self.repositories.install(self.get_module('mod', 201401010000, 'VALUE = 1\n'), QuietProgress())
+        self.repositories.install(self.get_module('mod', 201402010000, 'VALUE = 2\n'), QuietProgress())
+
+        # The previous version has been swapped with the new one.
+        self.assertEqual(self.read_module('mod'), 'VALUE = 2\n')
+        self.assertEqual(self.repositories.versions.get('mod'), 201402010000)
+        self.assertClean()
+
+        with self.assertRaises(ModuleInstallError):
+            self.repositories.install(self.get_module('mod', 201402010000), QuietProgress())
+
+    def test_invalid_archive(self):
+        self.repositories.install(self.get_module('mod', 201401010000, 'VALUE = 1\n'), QuietProgress())
+        module = self.get_module('mod', 201402010000)
+        self.server.files['/mod.tar.gz'] = 'not an archive'
+
+        errors = self.repositories.install_many([module], QuietProgress())
+        self.assertIsInstance(errors['mod'], ModuleInstallError)
+        # The installed version is kept, and the invalid archive is removed.
+        self.assertEqual(self.read_module('mod'), 'VALUE = 1\n')
+        self.assertEqual(self.repositories.versions.get('mod'), 201401010000)
+        self.assertClean()
+
+    def test_local_module(self):
+        local = ModuleInfo('local')
+        local.path = self.tmpdir
+        modules = [local, self.get_module('mod', 201401010000, 'VALUE = 1\n')]
+
+        errors = self.repositories.install_many(modules, QuietProgress())
+        # Modules of local repositories can not be installed, the other
+        # ones are still installed.
+        self.assertEqual(list(errors), ['local'])
+        self.assertIsInstance(errors['local'], ModuleInstallError)
+        self.assertFalse(os.path.exists(os.path.join(self.repositories.modules_dir, 'local')))
+        self.assertEqual(self.read_module('mod'), 'VALUE = 1\n')
+
+    def test_missing_archive(self):
+        errors = self.repositories.install_many([self.get_module('mod', 201401010000)], QuietProgress())
+        self.assertEqual(list(errors), ['mod'])
+        self.assertFalse(os.path.exists(os.path.join(self.repositories.modules_dir, 'mod')))
+        self.assertClean()
+
+    def test_downloaded_archive(self):
+        module = self.get_module('mod', 201401010000)
+        # Archive downloaded by an interrupted installation.
+        downloads_dir = os.path.join(self.repositories.modules_dir, Repositories.DOWNLOADS_DIR)
+        os.mkdir(downloads_dir)
+        with open(os.path.join(downloads_dir, 'mod-201401010000.tar.gz'), 'wb') as f:
+            f.write(make_archive('mod', 'VALUE = 1\n'))
+
+        self.repositories.install(module, QuietProgress())
+        self.assertEqual(self.read_module('mod'), 'VALUE = 1\n')
+        self.assertNotIn('/mod.tar.gz', self.server.requests)
+        self.assertClean()
+
+    def test_interrupted(self):
+        modules_dir = self.repositories.modules_dir
+        # The installed version has been moved in the staging directory,
+        # but the new one has not been moved yet.
+        staging = os.path.join(modules_dir, '%smod-abc' % Repositories.STAGING_PREFIX)
+        os.makedirs(os.path.join(staging, '.previous'))
+        with open(os.path.join(staging, '.previous', '__init__.py'), 'w') as f:
+            f.write('VALUE = 1\n')
+        os.makedirs(os.path.join(staging, 'mod'))
+        # An other installation has been interrupted while downloading.
+        downloads_dir = os.path.join(modules_dir, Repositories.DOWNLOADS_DIR)
+        os.mkdir(downloads_dir)
+        open(os.path.join(downloads_dir, 'other123.part'), 'w').close()
+
+        self.repositories.clean_modules_dir()
+        self.assertEqual(self.read_module('mod'), 'VALUE = 1\n')
+        self.assertClean()
+
+
+def get_module(name, version):
+    info = ModuleInfo(name)
+    info.version = version
+    info.capabilities = ['CapBank']
+    info.description = u'Module %s' % name
+    return info
+
+
+# Class that tests updates of indexes of repositories
+class IndexTest(ServerTestCase):
+
+    def setUp(self):
+        super(IndexTest, self).setUp()
+        self.repo_dir = os.path.join(self.tmpdir, 'repo')
+        os.mkdir(self.repo_dir)
+        self.browser = self.repositories.create_browser()
+
+    def build(self, update, modules):
+        """
+        Save a version of the index of the served repository, with deltas
+        since the previous one.
+        """
+        filename = os.path.join(self.repo_dir, Repository.INDEX)
+        repository = Repository('http://')
+        if os.path.exists(filename):
+            with open(filename, 'r') as fp:
+                repository.parse_index(fp)
+        else:
+            repository.name = 'test'
+        previous_update = repository.update
+        previous_modules = dict((name, dict(module.dump())) for name, module in repository.modules.iteritems())
+
+        repository.update = update
+        repository.modules = dict((module.name, module) for module in modules)
+        if previous_update:
+            repository.write_deltas(self.repo_dir, previous_update, previous_modules)
+        repository.save(filename)
+
+        self.server.files.clear()
+        for root, dirs, files in os.walk(self.repo_dir):
+            for f in files:
+                with open(os.path.join(root, f), 'rb') as fp:
+                    self.server.files['/' + os.path.relpath(os.path.join(root, f), self.repo_dir)] = fp.read()
+        return repository
+
+    def read_delta(self, since):
+        config = RawConfigParser()
+        config.read(os.path.join(self.repo_dir, Repository.DELTAS_DIR, '%s.list' % since))
+        return sorted(config.sections()), config.get(DEFAULTSECT, 'removed').split()
+
+    def retrieve(self, previous=None):
+        repository = Repository(self.url)
+        repository.retrieve_index(self.browser, os.path.join(self.tmpdir, 'index'), previous)
+        return repository
+
+    def get_versions(self, repository):
+        return dict((name, module.version) for name, module in repository.modules.iteritems())
+
+    def test_write_deltas(self):
+        self.build(1, [get_module('a', 1), get_module('c', 1)])
+        self.build(2, [get_module('a', 2), get_module('b', 2)])
+        self.assertEqual(self.read_delta(1), (['a', 'b'], ['c']))
+        self.assertEqual(self.read_delta(2), ([], []))
+
+        # Deltas since older versions are merged with the new changes.
+        self.build(3, [get_module('b', 3), get_module('c', 3)])
+        self.assertEqual(self.read_delta(1), (['b', 'c'], ['a']))
+        self.assertEqual(self.read_delta(2), (['b', 'c'], ['a']))
+        self.assertEqual(self.read_delta(3), ([], []))
+
+    def test_deltas_kept(self):
+        kept = Repository.DELTAS_KEPT
+        Repository.DELTAS_KEPT = 2
+        try:
+            for update in xrange(1, 6):
+                self.build(update, [get_module('a', update)])
+        finally:
+            Repository.DELTAS_KEPT = kept
+
+        self.assertEqual(sorted(os.listdir(os.path.join(self.repo_dir, Repository.DELTAS_DIR))),
+                         ['3.list', '4.list', '5.list'])
+        self.assertEqual(self.read_delta(3), (['a'], []))
+
+    def test_retrieve_delta(self):
+        self.build(1, [get_module('a', 1), get_module('c', 1)])
+        previous = self.retrieve()
+        self.assertEqual(self.get_versions(previous), {'a': 1, 'c': 1})
+        self.assertIsNotNone(previous.etag)
+
+        self.build(2, [get_module('a', 2), get_module('b', 2)])
+        repository = self.retrieve(previous)
+        self.assertEqual(self.get_versions(repository), {'a': 2, 'b': 2})
+        self.assertEqual(repository.update, 2)
+        self.assertEqual(self.server.requests[-1], '/deltas/1.list')
+        # Validators of the previous index are not used for the new one.
+        self.assertIsNone(repository.etag)
+        self.assertIsNone(repository.last_modified)
+
+        # Without a delta, the whole index is downloaded again.
+        self.build(3, [get_module('a', 3)])
+        del self.server.files['/deltas/2.list']
+        repository = self.retrieve(repository)
+        self.assertEqual(self.get_versions(repository), {'a': 3})
+        self.assertEqual(self.server.requests[-1], '/modules.list')
+
+    def test_not_modified(self):
+        self.build(1, [get_module('a', 1)])
+        previous = self.retrieve()
+        self.assertNotIn('/deltas/1.list', self.server.files)
+
+        repository = self.retrieve(previous)
+        self.assertEqual(self.server.not_modified, ['/modules.list'])
+        self.assertEqual(self.get_versions(repository), {'a': 1})
+        self.assertEqual(repository.etag, previous.etag)
+
+        # The validators are saved with the index.
+        saved = Repository(os.path.join(self.tmpdir, 'index'))
+        self.assertEqual(saved.etag, previous.etag)
+        self.assertEqual(self.get_versions(saved), {'a': 1})
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Lock, Thread
+from time import sleep, time
+from unittest import TestCase
+
+from weboob.core.scheduler import HeapScheduler, Waker
+
+
+# Class that tests sleeps of threads until they are woken up
+class WakerTest(TestCase):
+
+    def test_timeout(self):
+        start = time()
+        Waker().wait(0.05)
+        self.assertTrue(0.04 <= time() - start < 1)
+
+    def test_wake(self):
+        waker = Waker()
+        Thread(target=lambda: (sleep(0.05), waker.wake())).start()
+        start = time()
+        waker.wait()
+        self.assertLess(time() - start, 1)
+
+        # A wake up is not lost, and is consumed by the wait.
+        waker.wake()
+        waker.wake()
+        waker.wait()
+        start = time()
+        waker.wait(0.05)
+        self.assertGreaterEqual(time() - start, 0.04)
+
+
+# Class that tests the scheduler based on a heap
+class HeapSchedulerTest(TestCase):
+
+    def setUp(self):
+        self.scheduler = HeapScheduler(max_workers=2)
+        self.mutex = Lock()
+        self.runs = []
+
+    def tearDown(self):
+        self.scheduler.want_stop()
+
+    def slow(self, duration):
+        start = time()
+        sleep(duration)
+        with self.mutex:
+            self.runs.append((start, time()))
+
+    def test_invalid_interval(self):
+        self.assertRaises(ValueError, self.scheduler.repeat, 0, self.slow, 0)
+        self.assertRaises(ValueError, self.scheduler.repeat, -1, self.slow, 0)
+
+    def test_jitter(self):
+        for i in xrange(20):
+            self.scheduler.schedule(60, self.slow, 0, jitter=5)
+        self.scheduler.schedule(60, self.slow, 0, jitter=0)
+
+        delays = [deadline - event.base for deadline, _, event in self.scheduler.heap]
+        self.assertTrue(all(0 <= delay <= 5 for delay in delays))
+        self.assertEqual(delays.count(0), 1)
+        self.assertGreater(len(set(delays)), 10)
+
+    def run_slow(self, missed):
+        self.scheduler.repeat(0.2, self.slow, 0.25, missed=missed)
+        sleep(0.9)
+        self.scheduler.want_stop()
+        sleep(0.3)
+        return [next_start - end for (start, end), (next_start, next_end) in zip(self.runs, self.runs[1:])]
+
+    def test_coalesce(self):
+        # A run which has been missed is done once the previous one ends.
+        gaps = self.run_slow('coalesce')
+        self.assertGreaterEqual(len(gaps), 2)
+        self.assertTrue(all(0 <= gap < 0.1 for gap in gaps), gaps)
+
+    def test_skip(self):
+        # Missed runs are dropped, the next one is at the next planned time.
+        gaps = self.run_slow('skip')
+        self.assertGreaterEqual(len(gaps), 1)
+        self.assertTrue(all(0.1 <= gap < 0.2 for gap in gaps), gaps)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from threading import Thread
+from unittest import TestCase
+
+import weboob
+from weboob.core.ouiboube import WebNip
+from weboob.core.tests.metrics import ItemsHandler, ItemsServer, MyModule
+from weboob.tools.json import json
+from weboob.tools.tracing import Tracer
+
+
+SCRIPT = """
+from weboob.core.ouiboube import WebNip
+from weboob.core.tests.bcall import MyModule
+
+weboob = WebNip(modules_path=False)
+print(list(weboob.do('sleep', 0, backends=[MyModule(weboob, 'backend0')])))
+weboob.deinit()
+"""
+
+
+# Class that tests traces of calls on backends
+class TraceTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='weboob_test_')
+        self.path = os.path.join(self.tmpdir, 'trace.json')
+
+        self.server = ItemsServer(('127.0.0.1', 0), ItemsHandler)
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.weboob = WebNip(modules_path=False)
+        self.backend = MyModule(self.weboob, 'backend0')
+        self.backend.baseurl = 'http://127.0.0.1:%d/' % self.server.server_port
+
+    def tearDown(self):
+        self.weboob.deinit()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+    def load_spans(self):
+        with open(self.path) as fp:
+            data = json.load(fp)
+        # Spans by category and name.
+        spans = {}
+        for event in data['traceEvents']:
+            if event['ph'] == 'X':
+                spans.setdefault(event['cat'], {})[event['name']] = event
+        return spans
+
+    def assertWithin(self, inner, outer):
+        # Timestamps are truncated to microseconds.
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertLessEqual(inner['ts'] + inner['dur'], outer['ts'] + outer['dur'] + 1)
+
+    def test_file(self):
+        results = list(self.weboob.do('iter_items', backends=[self.backend], trace=self.path))
+        self.assertEqual(len(results), 2)
+
+        # The trace is saved once the call is over.
+        spans = self.load_spans()
+        call = spans['call'][u'do iter_items']
+        self.assertEqual(call['args'], {u'errors': 0})
+        backend = spans['backend'][u'backend0']
+        self.assertEqual(backend['args'], {u'method': u'iter_items'})
+        request = spans['http'][u'GET %sitems' % self.backend.baseurl]
+        self.assertEqual(request['args'], {u'status': 200, u'page': u'ItemsPage'})
+        self.assertEqual(sorted(spans['http']), sorted([request['name'], u'download', u'handle', u'ttfb']))
+        page = spans['page'][u'ItemsPage']
+        self.assertEqual(sorted(spans['element']), [u'item', u'iter_items'])
+
+        self.assertWithin(backend, call)
+        for span in (request, page, spans['element'][u'iter_items']):
+            self.assertWithin(span, backend)
+        self.assertWithin(spans['element'][u'item'], spans['element'][u'iter_items'])
+        # Spans of the backend are recorded in its thread.
+        self.assertNotEqual(backend['tid'], call['tid'])
+        self.assertEqual(request['tid'], backend['tid'])
+
+    def test_tracer(self):
+        tracer = Tracer()
+        list(self.weboob.do('iter_items', backends=[self.backend], trace=tracer))
+        self.assertLessEqual(set(['call', 'backend', 'http', 'page', 'element']),
+                             set(event.get('cat') for event in tracer.events))
+
+        # Disabled by default.
+        self.assertIsNone(self.weboob.do('iter_items', backends=[self.backend]).tracer)
+
+    def test_environment(self):
+        env = dict(os.environ, WEBOOB_TRACE=self.path)
+        # Directory where the weboob package can be imported from.
+        cwd = os.path.dirname(os.path.dirname(os.path.abspath(weboob.__file__)))
+        output = subprocess.check_output([sys.executable, '-c', SCRIPT], env=env, cwd=cwd)
+        self.assertEqual(output, "['backend0']\n")
+
+        # The trace is saved when the process exits.
+        spans = self.load_spans()
+        self.assertEqual(list(spans['call']), [u'do sleep'])
+        self.assertEqual(list(spans['backend']), [u'backend0'])
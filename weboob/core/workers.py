@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from collections import deque
+from contextlib import contextmanager
+from threading import Thread, Condition, current_thread
+from time import time
+
+from weboob.tools.log import getLogger
+from weboob.tools.misc import get_backtrace
+
+
+__all__ = ['WorkerPool']
+
+
+class WorkerPool(object):
+    """
+    Pool of reusable threads to run jobs.
+
+    Threads are started on demand, up to *max_workers*, and then wait for
+    new jobs instead of exiting. Jobs submitted while every worker is busy
+    are queued. Workers which wait for other jobs (see :func:`blocking`)
+    do not count in *max_workers*.
+
+    >>> pool = WorkerPool(2)
+    >>> pool.submit(lambda: None)
+    >>> pool.join()
+    >>> pool.stats()['submitted']
+    1
+    >>> pool.shutdown()
+
+    :param max_workers: maximum number of running threads
+    :type max_workers: :class:`int`
+    :param name: prefix of threads names
+    :type name: :class:`str`
+    """
+
+    def __init__(self, max_workers=10, name='worker'):
+        assert max_workers > 0
+        self.logger = getLogger('workers')
+        self.max_workers = max_workers
+        self.name = name
+        self.jobs = deque()
+        self.mutex = Condition()
+        self.threads = []
+        self.idle = 0
+        # Workers waiting in a blocking() block.
+        self.blocked = 0
+        self.running = 0
+        self.submitted = 0
+        self.overflows = 0
+
+    @property
+    def queue_depth(self):
+        """
+        Number of jobs waiting for a free worker.
+        """
+        return len(self.jobs)
+
+    def stats(self):
+        """
+        Get a snapshot of the pool state.
+
+        :rtype: :class:`dict`
+        """
+        with self.mutex:
+            return {'max_workers': self.max_workers,
+                    'workers': len(self.threads),
+                    'busy': len(self.threads) - self.idle,
+                    'blocked': self.blocked,
+                    'queue_depth': len(self.jobs),
+                    'submitted': self.submitted,
+                    'overflows': self.overflows,
+                   }
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Run ``function(*args, **kwargs)`` in a worker thread.
+
+        If the caller is itself a worker of this pool and no other worker is
+        free, the job is run in a dedicated thread, as waiting for it would
+        dead-lock a saturated pool.
+        """
+        with self.mutex:
+            self.submitted += 1
+            if self.idle == 0 and len(self.threads) - self.blocked >= self.max_workers and \
+               current_thread() in self.threads:
+                self.overflows += 1
+                thread = Thread(target=self._run_job, args=(function, args, kwargs),
+                                name='%s-overflow' % self.name)
+                thread.daemon = True
+                thread.start()
+                return
+
+            self.jobs.append((function, args, kwargs))
+            if not self._start_worker():
+                self.mutex.notify()
+
+    def _start_worker(self):
+        # Has to be called with the mutex held.
+        if len(self.jobs) <= self.idle or len(self.threads) - self.blocked >= self.max_workers:
+            return False
+
+        thread = Thread(target=self._worker_run, name='%s-%d' % (self.name, len(self.threads)))
+        thread.daemon = True
+        self.threads.append(thread)
+        thread.start()
+        return True
+
+    @contextmanager
+    def blocking(self):
+        """
+        Declare that the current thread waits for something which may need
+        other jobs to run, for example for a consumer of its results.
+
+        If it is a worker, it does not count in *max_workers* until the end
+        of the block, so queued and new jobs are run by other workers
+        instead of waiting for it.
+        """
+        with self.mutex:
+            worker = current_thread() in self.threads
+            if worker:
+                self.blocked += 1
+                self._start_worker()
+        try:
+            yield
+        finally:
+            if worker:
+                with self.mutex:
+                    self.blocked -= 1
+
+    def _run_job(self, function, args, kwargs):
+        try:
+            function(*args, **kwargs)
+        except Exception:
+            # jobs are expected to handle their own errors
+            self.logger.error(u'Uncaught exception in worker job:\n%s', get_backtrace())
+
+    def _worker_run(self):
+        while True:
+            with self.mutex:
+                while not self.jobs:
+                    self.idle += 1
+                    self.mutex.wait()
+                    self.idle -= 1
+                job = self.jobs.popleft()
+                if job is None:
+                    self.threads.remove(current_thread())
+                    self.mutex.notify_all()
+                    return
+                self.running += 1
+
+            try:
+                self._run_job(*job)
+            finally:
+                with self.mutex:
+                    self.running -= 1
+                    self.mutex.notify_all()
+                    # Workers started while others were blocked are not
+                    # needed anymore.
+                    if len(self.threads) - self.blocked > self.max_workers:
+                        self.threads.remove(current_thread())
+                        return
+
+    def join(self):
+        """
+        Wait for every queued job to be processed.
+        """
+        with self.mutex:
+            while self.running or any(job is not None for job in self.jobs):
+                self.mutex.wait()
+
+    def shutdown(self, wait=False, timeout=None):
+        """
+        Ask every worker to stop once the queued jobs are processed.
+
+        :param wait: if True, wait for workers to exit
+        :type wait: :class:`bool`
+        :param timeout: maximum number of seconds to wait for workers
+        :type timeout: :class:`float`
+        """
+        with self.mutex:
+            threads = list(self.threads)
+            self.jobs.extend([None] * len(threads))
+            self.mutex.notify_all()
+
+        if wait:
+            end = None if timeout is None else time() + timeout
+            for thread in threads:
+                thread.join(None if end is None else max(0, end - time()))
@@ -169,10 +169,16 @@ class StandardBrowser(mechanize.Browser):
     default_features.remove('_robots')
     default_features.remove('_refresh')
 
-    def __init__(self, firefox_cookies=None, parser=None, history=NoHistory(), proxy=None, logger=None, factory=None, responses_dirname=None):
+    def __init__(self, firefox_cookies=None, parser=None, history=NoHistory(), proxy=None, logger=None, factory=None, responses_dirname=None, cassette=None):
         mechanize.Browser.__init__(self, history=history, factory=factory)
         self.logger = getLogger('browser', logger)
 
+        # Record or replay responses
+        self.cassette = cassette
+        if cassette is not None:
+            from .cassette import CassetteHandler
+            self.add_handler(CassetteHandler(cassette))
+
         self.addheaders = [
                 ['User-agent', self.USER_AGENT]
             ]
@@ -454,6 +460,8 @@ class Browser(StandardBrowser):
     :type get_homme: bool
     :param responses_dirname: directory to store responses
     :type responses_dirname: str
+    :param cassette: cassette to record or replay responses
+    :type cassette: :class:`weboob.tools.cassette.Cassette`
     """
 
     # ------ Class attributes --------------------------------------
@@ -497,8 +505,9 @@ class Browser(StandardBrowser):
 
     def __init__(self, username=None, password=None, firefox_cookies=None,
                  parser=None, history=NoHistory(), proxy=None, logger=None,
-                 factory=None, get_home=True, responses_dirname=None):
-        StandardBrowser.__init__(self, firefox_cookies, parser, history, proxy, logger, factory, responses_dirname)
+                 factory=None, get_home=True, responses_dirname=None, cassette=None):
+        StandardBrowser.__init__(self, firefox_cookies, parser, history, proxy, logger, factory, responses_dirname,
+                                 cassette)
         self.page = None
         self.last_update = 0.0
         self.username = username
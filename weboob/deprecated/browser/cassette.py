@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import mechanize
+
+from weboob.tools.cassette import Cassette, NoRecordedResponse
+
+
+__all__ = ['CassetteHandler']
+
+
+def get_raw_headers(response):
+    headers = []
+    for line in response.info().headers:
+        if line[:1] in ' \t' and headers:
+            headers[-1] = (headers[-1][0], headers[-1][1] + ' ' + line.strip())
+        else:
+            name, _, value = line.partition(':')
+            headers.append((name.strip(), value.strip()))
+    return headers
+
+
+class CassetteHandler(mechanize.BaseHandler):
+    """
+    Mechanize handler which records responses in a cassette, or replays
+    them without network access.
+
+    Contrary to :class:`weboob.browser.cassette.CassetteAdapter`, content
+    is recorded as it is received, as the browser decodes it itself.
+
+    :param cassette: cassette to use
+    :type cassette: :class:`weboob.tools.cassette.Cassette`
+    """
+
+    # Before handlers which open connections.
+    handler_order = 100
+
+    def __init__(self, cassette):
+        self.cassette = cassette
+
+    def replay_open(self, request):
+        if self.cassette.mode != Cassette.REPLAY:
+            return None
+
+        url = request.get_full_url()
+        interaction = self.cassette.play(request.get_method(), url, request.get_data())
+        if interaction is None:
+            raise NoRecordedResponse(u'No recorded response for %s %s' % (request.get_method(), url))
+        return mechanize.make_response(interaction['content'], interaction['headers'], url,
+                                       interaction['status'], interaction['reason'])
+
+    http_open = https_open = replay_open
+
+    def record_response(self, request, response):
+        if self.cassette.mode != Cassette.RECORD:
+            return response
+
+        url = request.get_full_url()
+        headers = [(name, value) for name, value in get_raw_headers(response)
+                   if name.lower() not in ('content-length', 'transfer-encoding')]
+        content = response.read()
+        self.cassette.record(request.get_method(), url, request.get_data(),
+                             response.code, getattr(response, 'msg', ''), headers, content)
+        # The original response has been consumed.
+        return mechanize.make_response(content, headers, response.geturl(), response.code,
+                                       getattr(response, 'msg', ''))
+
+    http_response = https_response = record_response
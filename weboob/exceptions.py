@@ -58,3 +58,16 @@ class FormFieldConversionWarning(UserWarning):
     """
     A value has been set to a form's field and has been implicitly converted.
     """
+
+
+class BackendUnhealthy(BrowserUnavailable):
+    """
+    The backend is skipped because its website has been failing recently
+    (see :class:`weboob.core.health.BackendsHealth`).
+    """
+
+
+class CallTimeout(Exception):
+    """
+    The deadline given to a call on backends has been reached.
+    """
@@ -20,14 +20,21 @@
 
 from __future__ import print_function
 
+import os
+import sys
+
+from weboob.tools.startup import profiler as startup_profiler
+if os.environ.get('WEBOOB_PROFILE_STARTUP'):
+    # Start as soon as possible, to measure imports of the application.
+    startup_profiler.start()
+
 import logging
 import optparse
 from optparse import OptionGroup, OptionParser
 from datetime import datetime
 import locale
-import os
-import sys
 import warnings
+from types import GeneratorType
 
 from weboob.capabilities.base import ConversionWarning, BaseObject
 from weboob.core import Weboob, CallErrors
@@ -35,6 +42,7 @@ from weboob.core.backendscfg import BackendsConfig
 from weboob.tools.config.iconfig import ConfigError
 from weboob.exceptions import FormFieldConversionWarning
 from weboob.tools.log import createColoredFormatter, getLogger, DEBUG_FILTERS, settings as log_settings
+from weboob.tools.metrics import registry as metrics_registry
 from weboob.tools.misc import to_unicode
 from .results import ResultsConditionError
 
@@ -144,7 +152,10 @@ class Application(object):
     def __init__(self, option_parser=None):
         self.encoding = self.guess_encoding()
         self.logger = getLogger(self.APPNAME)
-        self.weboob = self.create_weboob()
+        with startup_profiler.phase('create weboob'):
+            self.weboob = self.create_weboob()
+        # Skip backends whose website is down.
+        self.weboob.enable_health()
         if self.CONFDIR is None:
             self.CONFDIR = self.weboob.workdir
         self.config = None
@@ -172,6 +183,9 @@ class Application(object):
         logging_options.add_option('-a', '--save-responses', action='store_true', help='save every response')
         self._parser.add_option_group(logging_options)
         self._parser.add_option('--shell-completion', action='store_true', help=optparse.SUPPRESS_HELP)
+        self._parser.add_option('--profile-startup', action='store_true',
+                                help='display time spent to initialize the application (set '
+                                     'WEBOOB_PROFILE_STARTUP=1 to also measure imports of the application)')
         self._is_default_count = True
 
     def guess_encoding(self, stdio=None):
@@ -189,6 +203,12 @@ class Application(object):
     def deinit(self):
         self.weboob.want_stop()
         self.weboob.deinit()
+        if os.environ.get('WEBOOB_METRICS_FILE') and metrics_registry.enabled:
+            # Accumulate metrics of every run, see "weboob-debug stats".
+            try:
+                metrics_registry.save(os.environ['WEBOOB_METRICS_FILE'])
+            except (IOError, OSError) as e:
+                self.logger.warning(u'Unable to save metrics: %s', e)
 
     def create_storage(self, path=None, klass=None, localonly=False):
         """
@@ -255,7 +275,8 @@ class Application(object):
             names = self.options.backends.split(',')
         if exclude is None and self.options.exclude_backends:
             exclude = self.options.exclude_backends.split(',')
-        loaded = self.weboob.load_backends(caps, names, exclude=exclude, *args, **kwargs)
+        with startup_profiler.phase('load backends'):
+            loaded = self.weboob.load_backends(caps, names, exclude=exclude, *args, **kwargs)
         if not loaded:
             logging.info(u'No backend loaded')
         return loaded
@@ -284,21 +305,27 @@ class Application(object):
     def _do_complete_iter(self, backend, count, fields, res):
         modif = 0
 
-        for i, sub in enumerate(res):
-            sub = self._do_complete_obj(backend, fields, sub)
-            if self.condition and self.condition.limit and \
-               self.condition.limit == i:
-                return
-
-            if self.condition and not self.condition.is_valid(sub):
-                modif += 1
-            else:
-                if count and i - modif == count:
-                    if self._is_default_count:
-                        raise MoreResultsAvailable()
-                    else:
-                        return
-                yield sub
+        try:
+            for i, sub in enumerate(res):
+                sub = self._do_complete_obj(backend, fields, sub)
+                if self.condition and self.condition.limit and \
+                   self.condition.limit == i:
+                    return
+
+                if self.condition and not self.condition.is_valid(sub):
+                    modif += 1
+                else:
+                    if count and i - modif == count:
+                        if self._is_default_count:
+                            raise MoreResultsAvailable()
+                        else:
+                            return
+                    yield sub
+        finally:
+            # Once count is reached, stop the backend at once, so it does
+            # not follow next pages.
+            if isinstance(res, GeneratorType):
+                res.close()
 
     def _do_complete(self, backend, count, selected_fields, function, *args, **kwargs):
         assert count is None or count > 0
@@ -457,15 +484,22 @@ class Application(object):
         if args is None:
             args = [(cls.stdin.encoding and isinstance(arg, bytes) and arg.decode(cls.stdin.encoding) or to_unicode(arg)) for arg in sys.argv]
 
+        if '--profile-startup' in args:
+            startup_profiler.start()
+
         try:
-            app = cls()
+            with startup_profiler.phase('create application'):
+                app = cls()
         except BackendsConfig.WrongPermissions as e:
             print(e, file=cls.stderr)
             sys.exit(1)
 
         try:
             try:
-                args = app.parse_args(args)
+                with startup_profiler.phase('handle options'):
+                    args = app.parse_args(args)
+                if startup_profiler.enabled:
+                    startup_profiler.report(cls.stderr)
                 sys.exit(app.main(args))
             except KeyboardInterrupt:
                 print('Program killed by SIGINT', file=cls.stderr)
@@ -328,11 +328,11 @@ class ConsoleApplication(Application):
                 if not minfo.is_installed():
                     print('Module "%s" is available but not installed.' % minfo.name)
                     self.install_module(minfo)
-                module = self.weboob.modules_loader.get_or_load_module(name)
+                module = self.weboob.modules_loader.get_manifest(name)
                 config = module.config
             else:
                 bname, items = self.weboob.backends_config.get_backend(name)
-                module = self.weboob.modules_loader.get_or_load_module(bname)
+                module = self.weboob.modules_loader.get_manifest(bname)
                 items.update(params)
                 params = items
                 config = module.config.load(self.weboob, bname, name, params, nofail=True)
@@ -610,4 +610,4 @@ class ConsoleApplication(Application):
         if ask_debug_mode:
             print(debugmsg, file=self.stderr)
         elif len(more_results) > 0:
-            print('Hint: There are more results available for %s (use option -n or count command)' % (', '.join(more_results)), file=self.stderr)
+            print('Hint: There are more results available for %s (use option -n or -N, or count command)' % (', '.join(more_results)), file=self.stderr)
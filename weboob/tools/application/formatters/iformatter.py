@@ -21,8 +21,8 @@
 from __future__ import print_function
 
 import os
+import struct
 import sys
-import subprocess
 
 try:
     from termcolor import colored
@@ -43,6 +43,8 @@ except ImportError:
     def readch():
         return sys.stdin.readline()
 else:
+    import fcntl
+
     PROMPT = '--Press a key to continue--'
 
     def readch():
@@ -66,6 +68,39 @@ from weboob.tools.ordereddict import OrderedDict
 __all__ = ['IFormatter', 'MandatoryFieldsNotFound']
 
 
+def get_terminal_rows():
+    """
+    Get the number of rows of the terminal, or 0 if it is unknown.
+
+    :rtype: :class:`int`
+    """
+    if sys.platform == 'win32':
+        from ctypes import windll, create_string_buffer
+
+        h = windll.kernel32.GetStdHandle(-12)
+        csbi = create_string_buffer(22)
+        res = windll.kernel32.GetConsoleScreenBufferInfo(h, csbi)
+
+        if res:
+            (bufx, bufy, curx, cury, wattr,
+             left, top, right, bottom, maxx, maxy) = struct.unpack("hhhhHhhhhhh", csbi.raw)
+            return right - left + 1
+        return 80  # can't determine actual size - return default values
+
+    # Ask the terminal driver, instead of spawning "stty size".
+    for fd in (sys.stdout, sys.stdin):
+        try:
+            rows, columns = struct.unpack('hh', fcntl.ioctl(fd.fileno(), termios.TIOCGWINSZ, '\0' * 4))
+        except (NameError, AttributeError, IOError, ValueError):
+            continue
+        if rows > 0:
+            return rows
+    try:
+        return int(os.environ['LINES'])
+    except (KeyError, ValueError):
+        return 0
+
+
 class MandatoryFieldsNotFound(Exception):
     def __init__(self, missing_fields):
         Exception.__init__(self, u'Mandatory fields not found: %s.' % ', '.join(missing_fields))
@@ -96,27 +131,9 @@ class IFormatter(object):
         self.print_lines = 0
         self.termrows = 0
         self.outfile = outfile
-        # XXX if stdin is not a tty, it seems that the command fails.
 
         if sys.stdout.isatty() and sys.stdin.isatty():
-            if sys.platform == 'win32':
-                from ctypes import windll, create_string_buffer
-
-                h = windll.kernel32.GetStdHandle(-12)
-                csbi = create_string_buffer(22)
-                res = windll.kernel32.GetConsoleScreenBufferInfo(h, csbi)
-
-                if res:
-                    import struct
-                    (bufx, bufy, curx, cury, wattr,
-                     left, top, right, bottom, maxx, maxy) = struct.unpack("hhhhHhhhhhh", csbi.raw)
-                    self.termrows = right - left + 1
-                else:
-                    self.termrows = 80  # can't determine actual size - return default values
-            else:
-                self.termrows = int(
-                    subprocess.Popen('stty size', shell=True, stdout=subprocess.PIPE).communicate()[0].split()[0]
-                )
+            self.termrows = get_terminal_rows()
 
     def output(self, formatted):
         if self.outfile != sys.stdout:
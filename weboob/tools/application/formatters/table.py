@@ -18,7 +18,6 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
-from prettytable import PrettyTable
 
 from weboob.capabilities.base import empty
 
@@ -67,6 +66,8 @@ class TableFormatter(IFormatter):
             else:
                 s += self.header
             s += "\n"
+        from prettytable import PrettyTable
+
         table = PrettyTable(list(column_headers))
         for column_header in column_headers:
             # API changed in python-prettytable. The try/except is a bad hack to support both versions
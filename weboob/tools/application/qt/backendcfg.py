@@ -312,7 +312,7 @@ class BackendCfg(QDialog):
 
             info = self.weboob.repositories.get_module_info(bname)
             if info and (info.is_installed() or self.installModule(info)):
-                module = self.weboob.modules_loader.get_or_load_module(bname)
+                module = self.weboob.modules_loader.get_manifest(bname)
                 for key, value in module.config.load(self.weboob, bname, name, params, nofail=True).iteritems():
                     try:
                         l, widget = self.config_widgets[key]
@@ -355,7 +355,7 @@ class BackendCfg(QDialog):
             self.editBackend(None)
             return
 
-        module = self.weboob.modules_loader.get_or_load_module(minfo.name)
+        module = self.weboob.modules_loader.get_manifest(minfo.name)
 
         icon_path = os.path.join(self.weboob.repositories.icons_dir, '%s.png' % minfo.name)
         img = QImage(icon_path)
@@ -384,8 +384,7 @@ class BackendCfg(QDialog):
               module.description,
               ', '.join(sorted(cap.__name__.replace('Cap', '') for cap in module.iter_caps()))))
 
-        if module.has_caps(CapAccount) and self.ui.nameEdit.isEnabled() and \
-                module.klass.ACCOUNT_REGISTER_PROPERTIES is not None:
+        if module.has_caps(CapAccount) and self.ui.nameEdit.isEnabled() and module.account_register:
             self.ui.registerButton.show()
         else:
             self.ui.registerButton.hide()
@@ -409,7 +408,7 @@ class BackendCfg(QDialog):
             return
 
         try:
-            module = self.weboob.modules_loader.get_or_load_module(unicode(selection[0].text()).lower())
+            module = self.weboob.modules_loader.get_manifest(unicode(selection[0].text()).lower())
         except ModuleLoadError:
             module = None
 
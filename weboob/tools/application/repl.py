@@ -35,6 +35,7 @@ from weboob.tools.path import WorkingPath
 from weboob.tools.ordereddict import OrderedDict
 from weboob.capabilities.collection import Collection, BaseCollection, CapCollection, CollectionNotFound
 
+from .base import MoreResultsAvailable
 from .console import BackendNotGiven, ConsoleApplication
 from .formatters.load import FormattersLoader, FormatterLoadError
 from .results import ResultsCondition, ResultsConditionError
@@ -140,6 +141,8 @@ class ReplApplication(Cmd, ConsoleApplication):
         results_options.add_option('-c', '--condition', help='filter result items to display given a boolean expression. See CONDITION section for the syntax')
         results_options.add_option('-n', '--count', type='int',
                                    help='limit number of results (from each backends)')
+        results_options.add_option('-N', '--max-results', type='int', dest='max_results',
+                                   help='limit number of results (from all backends together)')
         results_options.add_option('-s', '--select', help='select result item keys to display (comma separated)')
         self._parser.add_option_group(results_options)
 
@@ -370,6 +373,12 @@ class ReplApplication(Cmd, ConsoleApplication):
                 print('Warning: some selected fields will not be displayed by the formatter. Fallback to another. Hint: use option -f', file=self.stderr)
                 self.formatter = self.formatters_loader.build_formatter(ReplApplication.DEFAULT_FORMATTER)
 
+        if self.options.max_results:
+            # Backends are stopped once enough results have been received,
+            # and the user is told that they have more results.
+            kwargs.setdefault('max_results', self.options.max_results)
+            kwargs.setdefault('more_results_error', MoreResultsAvailable)
+
         return self.weboob.do(self._do_complete, self.options.count, fields, function, *args, **kwargs)
 
     # -- command tools ------------
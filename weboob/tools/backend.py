@@ -19,11 +19,13 @@
 
 
 import os
-from threading import RLock
+from contextlib import contextmanager
+from threading import RLock, Lock, BoundedSemaphore, Condition, local
 from copy import copy
 
 from weboob.capabilities.base import BaseObject, FieldNotFound, \
     Capability, NotLoaded, NotAvailable
+from weboob.tools.callcontext import get_context
 from weboob.tools.misc import iter_fields
 from weboob.tools.log import getLogger
 from weboob.tools.value import ValuesDict
@@ -249,6 +251,17 @@ class Module(object):
     # When the method is called, fields are only the one which are
     # NOT yet filled.
     OBJECTS = {}
+    # Maximum number of calls which can run at the same time on a backend.
+    # When it is greater than 1, each concurrent call uses its own browser,
+    # built by clone_browser(). Only methods of PARALLEL_METHODS run
+    # concurrently, other ones still lock the backend.
+    PARALLEL_CALLS = 1
+    # Names of methods which are safe to be called concurrently (usually
+    # read-only ones). If None, methods with a CACHE_TTL in capabilities.
+    PARALLEL_METHODS = None
+    # Maximum size in bytes of the on-disk HTTP cache, used when the
+    # HTTP_CACHE attribute of the browser class is True.
+    HTTP_CACHE_SIZE = 50 * 1024 * 1024
 
     class ConfigError(Exception):
         """
@@ -256,10 +269,148 @@ class Module(object):
         """
 
     def __enter__(self):
+        if self.PARALLEL_CALLS <= 1:
+            self.lock.acquire()
+            return
+
+        exclusive = getattr(self._calls, 'exclusive', 0)
+        if not exclusive:
+            # Wait for concurrent calls to finish before taking the lock, as
+            # they may need it to end. Calls made by them are not waited
+            # for, as they wait for this one. New concurrent calls can't
+            # start while an exclusive call is waiting or running.
+            with self._shared_cond:
+                own = self._own_shares()
+                self._waiting += 1
+                try:
+                    while self._shared > own:
+                        self._shared_cond.wait()
+                finally:
+                    self._waiting -= 1
+                self._exclusive += 1
+        self._calls.exclusive = exclusive + 1
         self.lock.acquire()
 
     def __exit__(self, t, v, tb):
         self.lock.release()
+        if self.PARALLEL_CALLS <= 1:
+            return
+
+        self._calls.exclusive -= 1
+        if self._calls.exclusive == 0:
+            with self._shared_cond:
+                self._exclusive -= 1
+                self._shared_cond.notify_all()
+
+    def _own_shares(self):
+        # Number of running concurrent calls made by the current thread or
+        # by the calls which have started the one of the current thread
+        # (see weboob.tools.callcontext). Has to be called with
+        # _shared_cond held.
+        contexts = []
+        ctx = get_context()
+        while ctx is not None:
+            contexts.append(ctx)
+            ctx = ctx.parent
+
+        own = sum(self._contexts.get(ctx, 0) for ctx in contexts)
+        if getattr(self._calls, 'depth', 0) and self._calls.context not in contexts:
+            own += 1
+        return own
+
+    def is_parallel(self, method):
+        """
+        Check if a method can be called concurrently with other calls on
+        this backend.
+
+        :param method: name of method
+        :type method: :class:`str`
+        :rtype: :class:`bool`
+        """
+        if self.PARALLEL_CALLS <= 1:
+            return False
+        if self.PARALLEL_METHODS is None:
+            return self.get_cache_ttl(method) is not None
+        return method in self.PARALLEL_METHODS
+
+    def lock_for(self, method):
+        """
+        Get the context manager to use to call a method.
+
+        It is the backend itself, which is locked during the call, unless
+        the method is in :attr:`PARALLEL_METHODS`.
+
+        :param method: name of method
+        :type method: :class:`str`
+        """
+        if isinstance(method, basestring) and self.is_parallel(method):
+            return self._parallel_call()
+        return self
+
+    @contextmanager
+    def _parallel_call(self):
+        if getattr(self._calls, 'exclusive', 0):
+            # The backend is already locked by the current thread.
+            yield
+            return
+
+        depth = getattr(self._calls, 'depth', 0)
+        if depth == 0:
+            ctx = get_context()
+            with self._shared_cond:
+                # Let exclusive calls go first, unless this one is made by a
+                # running concurrent call, which they wait for.
+                if not self._own_shares():
+                    while self._waiting or self._exclusive:
+                        self._shared_cond.wait()
+                self._shared += 1
+                if ctx is not None:
+                    self._contexts[ctx] = self._contexts.get(ctx, 0) + 1
+            self._calls.context = ctx
+            try:
+                self._slots.acquire()
+                try:
+                    self._calls.browser = self._acquire_browser()
+                except:
+                    self._slots.release()
+                    raise
+            except:
+                self._release_shared(ctx)
+                raise
+        self._calls.depth = depth + 1
+
+        try:
+            yield
+        finally:
+            self._calls.depth -= 1
+            if self._calls.depth == 0:
+                browser = self._calls.browser
+                self._calls.browser = None
+                with self._browsers_lock:
+                    self._free_browsers.append(browser)
+                self._slots.release()
+                self._release_shared(self._calls.context)
+                self._calls.context = None
+
+    def _release_shared(self, ctx):
+        with self._shared_cond:
+            self._shared -= 1
+            if ctx is not None:
+                self._contexts[ctx] -= 1
+                if not self._contexts[ctx]:
+                    del self._contexts[ctx]
+            self._shared_cond.notify_all()
+
+    def _acquire_browser(self):
+        with self._browsers_lock:
+            if self._free_browsers:
+                return self._free_browsers.pop()
+            self._browsers_count += 1
+            first = self._browsers_count == 1
+
+        if first:
+            return self._get_main_browser()
+        return self.clone_browser()
 
     def __repr__(self):
         return u"<Backend %r>" % self.name
@@ -269,6 +420,22 @@ class Module(object):
         self.weboob = weboob
         self.name = name
         self.lock = RLock()
+        self._browser_lock = RLock()
+        if self.PARALLEL_CALLS > 1:
+            self._slots = BoundedSemaphore(self.PARALLEL_CALLS)
+            # Number of running concurrent calls, and by call context.
+            self._shared = 0
+            self._contexts = {}
+            # Number of exclusive calls waiting for concurrent ones to
+            # finish, and of threads running an exclusive call.
+            self._waiting = 0
+            self._exclusive = 0
+            self._shared_cond = Condition(Lock())
+            # State of the concurrent call running in the current thread.
+            self._calls = local()
+            self._browsers_lock = Lock()
+            self._free_browsers = []
+            self._browsers_count = 0
         if config is None:
             config = {}
 
@@ -296,11 +463,48 @@ class Module(object):
         of this attribute, to avoid useless pages access.
 
         Note that the :func:`create_default_browser` method is called to create it.
+
+        When :attr:`PARALLEL_CALLS` is greater than 1, it is the browser
+        dedicated to the concurrent call running in the current thread.
         """
+        if self.PARALLEL_CALLS > 1:
+            browser = getattr(self._calls, 'browser', None)
+            if browser is not None:
+                return browser
+
+        return self._get_main_browser()
+
+    def _get_main_browser(self):
         if self._browser is None:
-            self._browser = self.create_default_browser()
+            # Concurrent calls must not create several main browsers.
+            with self._browser_lock:
+                if self._browser is None:
+                    self._browser = self.create_default_browser()
         return self._browser
 
+    def clone_browser(self):
+        """
+        Build a browser for a call running concurrently with others, when
+        :attr:`PARALLEL_CALLS` is greater than 1.
+
+        The default implementation creates a new default browser sharing the
+        cookies and current page of the main one, so it is already logged in.
+        Overload it if the session state is not only in cookies.
+        """
+        main = self._get_main_browser()
+        browser = self.create_default_browser()
+        if main is None or browser is None:
+            return browser
+
+        if hasattr(main, 'session') and hasattr(browser, 'session'):
+            browser.session.cookies = main.session.cookies
+        if getattr(main, 'page', None) is not None:
+            page = copy(main.page)
+            page.browser = browser
+            browser.page = page
+            browser.url = main.url
+        return browser
+
     def create_default_browser(self):
         """
         Method to overload to build the default browser in
@@ -342,12 +546,39 @@ class Module(object):
 
         kwargs['logger'] = self.logger
 
+        if getattr(self.BROWSER, 'HTTP_CACHE', False) and 'cache' not in kwargs:
+            kwargs['cache'] = self.get_http_cache()
+
+        from weboob.tools.cassette import Cassette
+        cassette = Cassette.from_environ(self.name)
+        if cassette is not None:
+            kwargs.setdefault('cassette', cassette)
+
         if self.logger.settings['responses_dirname']:
             kwargs.setdefault('responses_dirname', os.path.join(self.logger.settings['responses_dirname'],
                                                                 self._private_config.get('_debug_dir', self.name)))
 
         return self.BROWSER(*args, **kwargs)
 
+    def get_http_cache(self):
+        """
+        Get the HTTP cache shared by browsers of this backend, stored in the
+        working directory of weboob if there is one.
+
+        :rtype: :class:`weboob.browser.cache.HTTPCache`
+        """
+        if getattr(self, '_http_cache', None) is None:
+            from weboob.browser.cache import HTTPCache
+            from weboob.tools.cache import FileCache
+
+            workdir = getattr(self.weboob, 'workdir', None)
+            if workdir is None:
+                self._http_cache = HTTPCache()
+            else:
+                self._http_cache = HTTPCache(FileCache(os.path.join(workdir, 'http-cache', self.name),
+                                                       self.HTTP_CACHE_SIZE))
+        return self._http_cache
+
     @classmethod
     def iter_caps(klass):
         """
@@ -363,13 +594,61 @@ class Module(object):
                         yield cap
         return iter_caps(klass)
 
+    @classmethod
+    def get_cache_ttl(klass, method):
+        """
+        Get the number of seconds during which results of a method can be
+        cached, from the ``CACHE_TTL`` attribute of capabilities and of the
+        module class.
+
+        :returns: None if the method is not idempotent, 0 if identical
+                  concurrent calls can share results which must not be
+                  cached
+        :rtype: :class:`float`
+        """
+        ttls = klass.__dict__.get('_cache_ttls')
+        if ttls is None:
+            ttls = {}
+            for cap in reversed(list(klass.iter_caps())):
+                ttls.update(cap.CACHE_TTL)
+            for cls in reversed(klass.__mro__):
+                if issubclass(cls, Module):
+                    ttls.update(cls.__dict__.get('CACHE_TTL', {}))
+            klass._cache_ttls = ttls
+        return ttls.get(method)
+
+    @classmethod
+    def get_caps(klass):
+        """
+        Get capabilities implemented by this backend, including inherited
+        ones. It is computed once per class.
+
+        :rtype: frozenset[:class:`weboob.capabilities.base.Capability`]
+        """
+        caps = klass.__dict__.get('_caps')
+        if caps is None:
+            caps = klass._caps = frozenset(klass.iter_caps())
+        return caps
+
+    @classmethod
+    def get_caps_names(klass):
+        """
+        Get names of capabilities implemented by this backend.
+
+        :rtype: frozenset[:class:`str`]
+        """
+        names = klass.__dict__.get('_caps_names')
+        if names is None:
+            names = klass._caps_names = frozenset(cap.__name__ for cap in klass.get_caps())
+        return names
+
     def has_caps(self, *caps):
         """
         Check if this backend implements at least one of these capabilities.
         """
         for c in caps:
-            if (isinstance(c, basestring) and c in [cap.__name__ for cap in self.iter_caps()]) or \
-               isinstance(self, c):
+            if (isinstance(c, basestring) and c in self.get_caps_names()) or \
+               (not isinstance(c, basestring) and isinstance(self, c)):
                 return True
         return False
 
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import re
+import shutil
+import tempfile
+from hashlib import sha1
+from threading import Lock, RLock
+from time import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from .ordereddict import OrderedDict
+
+
+__all__ = ['ICache', 'MemoryCache', 'FileCache']
+
+
+class ICache(object):
+    """
+    Store of values which can expire.
+
+    Keys are tuples of strings, so entries sharing a same prefix can be
+    removed together with :func:`invalidate`.
+    """
+
+    def get(self, key, default=None):
+        """
+        Get a value, or *default* if it is missing or has expired.
+        """
+        raise NotImplementedError()
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value.
+
+        :param ttl: number of seconds after which the value expires
+        :type ttl: :class:`float`
+        """
+        raise NotImplementedError()
+
+    def delete(self, key):
+        """
+        Remove a value.
+        """
+        raise NotImplementedError()
+
+    def invalidate(self, prefix=()):
+        """
+        Remove every value whose key starts with *prefix*.
+        """
+        raise NotImplementedError()
+
+
+class MemoryCache(ICache):
+    """
+    In-memory cache which discards the least recently used values.
+
+    >>> cache = MemoryCache(2)
+    >>> cache.set(('a', '1'), 1)
+    >>> cache.set(('a', '2'), 2)
+    >>> cache.get(('a', '1'))
+    1
+    >>> cache.set(('b', '1'), 3)
+    >>> cache.get(('a', '2')) is None
+    True
+    >>> cache.invalidate(('a',))
+    >>> cache.get(('a', '1')) is None, cache.get(('b', '1'))
+    (True, 3)
+
+    :param max_entries: maximum number of values to keep
+    :type max_entries: :class:`int`
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.mutex = RLock()
+
+    def get(self, key, default=None):
+        with self.mutex:
+            try:
+                expires, value = self.entries.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires <= time():
+                return default
+            # Move the entry at the end, as the most recently used.
+            self.entries[key] = (expires, value)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.mutex:
+            self.entries.pop(key, None)
+            self.entries[key] = (None if ttl is None else time() + ttl, value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.mutex:
+            self.entries.pop(key, None)
+
+    def invalidate(self, prefix=()):
+        prefix = tuple(prefix)
+        with self.mutex:
+            for key in [key for key in self.entries if key[:len(prefix)] == prefix]:
+                del self.entries[key]
+
+
+class FileCache(ICache):
+    """
+    On-disk cache, where values are pickled in files.
+
+    Every item of a key but the last one is a sub-directory, and the last
+    one is hashed to get the file name.
+
+    When the size of files exceeds *max_size*, the least recently used
+    ones are removed.
+
+    >>> path = tempfile.mkdtemp(prefix='weboob_test_')
+    >>> cache = FileCache(path)
+    >>> cache.set(('pages', 'http://weboob.org/caf\\xc3\\xa9'), 1)
+    >>> cache.set(('pages', u'http://weboob.org/th\\xe9'), 2)
+    >>> cache.get(('pages', 'http://weboob.org/caf\\xc3\\xa9')), cache.get(('pages', u'http://weboob.org/th\\xe9'))
+    (1, 2)
+    >>> shutil.rmtree(path)
+
+    :param path: directory where files are stored
+    :type path: :class:`str`
+    :param max_size: maximum size of files, in bytes
+    :type max_size: :class:`int`
+    """
+
+    def __init__(self, path, max_size=None):
+        self.path = path
+        self.max_size = max_size
+        # Estimated size of files, computed on first write.
+        self.size = None
+        self.mutex = Lock()
+
+    def _dirname(self, prefix):
+        return os.path.join(self.path, *[re.sub(r'[^\w\-\.]', '_', part) for part in prefix])
+
+    def _filename(self, key):
+        name = key[-1]
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        return os.path.join(self._dirname(key[:-1]), sha1(name).hexdigest())
+
+    def get(self, key, default=None):
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as fp:
+                expires, stored_key, value = pickle.load(fp)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return default
+
+        if stored_key != key or expires is not None and expires <= time():
+            return default
+        if self.max_size is not None:
+            # The modification time is used to find the least recently used
+            # files.
+            try:
+                os.utime(filename, None)
+            except OSError:
+                pass
+        return value
+
+    def set(self, key, value, ttl=None):
+        dirname = self._dirname(key[:-1])
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created by an other thread
+                if not os.path.isdir(dirname):
+                    raise
+
+        # Write in a temporary file to never let an incomplete file.
+        fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.')
+        with os.fdopen(fd, 'wb') as fp:
+            pickle.dump((None if ttl is None else time() + ttl, key, value), fp, pickle.HIGHEST_PROTOCOL)
+            size = fp.tell()
+        os.rename(tmpname, self._filename(key))
+
+        if self.max_size is not None:
+            with self.mutex:
+                if self.size is None:
+                    self.size = self._cleanup(None)
+                else:
+                    self.size += size
+                if self.size > self.max_size:
+                    # Remove more than needed, to not list files on every
+                    # write.
+                    self.size = self._cleanup(self.max_size * 0.9)
+
+    def _cleanup(self, max_size):
+        """
+        Remove the least recently used files until their size is lower than
+        *max_size*.
+
+        :returns: size of remaining files
+        :rtype: :class:`int`
+        """
+        files = []
+        for root, dirs, filenames in os.walk(self.path):
+            for filename in filenames:
+                if filename.startswith('.'):
+                    # Temporary file being written.
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+
+        size = sum(f[1] for f in files)
+        if max_size is None:
+            return size
+
+        for mtime, filesize, path in sorted(files):
+            if size <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= filesize
+        return size
+
+    def delete(self, key):
+        try:
+            os.remove(self._filename(key))
+        except OSError:
+            pass
+
+    def invalidate(self, prefix=()):
+        shutil.rmtree(self._dirname(prefix), ignore_errors=True)
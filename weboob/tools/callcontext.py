@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from threading import local
+from time import time
+
+
+__all__ = ['CallContext', 'get_context', 'remaining_time', 'should_stop']
+
+
+_local = local()
+
+
+class CallContext(object):
+    """
+    State shared by every thread working for a same call on backends.
+
+    A context is activated in the current thread with the ``with``
+    statement, and can then be retrieved anywhere in this thread, for
+    example by browsers, with :func:`get_context`.
+
+    >>> ctx = CallContext(deadline=time() + 60)
+    >>> with ctx:
+    ...     get_context() is ctx, 0 < remaining_time() <= 60
+    (True, True)
+    >>> get_context() is None
+    True
+
+    A context can also be cancelled, when its results are not needed
+    anymore. Long operations are expected to check :func:`should_stop`
+    between two steps:
+
+    >>> ctx.cancel()
+    >>> with ctx:
+    ...     should_stop()
+    True
+
+    A context created while an other one is active (for example by a call
+    made by a backend) is its child: it can't last longer than its parent,
+    and stops when its parent is cancelled.
+
+    >>> parent = CallContext(deadline=time() + 10)
+    >>> child = CallContext(deadline=time() + 60, parent=parent)
+    >>> child.remaining() <= 10
+    True
+    >>> parent.cancel()
+    >>> child.should_stop()
+    True
+
+    :param deadline: timestamp after which the call has to stop
+    :type deadline: :class:`float`
+    :param parent: context of the call which has started this one
+    :type parent: :class:`CallContext`
+    """
+
+    def __init__(self, deadline=None, parent=None):
+        if parent is not None and parent.deadline is not None:
+            deadline = parent.deadline if deadline is None else min(deadline, parent.deadline)
+        self.deadline = deadline
+        self.parent = parent
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Ask every thread working for this call to stop as soon as possible.
+        """
+        self.cancelled = True
+
+    def remaining(self):
+        """
+        Get the number of seconds left before the deadline.
+
+        :rtype: :class:`float` or None if there is no deadline
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time())
+
+    def expired(self):
+        """
+        Check if the deadline is reached.
+        """
+        return self.deadline is not None and time() >= self.deadline
+
+    def should_stop(self):
+        """
+        Check if the call (or the one which has started it) is cancelled,
+        or if its deadline is reached.
+        """
+        return self.cancelled or self.expired() or \
+               (self.parent is not None and self.parent.should_stop())
+
+    def __enter__(self):
+        if not hasattr(_local, 'stack'):
+            _local.stack = []
+        _local.stack.append(self)
+        return self
+
+    def __exit__(self, t, v, tb):
+        _local.stack.pop()
+
+
+def get_context():
+    """
+    Get the context activated in the current thread.
+
+    :rtype: :class:`CallContext` or None
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        return stack[-1]
+    return None
+
+
+def remaining_time():
+    """
+    Get the number of seconds left before the deadline of the current
+    context, or None if there is no deadline.
+    """
+    ctx = get_context()
+    if ctx is None:
+        return None
+    return ctx.remaining()
+
+
+def should_stop():
+    """
+    Check if the call of the current context is cancelled or has reached its
+    deadline. Always False if there is no context.
+    """
+    ctx = get_context()
+    return ctx is not None and ctx.should_stop()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import atexit
+import gzip
+import os
+import tempfile
+from base64 import b64decode, b64encode
+from hashlib import sha1
+from threading import Lock
+
+from weboob.exceptions import BrowserUnavailable
+from .json import json
+from .log import getLogger
+
+
+__all__ = ['Cassette', 'NoRecordedResponse', 'get_fingerprint']
+
+
+class NoRecordedResponse(BrowserUnavailable):
+    """
+    Raised when replaying a cassette which has no response for a request.
+    """
+
+
+def _hash_body(body):
+    if not body:
+        return None
+    if isinstance(body, unicode):
+        body = body.encode('utf-8')
+    elif not isinstance(body, str):
+        # Streamed body, which can't be read twice.
+        return None
+    return sha1(body).hexdigest()
+
+
+def get_fingerprint(method, url, body=None):
+    """
+    Get the fingerprint of a request. Headers are ignored, as they contain
+    cookies which change from a session to an other.
+
+    >>> get_fingerprint('get', 'http://example.org/')
+    ('GET', 'http://example.org/', None)
+    >>> get_fingerprint('POST', 'http://example.org/', 'a=1')
+    ('POST', 'http://example.org/', '86eda770a6060824b090dd4df091e3bd4121279c')
+
+    :rtype: :class:`tuple`
+    """
+    return (method.upper(), url, _hash_body(body))
+
+
+class Cassette(object):
+    """
+    File of recorded HTTP responses, which browsers can replay without
+    network access.
+
+    In the :attr:`RECORD` mode, browsers record every response they
+    receive, and the cassette is saved when the program exits. In the
+    :attr:`REPLAY` mode, browsers get responses from the cassette, in the
+    order they have been recorded for each request.
+
+    Requests are identified by their method, url and body (see
+    :func:`get_fingerprint`). If no response has been recorded for a
+    request, one recorded for the same method and url is used, for example
+    if the body contains a random multipart boundary.
+
+    >>> cassette = Cassette(None, Cassette.RECORD)
+    >>> cassette.record('GET', 'http://example.org/', None, 200, 'OK', [('Content-Type', 'text/plain')], 'one')
+    >>> cassette.record('GET', 'http://example.org/', None, 200, 'OK', [], 'two')
+    >>> cassette.mode = Cassette.REPLAY
+    >>> [cassette.play('GET', 'http://example.org/')['content'] for i in range(3)]
+    ['one', 'two', 'two']
+    >>> cassette.play('GET', 'http://example.org/other') is None
+    True
+
+    :param path: file of the cassette
+    :type path: :class:`str`
+    :param mode: :attr:`RECORD` or :attr:`REPLAY`
+    :type mode: :class:`str`
+    """
+
+    RECORD = 'record'
+    REPLAY = 'replay'
+    VERSION = 1
+
+    ENVIRON = {RECORD: 'WEBOOB_RECORD', REPLAY: 'WEBOOB_REPLAY'}
+    """
+    Environment variables which set the directory of cassettes of backends,
+    see :func:`from_environ`.
+    """
+
+    _opened = {}
+
+    def __init__(self, path, mode):
+        assert mode in (self.RECORD, self.REPLAY)
+        self.logger = getLogger('cassette')
+        self.path = path
+        self.mode = mode
+        self.mutex = Lock()
+        self.interactions = []
+        # Indexes of interactions, by fingerprint and by (method, url).
+        self.index = {}
+        # Number of times each key has been played.
+        self.played = {}
+
+        if mode == self.REPLAY and path is not None:
+            self.load()
+
+    @classmethod
+    def open(cls, path, mode):
+        """
+        Get the cassette stored in a file, shared by every browser using it.
+
+        In the :attr:`RECORD` mode, the cassette is saved when the program
+        exits.
+
+        :rtype: :class:`Cassette`
+        """
+        path = os.path.realpath(path)
+        cassette = cls._opened.get(path)
+        if cassette is None or cassette.mode != mode:
+            cassette = cls._opened[path] = cls(path, mode)
+            if mode == cls.RECORD:
+                atexit.register(cassette.save)
+        return cassette
+
+    @classmethod
+    def from_environ(cls, name):
+        """
+        Get the cassette of a backend, if the ``WEBOOB_RECORD`` or
+        ``WEBOOB_REPLAY`` environment variable is set to a directory of
+        cassettes.
+
+        :param name: name of backend
+        :type name: :class:`str`
+        :rtype: :class:`Cassette` or None
+        """
+        for mode, variable in cls.ENVIRON.iteritems():
+            dirname = os.environ.get(variable)
+            if dirname:
+                if mode == cls.RECORD and not os.path.isdir(dirname):
+                    os.makedirs(dirname)
+                return cls.open(os.path.join(dirname, '%s.cassette' % name), mode)
+        return None
+
+    def load(self):
+        with gzip.open(self.path, 'rb') as fp:
+            data = json.load(fp)
+        if data.get('version') != self.VERSION:
+            raise ValueError('Unsupported version of cassette %s: %s' % (self.path, data.get('version')))
+
+        for interaction in data['interactions']:
+            interaction['content'] = b64decode(interaction['content'])
+            interaction['headers'] = [tuple(header) for header in interaction['headers']]
+            self._add(interaction)
+        self.logger.debug(u'Loaded %d responses from %s', len(self.interactions), self.path)
+
+    def save(self):
+        """
+        Write the cassette in its file.
+        """
+        if self.path is None or self.mode != self.RECORD:
+            return
+
+        with self.mutex:
+            interactions = [dict(interaction, content=b64encode(interaction['content']))
+                            for interaction in self.interactions]
+
+        # Write a temporary file, to never let an incomplete one.
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        with os.fdopen(fd, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as fp:
+                json.dump({'version': self.VERSION, 'interactions': interactions}, fp)
+        os.rename(tmpname, self.path)
+        self.logger.info(u'Saved %d responses to %s', len(interactions), self.path)
+
+    def _add(self, interaction):
+        method, url, body = interaction['request']
+        position = len(self.interactions)
+        self.interactions.append(interaction)
+        self.index.setdefault((method, url, body), []).append(position)
+        self.index.setdefault((method, url), []).append(position)
+
+    def record(self, method, url, body, status, reason, headers, content):
+        """
+        Record the response to a request.
+
+        :param headers: headers of response
+        :type headers: list[(:class:`str`, :class:`str`)]
+        :param content: body of response
+        :type content: :class:`str`
+        """
+        interaction = {'request': get_fingerprint(method, url, body),
+                       'status': status,
+                       'reason': reason,
+                       'headers': list(headers),
+                       'content': content or '',
+                      }
+        with self.mutex:
+            self._add(interaction)
+
+    def play(self, method, url, body=None):
+        """
+        Get the next recorded response to a request.
+
+        :returns: interaction with the `status`, `reason`, `headers` and
+                  `content` keys, or None if there is no response
+        :rtype: :class:`dict`
+        """
+        fingerprint = get_fingerprint(method, url, body)
+        with self.mutex:
+            for key in (fingerprint, fingerprint[:2]):
+                positions = self.index.get(key)
+                if positions:
+                    # When every response has been played, the last one is
+                    # used again.
+                    count = self.played.get(key, 0)
+                    self.played[key] = count + 1
+                    return self.interactions[positions[min(count, len(positions) - 1)]]
+        return None
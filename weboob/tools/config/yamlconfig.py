@@ -18,11 +18,11 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+import datetime
 import logging
 import os
 import tempfile
 
-import weboob.tools.date
 import yaml
 
 from .iconfig import ConfigError, IConfig
@@ -42,11 +42,12 @@ class WeboobDumper(Dumper):
     pass
 
 
-WeboobDumper.add_representer(weboob.tools.date.date,
-                             WeboobDumper.represent_date)
+# Also represent subclasses, like the ones of weboob.tools.date.
+WeboobDumper.add_multi_representer(datetime.date,
+                                   WeboobDumper.represent_date)
 
-WeboobDumper.add_representer(weboob.tools.date.datetime,
-                             WeboobDumper.represent_datetime)
+WeboobDumper.add_multi_representer(datetime.datetime,
+                                   WeboobDumper.represent_datetime)
 
 
 class YamlConfig(IConfig):
@@ -17,7 +17,6 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
-import dateutil.parser
 from datetime import date as real_date, datetime as real_datetime, timedelta
 import time
 import re
@@ -274,6 +273,9 @@ def parse_french_date(date):
     for fr, en in DATE_TRANSLATE_FR:
         date = fr.sub(en, date)
 
+    # dateutil.parser is slow to import, so only when needed.
+    import dateutil.parser
+
     return dateutil.parser.parse(date)
 
 
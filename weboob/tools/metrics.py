@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import tempfile
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock, local
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+from .json import json
+from .ordereddict import OrderedDict
+
+
+__all__ = ['Counter', 'Histogram', 'MetricsRegistry', 'registry', 'labels', 'get_labels']
+
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Metric(object):
+    """
+    Base class of metrics, which store a value for each set of labels.
+
+    :param name: name of metric
+    :type name: :class:`str`
+    :param help: description of metric
+    :type help: :class:`str`
+    :param labelnames: names of labels
+    :type labelnames: tuple[:class:`str`]
+    """
+
+    TYPE = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.mutex = Lock()
+
+    def _key(self, labels):
+        return tuple(unicode(labels.get(name, u'')) for name in self.labelnames)
+
+    def reset(self):
+        with self.mutex:
+            self.values = {}
+
+    def iter_values(self):
+        """
+        Iter on values of metric.
+
+        :rtype: iter[(:class:`dict`, value)]
+        """
+        with self.mutex:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield dict(zip(self.labelnames, key)), self._export(value)
+
+    def _export(self, value):
+        return value
+
+
+class Counter(Metric):
+    """
+    Value which can only be increased.
+
+    >>> c = Counter('requests', 'Number of requests', ('backend',))
+    >>> c.inc(backend='a'); c.inc(2, backend='a')
+    >>> c.get(backend='a'), c.get(backend='b')
+    (3, 0)
+    """
+
+    TYPE = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.mutex:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self.mutex:
+            return self.values.get(self._key(labels), 0)
+
+    def merge(self, labels, value):
+        self.inc(value, **labels)
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values, counted in buckets.
+
+    >>> h = Histogram('duration', 'Duration', ('backend',), buckets=(1, 5))
+    >>> h.observe(0.5, backend='a'); h.observe(3, backend='a'); h.observe(10, backend='a')
+    >>> h.get(backend='a')
+    {'count': 3, 'sum': 13.5, 'buckets': [(1, 1), (5, 2)]}
+
+    :param buckets: upper bounds of buckets
+    :type buckets: tuple[:class:`float`]
+    """
+
+    TYPE = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.mutex:
+            try:
+                counts, total = self.values[key]
+            except KeyError:
+                counts = [0] * (len(self.buckets) + 1)
+                total = 0
+            counts[index] += 1
+            self.values[key] = (counts, total + value)
+
+    def get(self, **labels):
+        with self.mutex:
+            value = self.values.get(self._key(labels))
+        if value is None:
+            return None
+        return self._export(value)
+
+    def _export(self, value):
+        counts, total = value
+        cumulated = 0
+        buckets = []
+        for bound, count in zip(self.buckets, counts):
+            cumulated += count
+            buckets.append((bound, cumulated))
+        return {'count': sum(counts), 'sum': total, 'buckets': buckets}
+
+    def merge(self, labels, value):
+        key = self._key(labels)
+        counts = []
+        previous = 0
+        for _, cumulated in value['buckets']:
+            counts.append(cumulated - previous)
+            previous = cumulated
+        counts.append(value['count'] - previous)
+        with self.mutex:
+            try:
+                old_counts, total = self.values[key]
+            except KeyError:
+                old_counts, total = [0] * len(counts), 0
+            self.values[key] = ([a + b for a, b in zip(old_counts, counts)], total + value['sum'])
+
+
+class MetricsRegistry(object):
+    """
+    Set of metrics.
+
+    Metrics are only recorded if :attr:`enabled` is set, which is the case
+    when the ``WEBOOB_METRICS`` environment variable is ``1``, or when
+    ``WEBOOB_METRICS_FILE`` is set (unless ``WEBOOB_METRICS`` is ``0``).
+    """
+
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self.mutex = Lock()
+        default = '1' if os.environ.get('WEBOOB_METRICS_FILE') else '0'
+        self.enabled = os.environ.get('WEBOOB_METRICS', default) != '0'
+
+    def _get_or_create(self, klass, name, *args, **kwargs):
+        with self.mutex:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = klass(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        """
+        Get or create a :class:`Counter`.
+        """
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Get or create a :class:`Histogram`.
+        """
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def reset(self):
+        """
+        Reset every metric.
+        """
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def snapshot(self):
+        """
+        Get values of every metric.
+
+        :rtype: dict[:class:`str`, list[(:class:`dict`, value)]]
+        """
+        return OrderedDict((name, list(metric.iter_values())) for name, metric in self.metrics.items())
+
+    def to_prometheus(self):
+        """
+        Export metrics in the Prometheus text format.
+
+        :rtype: :class:`unicode`
+        """
+        def format_labels(labels, **extra):
+            labels = sorted(labels.items()) + sorted(extra.items())
+            labels = [(k, v) for k, v in labels if v != u'']
+            if not labels:
+                return u''
+            return u'{%s}' % u','.join(u'%s="%s"' % (k, unicode(v).replace(u'\\', u'\\\\').replace(u'"', u'\\"').replace(u'\n', u'\\n'))
+                                       for k, v in labels)
+
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(u'# HELP %s %s' % (metric.name, metric.help))
+            lines.append(u'# TYPE %s %s' % (metric.name, metric.TYPE))
+            for labels, value in metric.iter_values():
+                if metric.TYPE == 'histogram':
+                    for bound, count in value['buckets']:
+                        lines.append(u'%s_bucket%s %s' % (metric.name, format_labels(labels, le=repr(float(bound))), count))
+                    lines.append(u'%s_bucket%s %s' % (metric.name, format_labels(labels, le='+Inf'), value['count']))
+                    lines.append(u'%s_sum%s %r' % (metric.name, format_labels(labels), value['sum']))
+                    lines.append(u'%s_count%s %s' % (metric.name, format_labels(labels), value['count']))
+                else:
+                    lines.append(u'%s%s %s' % (metric.name, format_labels(labels), value))
+        return u'\n'.join(lines) + u'\n'
+
+    def load(self, path):
+        """
+        Add to metrics the values stored in a file by :func:`save`.
+        """
+        try:
+            with open(path) as fp:
+                data = json.load(fp)
+        except (IOError, ValueError):
+            return
+
+        for name, values in data.iteritems():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            for labels, value in values:
+                metric.merge(labels, value)
+
+    def save(self, path):
+        """
+        Add values of metrics to the ones stored in a file, and reset them.
+        The file can be shared by several processes, to follow metrics
+        across invocations: they are serialized by a lock on the
+        ``path.lock`` file.
+
+        >>> import shutil, tempfile
+        >>> tmpdir = tempfile.mkdtemp()
+        >>> registry = MetricsRegistry()
+        >>> counter = registry.counter('test_total', 'Test', ('backend',))
+        >>> for i in xrange(2):
+        ...     counter.inc(backend='a')
+        ...     registry.save(os.path.join(tmpdir, 'metrics'))
+        >>> registry.load(os.path.join(tmpdir, 'metrics'))
+        >>> list(counter.iter_values())
+        [({'backend': u'a'}, 2)]
+        >>> shutil.rmtree(tmpdir)
+        """
+        with open(path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            self._save(path)
+
+    def _save(self, path):
+        stored = MetricsRegistry()
+        for metric in self.metrics.values():
+            if isinstance(metric, Histogram):
+                stored.histogram(metric.name, metric.help, metric.labelnames, metric.buckets)
+            else:
+                stored.counter(metric.name, metric.help, metric.labelnames)
+        stored.load(path)
+        for name, values in self.snapshot().iteritems():
+            for labels, value in values:
+                stored.metrics[name].merge(labels, value)
+        self.reset()
+
+        # Write a temporary file, to never let an incomplete one.
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmpname = tempfile.mkstemp(dir=dirname)
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(stored.snapshot(), fp)
+            os.rename(tmpname, path)
+        except:
+            os.remove(tmpname)
+            raise
+
+
+registry = MetricsRegistry()
+"""
+Metrics of this process.
+"""
+
+
+_labels = local()
+
+
+@contextmanager
+def labels(**kwargs):
+    """
+    Set labels added to metrics recorded by this thread in the block, for
+    example the backend and the method called.
+    """
+    previous = getattr(_labels, 'current', {})
+    current = dict(previous)
+    current.update(kwargs)
+    _labels.current = current
+    try:
+        yield current
+    finally:
+        _labels.current = previous
+
+
+def get_labels():
+    """
+    Get labels set by :func:`labels` in this thread.
+
+    :rtype: :class:`dict`
+    """
+    return getattr(_labels, 'current', {})
+
+
+CALLS = registry.counter('weboob_calls_total', 'Calls of methods on backends', ('backend', 'method'))
+CALL_ERRORS = registry.counter('weboob_call_errors_total', 'Calls of methods on backends which have failed',
+                               ('backend', 'method'))
+CALL_DURATION = registry.histogram('weboob_call_duration_seconds', 'Duration of calls of methods on backends',
+                                   ('backend', 'method'))
+CALL_RESULTS = registry.counter('weboob_call_results_total', 'Objects yielded by calls of methods on backends',
+                                ('backend', 'method'))
+HTTP_REQUESTS = registry.counter('weboob_http_requests_total', 'HTTP requests',
+                                 ('backend', 'method', 'page', 'status'))
+HTTP_BYTES = registry.counter('weboob_http_response_bytes_total', 'Size of HTTP responses bodies',
+                              ('backend', 'method', 'page'))
+HTTP_DURATION = registry.histogram('weboob_http_request_duration_seconds', 'Duration of HTTP requests',
+                                   ('backend', 'method', 'page'))
+HTTP_CACHE = registry.counter('weboob_http_cache_requests_total', 'Requests handled by the HTTP cache',
+                             ('backend', 'result'))
+PARSE_DURATION = registry.histogram('weboob_page_parse_duration_seconds', 'Time spent to build documents of pages',
+                                    ('backend', 'method', 'page'))
+ITEM_DURATION = registry.histogram('weboob_item_duration_seconds', 'Time spent to run filters of ItemElement',
+                                   ('backend', 'method', 'page', 'element'))
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+from contextlib import contextmanager
+from time import time
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+
+__all__ = ['StartupProfiler', 'profiler', 'get_component']
+
+
+def get_component(module_name):
+    """
+    Get the component a module belongs to: its top-level package, or its
+    sub-package for weboob modules.
+
+    >>> get_component('weboob.core.modules'), get_component('lxml.html'), get_component('weboob')
+    ('weboob.core', 'lxml', 'weboob')
+    """
+    parts = module_name.split('.')
+    if parts[0] == 'weboob':
+        return '.'.join(parts[:2])
+    return parts[0]
+
+
+class StartupProfiler(object):
+    """
+    Measure time spent to import modules, aggregated by component (see
+    :func:`get_component`), and time spent in initialization phases of an
+    application.
+
+    It is enabled by the ``--profile-startup`` option of applications, or
+    by the ``WEBOOB_PROFILE_STARTUP`` environment variable, which starts it
+    as soon as :mod:`weboob.tools.application.base` is imported.
+    """
+
+    def __init__(self):
+        self.started = None
+        self.imports = {}
+        self.phases = []
+        # Time spent in nested imports, for each import in progress.
+        self._children = []
+        self._original_import = None
+
+    @property
+    def enabled(self):
+        return self._original_import is not None
+
+    def start(self):
+        """
+        Start to measure imports.
+        """
+        if self.enabled:
+            return
+        self.started = time()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def stop(self):
+        """
+        Stop to measure imports.
+        """
+        if not self.enabled:
+            return
+        builtins.__import__ = self._original_import
+        self._original_import = None
+
+    def _resolve(self, name, globals, level):
+        if not globals or level == 0:
+            return name
+        package = globals.get('__package__')
+        if package is None:
+            package = globals.get('__name__', '')
+            if '__path__' not in globals:
+                package = package.rpartition('.')[0]
+        if level > 0:
+            package = '.'.join(package.split('.')[:len(package.split('.')) - level + 1])
+        elif package and sys.modules.get('%s.%s' % (package, name)) is None:
+            # Not an implicit relative import of Python 2.
+            return name
+        return '%s.%s' % (package, name) if package and name else package or name
+
+    def _import(self, name, globals=None, locals=None, fromlist=None, level=-1):
+        # Imports are serialized by the import lock, so a stack is enough.
+        self._children.append(0)
+        start = time()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time() - start
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            component = get_component(self._resolve(name, globals, level))
+            self.imports[component] = self.imports.get(component, 0) + elapsed - children
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measure time spent in the block, if the profiler is enabled.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        phase = [name, time(), None]
+        self.phases.append(phase)
+        try:
+            yield
+        finally:
+            phase[2] = time() - phase[1]
+
+    def report(self, out=None, min_duration=0.001):
+        """
+        Print times measured since the profiler has been started, and stop
+        it.
+        """
+        if out is None:
+            out = sys.stderr
+        self.stop()
+        total = time() - self.started
+
+        out.write('Startup time: %.3fs\n' % total)
+        out.write('Imports: %.3fs\n' % sum(self.imports.itervalues()))
+        for component, duration in sorted(self.imports.iteritems(), key=lambda item: -item[1]):
+            if duration >= min_duration:
+                out.write('  %-40s %.3fs\n' % (component, duration))
+        out.write('Initialization (including imports):\n')
+        for name, start, duration in self.phases:
+            if duration is not None:
+                out.write('  %-40s %.3fs\n' % (name, duration))
+        out.flush()
+
+
+profiler = StartupProfiler()
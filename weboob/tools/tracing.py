@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import atexit
+import os
+import tempfile
+from threading import Lock, local, current_thread
+from time import time
+
+from .json import json
+
+
+__all__ = ['Tracer', 'activate', 'get_tracer', 'span']
+
+
+class Span(object):
+    """
+    Context manager which records the time spent in its block.
+
+    Arguments can be added to :attr:`args` in the block.
+    """
+
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time()
+        return self
+
+    def __exit__(self, t, v, tb):
+        if t is not None:
+            self.args['error'] = repr(v)
+        self.tracer.add(self.name, self.cat, self.start, time(), self.args)
+
+
+class NullSpan(object):
+    """
+    Span used when tracing is disabled.
+    """
+
+    __slots__ = ()
+    args = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, v, tb):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer(object):
+    """
+    Record spans, which can be saved as a JSON file in the Chrome
+    trace-event format (to open in chrome://tracing or any compatible
+    viewer).
+
+    >>> tracer = Tracer()
+    >>> with tracer.span('call', 'test', backend='a'):
+    ...     pass
+    >>> [(event['name'], event['ph'], event['args']) for event in tracer.events]
+    [('thread_name', 'M', {'name': 'MainThread'}), ('call', 'X', {'backend': 'a'})]
+
+    :param path: file where the trace is saved by :func:`save`
+    :type path: :class:`str`
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.events = []
+        self.threads = set()
+        self.pid = os.getpid()
+        self.mutex = Lock()
+
+    def span(self, name, cat='weboob', **args):
+        """
+        Get a context manager which records a span.
+
+        :rtype: :class:`Span`
+        """
+        return Span(self, name, cat, args)
+
+    def add(self, name, cat, start, end, args=None, thread=None):
+        """
+        Record a span which started at *start* and ended at *end*
+        (timestamps in seconds).
+        """
+        if thread is None:
+            thread = current_thread()
+        event = {'name': name, 'cat': cat, 'ph': 'X', 'pid': self.pid, 'tid': thread.ident,
+                 'ts': int(start * 1000000), 'dur': int((end - start) * 1000000),
+                 'args': args or {}}
+        with self.mutex:
+            if thread.ident not in self.threads:
+                self.threads.add(thread.ident)
+                self.events.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': thread.ident,
+                                    'args': {'name': thread.name}})
+            self.events.append(event)
+
+    def save(self, path=None):
+        """
+        Write the trace in a file.
+        """
+        path = path or self.path
+        with self.mutex:
+            data = {'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}
+
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(data, fp)
+        os.rename(tmpname, path)
+
+
+_local = local()
+_global_tracer = None
+
+
+def activate(tracer):
+    """
+    Get a context manager which sets the tracer used by this thread in its
+    block.
+    """
+    return _Activation(tracer)
+
+
+class _Activation(object):
+    __slots__ = ('tracer', 'previous')
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'tracer', None)
+        _local.tracer = self.tracer
+        return self.tracer
+
+    def __exit__(self, t, v, tb):
+        _local.tracer = self.previous
+
+
+def get_tracer():
+    """
+    Get the tracer used by this thread, or the one enabled by the
+    WEBOOB_TRACE environment variable.
+
+    :rtype: :class:`Tracer` or None if tracing is disabled
+    """
+    return getattr(_local, 'tracer', None) or _global_tracer
+
+
+def span(name, cat='weboob', **args):
+    """
+    Record a span with the tracer used by this thread, if any.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        return NULL_SPAN
+    return tracer.span(name, cat, **args)
+
+
+if os.environ.get('WEBOOB_TRACE'):
+    _global_tracer = Tracer(os.environ['WEBOOB_TRACE'])
+    atexit.register(_global_tracer.save)